@@ -37,10 +37,57 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_STORAGE: str = "memory"  # "redis" en producción
+    RATE_LIMIT_PURGA_SECONDS: float = 60.0  # purga de claves vencidas (backend en memoria)
     
     # Redis (opcional para caché)
     REDIS_URL: str | None = None
     
+    # Ejecución de código de usuarios
+    CODE_EXECUTOR_POOL_SIZE: int = 4
+    CODE_EXECUTOR_MAX_TASKS_PER_WORKER: int = 50
+    CODE_EXECUTOR_MEMORY_MB: int = 256
+    CODE_EXECUTOR_NODE_POOL_SIZE: int = 2
+    CODE_ARTIFACT_CACHE_DIR: str | None = None
+    CODE_ARTIFACT_CACHE_MAX_MB: int = 256
+    EXECUTION_CACHE_MAX_ITEMS: int = 2048
+    EXECUTION_CACHE_TTL_SECONDS: int = 86400
+    
+    # Pre-generación de desafíos diarios
+    DESAFIOS_BUFFER_DIAS: int = 7
+    DESAFIOS_HORA_PREGENERACION: int = 4
+    DESAFIOS_INTENTOS_VALIDACION: int = 3
+    
+    # Recálculo nocturno de rachas
+    RACHAS_HORA_RECALCULO: int = 0
+    RACHAS_MINUTO_RECALCULO: int = 15
+    
+    # Evaluación batch de badges
+    BADGES_HORA_EVALUACION: int = 3
+    BADGES_TAMANO_LOTE: int = 1000
+    
+    # Bus de eventos de dominio (recálculo de badges fuera de la petición)
+    EVENTOS_DOMINIO_DEBOUNCE_SECONDS: float = 2.0
+    EVENTOS_DOMINIO_MAX_COLA: int = 10000
+    EVENTOS_DOMINIO_CONCURRENCIA: int = 4
+    
+    # Caché en proceso del desafío del día
+    DESAFIO_HOY_CACHE_TTL_SECONDS: int = 300
+    
+    # Pool de hashing de contraseñas (bcrypt fuera del event loop)
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDIENTES: int = 64
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2
+    
+    # Cuotas de tokens de IA por usuario y endpoint (token bucket)
+    IA_CUOTA_VENTANA_SECONDS: int = 3600
+    IA_CUOTA_REVIEW_TOKENS: int = 40000
+    IA_CUOTA_PISTA_TOKENS: int = 15000
+    IA_CUOTA_GENERACION_TOKENS: int = 60000
+    
+    # Caché de respuestas de IA (code review y pistas)
+    IA_CACHE_MAX_ITEMS: int = 4096
+    IA_CACHE_TTL_SECONDS: int = 604800
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -51,6 +98,12 @@ class Settings(BaseSettings):
         from urllib.parse import quote_plus
         return f"postgresql://{quote_plus(self.DB_USER)}:{quote_plus(self.DB_PASSWORD)}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?sslmode=require"
     
+    @property
+    def async_database_url(self) -> str:
+        """URL de conexión a PostgreSQL con SSL para el driver asyncpg."""
+        from urllib.parse import quote_plus
+        return f"postgresql+asyncpg://{quote_plus(self.DB_USER)}:{quote_plus(self.DB_PASSWORD)}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?ssl=require"
+    
     @property
     def cors_origins_list(self) -> List[str]:
         """Lista de orígenes CORS permitidos."""
@@ -2,10 +2,10 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 from sqlalchemy.orm import Session
-from google import genai
 from app.database import SessionLocal
 from app.services.ia_service import IAService
 from app.config import get_settings
+import asyncio
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -24,7 +24,7 @@ async def job_generar_noticias():
     logger.info("Iniciando generación automática de noticias...")
     try:
         ia_service = get_ia_service_instance()
-        nuevas, duplicadas = ia_service.generar_y_guardar_noticias(
+        nuevas, duplicadas = await ia_service.generar_y_guardar_noticias(
             usuario_id=None,
             limite=50
         )
@@ -38,17 +38,33 @@ async def job_generar_eventos():
     logger.info("Iniciando generación automática de eventos...")
     try:
         ia_service = get_ia_service_instance()
-        nuevos, duplicados = ia_service.generar_y_guardar_eventos(limite=15)
+        nuevos, duplicados = await ia_service.generar_y_guardar_eventos(limite=15)
         logger.info(f"Eventos generados: {nuevos} nuevos, {duplicados} duplicados")
         ia_service.db.close()
     except Exception as e:
         logger.error(f"Error al generar eventos: {str(e)}")
 
 
+async def job_pregenerar_desafios():
+    """
+    Mantiene generados (y validados) los desafíos de los próximos
+    DESAFIOS_BUFFER_DIAS días. Se ejecuta en horario de poca carga.
+    """
+    logger.info("Iniciando pre-generación de desafíos diarios...")
+    try:
+        ia_service = get_ia_service_instance()
+        generados = await ia_service.asegurar_buffer_desafios(settings.DESAFIOS_BUFFER_DIAS)
+        logger.info(f"Desafíos pre-generados: {generados}")
+        ia_service.db.close()
+    except Exception as e:
+        logger.error(f"Error al pre-generar desafíos: {str(e)}")
+
+
 async def job_generar_desafios_diarios():
     """
     Genera UN único desafío global del día para todos los usuarios.
-    Se ejecuta a medianoche.
+    Se ejecuta a medianoche; con el buffer de pre-generación al día, el
+    desafío ya existe y no se llama a la IA.
     """
     logger.info("Iniciando generación de desafío diario global...")
     try:
@@ -59,7 +75,7 @@ async def job_generar_desafios_diarios():
         desafio = await ia_service.generar_desafio_global()
         
         if desafio:
-            logger.info(f"Desafío global del día generado: {desafio['titulo']}")
+            logger.info(f"Desafío global del día disponible: {desafio.titulo}")
         else:
             logger.warning("No se pudo generar el desafío global del día")
         
@@ -68,6 +84,53 @@ async def job_generar_desafios_diarios():
         logger.error(f"Error al generar desafío diario global: {str(e)}")
 
 
+def _recalcular_rachas() -> int:
+    from app.services.rachas import recalcular_rachas
+    
+    db = SessionLocal()
+    try:
+        return recalcular_rachas(db)
+    finally:
+        db.close()
+
+
+async def job_recalcular_rachas():
+    """
+    Recalcula las rachas de todos los usuarios y reinicia las que se
+    rompieron ayer. Se ejecuta poco después de medianoche.
+    """
+    logger.info("Iniciando recálculo de rachas...")
+    try:
+        actualizados = await asyncio.to_thread(_recalcular_rachas)
+        logger.info(f"Rachas actualizadas: {actualizados}")
+    except Exception as e:
+        logger.error(f"Error al recalcular rachas: {str(e)}")
+
+
+def _evaluar_badges_batch() -> int:
+    from app.services.badge_engine import evaluar_todos
+    
+    db = SessionLocal()
+    try:
+        return evaluar_todos(db, tamano_lote=settings.BADGES_TAMANO_LOTE)
+    finally:
+        db.close()
+
+
+async def job_evaluar_badges():
+    """
+    Evalúa los badges de todos los usuarios por lotes. Recoge los criterios
+    que cambian sin pasar por la API (ej: rachas recalculadas).
+    """
+    logger.info("Iniciando evaluación batch de badges...")
+    try:
+        # Trabajo síncrono de base de datos: fuera del event loop
+        total = await asyncio.to_thread(_evaluar_badges_batch)
+        logger.info(f"Badges desbloqueados en batch: {total}")
+    except Exception as e:
+        logger.error(f"Error al evaluar badges: {str(e)}")
+
+
 def start_scheduler():
     if not settings.ENABLE_SCHEDULED_JOBS:
         logger.info("Jobs programados deshabilitados (ENABLE_SCHEDULED_JOBS=False)")
@@ -89,6 +152,14 @@ def start_scheduler():
         replace_existing=True
     )
     
+    scheduler.add_job(
+        job_pregenerar_desafios,
+        trigger=CronTrigger(hour=settings.DESAFIOS_HORA_PREGENERACION, minute=0),
+        id='pregenerar_desafios',
+        name='Pre-generar desafíos de los próximos días',
+        replace_existing=True
+    )
+    
     scheduler.add_job(
         job_generar_desafios_diarios,
         trigger=CronTrigger(hour=0, minute=0),
@@ -97,6 +168,22 @@ def start_scheduler():
         replace_existing=True
     )
     
+    scheduler.add_job(
+        job_recalcular_rachas,
+        trigger=CronTrigger(hour=settings.RACHAS_HORA_RECALCULO, minute=settings.RACHAS_MINUTO_RECALCULO),
+        id='recalcular_rachas',
+        name='Recalcular rachas de todos los usuarios',
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        job_evaluar_badges,
+        trigger=CronTrigger(hour=settings.BADGES_HORA_EVALUACION, minute=0),
+        id='evaluar_badges',
+        name='Evaluar badges de todos los usuarios',
+        replace_existing=True
+    )
+    
     from datetime import datetime, timedelta
     run_date = datetime.now() + timedelta(seconds=5)
     
@@ -116,11 +203,22 @@ def start_scheduler():
         name='Generar eventos al inicio'
     )
     
+    scheduler.add_job(
+        job_pregenerar_desafios,
+        trigger='date',
+        run_date=run_date,
+        id='pregenerar_desafios_inicio',
+        name='Pre-generar desafíos al inicio'
+    )
+    
     scheduler.start()
     logger.info("Scheduler iniciado")
     logger.info("Noticias: cada 6 horas y al inicio")
     logger.info("Eventos: cada 6 horas y al inicio")
+    logger.info(f"Desafíos: buffer de {settings.DESAFIOS_BUFFER_DIAS} días, a las {settings.DESAFIOS_HORA_PREGENERACION:02d}:00 y al inicio")
     logger.info("Desafíos diarios: todos los días a las 00:00")
+    logger.info(f"Rachas: recálculo a las {settings.RACHAS_HORA_RECALCULO:02d}:{settings.RACHAS_MINUTO_RECALCULO:02d}")
+    logger.info(f"Badges: evaluación batch a las {settings.BADGES_HORA_EVALUACION:02d}:00")
 
 
 def stop_scheduler():
@@ -32,6 +32,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de paginación de los listados que devuelven un array y
+    # presupuesto restante de las cuotas de IA
+    expose_headers=["X-Next-Cursor", "X-Quota-Limit", "X-Quota-Remaining"],
 )
 
 @app.on_event("startup")
@@ -73,6 +76,18 @@ async def startup_event():
             start_scheduler()
     except ImportError:
         logger.warning("No se pudo iniciar el scheduler (posiblemente falta librería apscheduler)")
+    
+    from app.services.python_worker_pool import get_python_pool
+    from app.services.node_executor import get_node_pool
+    await get_python_pool().iniciar()
+    get_node_pool().iniciar()
+    
+    from app.services.eventos_dominio import get_bus_eventos
+    get_bus_eventos().iniciar()
+    
+    # Falla al arrancar si el backend configurado no está disponible
+    from app.services.rate_limit import get_rate_limit_backend
+    await get_rate_limit_backend().verificar()
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -80,4 +95,18 @@ async def shutdown_event():
         from app.jobs.scheduled_tasks import stop_scheduler
         stop_scheduler()
     except ImportError:
-        pass
\ No newline at end of file
+        pass
+    
+    from app.services.python_worker_pool import get_python_pool
+    from app.services.node_executor import get_node_pool
+    get_python_pool().detener()
+    get_node_pool().detener()
+    
+    from app.services.eventos_dominio import get_bus_eventos
+    await get_bus_eventos().detener()
+    
+    from app.services.password_hasher import get_password_hasher
+    get_password_hasher().detener()
+    
+    from app.services.rate_limit import get_rate_limit_backend
+    await get_rate_limit_backend().cerrar()
\ No newline at end of file
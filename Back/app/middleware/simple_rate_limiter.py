@@ -1,95 +1,116 @@
 """
 Rate Limiting Middleware Personalizado (sin SlowAPI)
-Usa un dict en memoria para tracking simple.
+Middleware ASGI puro: las peticiones sin regla pasan sin más coste que una
+búsqueda en un dict y un recorrido de prefijos. Delega el conteo en el
+backend de app.services.rate_limit (GCRA en memoria o en Redis).
 """
 
-from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+import json
 import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import get_settings
+from app.services.rate_limit import get_rate_limit_backend
 
 logger = logging.getLogger(__name__)
 
 
-class SimpleRateLimiter:
-    """Rate limiter simple basado en memoria."""
-    
-    def __init__(self):
-        # Dict[endpoint][ip] = (request_count, window_start)
-        self.requests: Dict[str, Dict[str, Tuple[int, datetime]]] = defaultdict(lambda: {})
-        self.limits = {
-            "/api/auth/login": (10, 60),  # 10 requests por 60 segundos
-            "/api/desafios/generar": (5, 3600),  # 5 por hora
-            "/api/code-review/": (10, 3600),  # 10 por hora
-        }
-    
-    def check_rate_limit(self, endpoint: str, client_ip: str) -> bool:
-        """
-        Verifica si el cliente ha excedido el límite.
-        
-        Returns:
-            True si está dentro del límite, False si excedió
-        """
-        if endpoint not in self.limits:
-            return True  # Sin límite definido
-        
-        max_requests, window_seconds = self.limits[endpoint]
-        now = datetime.now()
-        
-        # Obtener datos del cliente
-        if client_ip not in self.requests[endpoint]:
-            self.requests[endpoint][client_ip] = (1, now)
-            return True
-        
-        count, window_start = self.requests[endpoint][client_ip]
-        
-        # Verificar si la ventana expiró
-        if now - window_start > timedelta(seconds=window_seconds):
-            # Nueva ventana
-            self.requests[endpoint][client_ip] = (1, now)
-            return True
-        
-        # Dentro de la ventana
-        if count >= max_requests:
-            return False  # Excedido
-        
-        # Incrementar contador
-        self.requests[endpoint][client_ip] = (count + 1, window_start)
-        return True
-    
-    def cleanup_old_entries(self):
-        """Limpia entradas viejas para evitar memory leaks."""
-        now = datetime.now()
-        for endpoint, clients in list(self.requests.items()):
-            for client_ip, (_, window_start) in list(clients.items()):
-                if now - window_start > timedelta(hours=1):
-                    del clients[client_ip]
-
-
-# Instancia global
-rate_limiter = SimpleRateLimiter()
-
-
-class CustomRateLimitMiddleware(BaseHTTPMiddleware):
-    """Middleware para aplicar rate limiting."""
-    
-    async def dispatch(self, request: Request, call_next):
+@dataclass(frozen=True)
+class ReglaRateLimit:
+    patron: str
+    limite: int
+    ventana: int  # segundos
+    # True: aplica a toda ruta que empiece por `patron`
+    prefijo: bool = False
+    # None: todos los métodos
+    metodos: Optional[FrozenSet[str]] = None
+
+
+REGLAS_POR_DEFECTO: Tuple[ReglaRateLimit, ...] = (
+    ReglaRateLimit("/api/auth/login", 10, 60),  # 10 requests por 60 segundos
+    ReglaRateLimit("/api/desafios/generar", 5, 3600),  # 5 por hora
+    # Review y pistas (POST); el historial y las stats no llaman a la IA
+    ReglaRateLimit("/api/code-review/", 10, 3600, prefijo=True, metodos=frozenset({"POST"})),  # 10 por hora
+)
+
+# Respuesta 429 precompilada; solo Retry-After cambia entre peticiones
+CUERPO_429 = json.dumps({
+    "detail": {
+        "error": "Too Many Requests",
+        "message": "Has excedido el límite de solicitudes. Intenta nuevamente más tarde."
+    }
+}, ensure_ascii=False).encode("utf-8")
+
+CABECERAS_429: List[Tuple[bytes, bytes]] = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(CUERPO_429)).encode("latin-1")),
+]
+
+
+class ReglasCompiladas:
+    """Rutas exactas en un dict y prefijos ordenados de más a menos específico."""
+
+    def __init__(self, reglas: Sequence[ReglaRateLimit]):
+        self.exactas: Dict[str, List[ReglaRateLimit]] = {}
+        prefijos = []
+        for regla in reglas:
+            if regla.prefijo:
+                prefijos.append(regla)
+            else:
+                self.exactas.setdefault(regla.patron, []).append(regla)
+        self.prefijos: Tuple[ReglaRateLimit, ...] = tuple(
+            sorted(prefijos, key=lambda r: len(r.patron), reverse=True)
+        )
+
+    def buscar(self, ruta: str, metodo: str) -> Optional[ReglaRateLimit]:
+        for regla in self.exactas.get(ruta, ()):
+            if regla.metodos is None or metodo in regla.metodos:
+                return regla
+        for regla in self.prefijos:
+            if ruta.startswith(regla.patron) and (regla.metodos is None or metodo in regla.metodos):
+                return regla
+        return None
+
+
+class CustomRateLimitMiddleware:
+    """Middleware ASGI para aplicar rate limiting por regla e IP."""
+
+    def __init__(self, app: ASGIApp, reglas: Sequence[ReglaRateLimit] = REGLAS_POR_DEFECTO):
+        self.app = app
+        self.reglas = ReglasCompiladas(reglas)
+        self.habilitado = get_settings().RATE_LIMIT_ENABLED
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.habilitado:
+            await self.app(scope, receive, send)
+            return
+
+        regla = self.reglas.buscar(scope["path"], scope["method"])
+        if regla is None:
+            await self.app(scope, receive, send)
+            return
+
         # Obtener IP del cliente
-        client_ip = request.client.host if request.client else "unknown"
-        endpoint = request.url.path
-        
-        # Verificar rate limit
-        if not rate_limiter.check_rate_limit(endpoint, client_ip):
-            logger.warning(f"Rate limit exceeded for {client_ip} on {endpoint}")
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
-                    "error": "Too Many Requests",
-                    "message": "Has excedido el límite de solicitudes. Intenta nuevamente más tarde."
-                }
-            )
-        
-        response = await call_next(request)
-        return response
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+
+        resultado = await get_rate_limit_backend().consumir(
+            f"{regla.patron}:{client_ip}", regla.limite, regla.ventana
+        )
+        if resultado.permitido:
+            await self.app(scope, receive, send)
+            return
+
+        logger.warning(f"Rate limit exceeded for {client_ip} on {scope['path']}")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": CABECERAS_429 + [
+                (b"retry-after", str(math.ceil(resultado.retry_after)).encode("latin-1"))
+            ],
+        })
+        await send({"type": "http.response.body", "body": CUERPO_429})
@@ -19,15 +19,19 @@ class PerfilUsuario(Base):
     eventos_asistidos = Column(Integer, default=0, nullable=False)
     certificados = Column(Integer, default=0, nullable=False)
     logros = Column(Integer, default=0, nullable=False)
+    # XP acumulada, mantenida de forma incremental (ver gamification_service.sumar_xp)
+    xp_total = Column(Integer, default=0, server_default='0', nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     
     __table_args__ = (
         CheckConstraint('nivel >= 1', name='check_nivel_positivo'),
+        CheckConstraint('xp_total >= 0', name='check_xp_total_positivo'),
         CheckConstraint('racha_dias >= 0', name='check_racha_positiva'),
         CheckConstraint('eventos_asistidos >= 0', name='check_eventos_positivo'),
         CheckConstraint('certificados >= 0', name='check_certificados_positivo'),
         CheckConstraint('logros >= 0', name='check_logros_positivo'),
+        Index('idx_perfil_xp_total', xp_total.desc(), 'usuario_id'),
     )
     
     usuario = relationship(lambda: Usuario, back_populates="perfil")
@@ -234,6 +238,30 @@ class ProyectoUsuario(Base):
     usuario = relationship(lambda: Usuario, back_populates="proyectos")
 
 
+class ActividadUsuario(Base):
+    """
+    Feed de actividad reciente del usuario (eventos, desafíos y proyectos),
+    con una entrada por registro de origen. Se escribe en la misma
+    transacción que el cambio de origen.
+    """
+    __tablename__ = "actividad_usuario"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String(20), nullable=False)  # event | challenge | project
+    referencia_id = Column(UUID(as_uuid=True), nullable=False)  # Registro de origen
+    titulo = Column(String(255), nullable=False)
+    estado = Column(String(50), nullable=False)
+    datos = Column(JSONB, nullable=True)  # Detalle extra según tipo (ej: urls del proyecto)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        CheckConstraint("tipo IN ('event', 'challenge', 'project')", name='check_tipo_actividad_valido'),
+        Index('idx_actividad_usuario_created', 'usuario_id', created_at.desc(), id.desc()),
+        Index('uq_actividad_usuario_referencia', 'usuario_id', 'tipo', 'referencia_id', unique=True),
+    )
+
+
 class RevisionCodigo(Base):
     __tablename__ = "revisiones_codigo"
     
@@ -1,22 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func, select
 from typing import Annotated
-from passlib.context import CryptContext
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models.db_models import Usuario, PerfilUsuario, Notificacion, ProyectoUsuario
 from app.middleware.rate_limiter import auth_rate_limit
+from app.services.password_hasher import get_password_hasher
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    # bcrypt corre en el pool dedicado; 503 + Retry-After si está saturado
+    return await get_password_hasher().hash(password)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await get_password_hasher().verificar(plain_password, hashed_password)
 
 
 from pydantic import BaseModel
@@ -89,16 +90,16 @@ class ChangePasswordRequest(BaseModel):
 @router.post("/register")
 async def register(
     request: RegisterRequest,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
-    existing_user = db.query(Usuario).filter(Usuario.email == request.email).first()
+    existing_user = await db.scalar(select(Usuario).where(Usuario.email == request.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado"
         )
     
-    hashed_password = hash_password(request.password)
+    hashed_password = await hash_password(request.password)
     
     new_user = Usuario(
         nombre=request.nombre,
@@ -107,8 +108,7 @@ async def register(
         password_hash=hashed_password
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
     
     perfil = PerfilUsuario(
         usuario_id=new_user.id,
@@ -119,7 +119,7 @@ async def register(
         logros=0
     )
     db.add(perfil)
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Usuario registrado exitosamente",
@@ -132,9 +132,9 @@ async def register(
 @router.post("/login")
 async def login(
     request: LoginRequest,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
-    user = db.query(Usuario).filter(Usuario.email == request.email).first()
+    user = await db.scalar(select(Usuario).where(Usuario.email == request.email))
     
     if not user:
         raise HTTPException(
@@ -142,7 +142,7 @@ async def login(
             detail="Email o contraseña incorrectos"
         )
     
-    if not verify_password(request.password, user.password_hash):
+    if not await verify_password(request.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos"
@@ -157,140 +157,76 @@ async def login(
     }
 
 
+@router.get("/hashing/stats")
+async def obtener_stats_hashing():
+    """Métricas del pool de hashing de contraseñas (cola, rechazos, latencias)."""
+    return {
+        "status": "success",
+        "stats": get_password_hasher().stats()
+    }
+
+
+# Entradas del feed de actividad en el perfil
+ACTIVIDAD_PERFIL = 15
+
+
 @router.get("/me/{user_id}")
 async def get_user_profile(
     user_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
-    user = db.query(Usuario).filter(Usuario.id == user_id).first()
+    """
+    Perfil del usuario en dos consultas: usuario + perfil con intereses,
+    lenguajes y notificaciones sin leer como subconsultas escalares, y una
+    página del feed de actividad. Sin cargas lazy por fila.
+    """
+    from app.models.db_models import InteresUsuario, LenguajeUsuario
+    from app.services.actividad import consultar_actividad, serializar_actividad
     
-    if not user:
+    no_leidas = select(func.count(Notificacion.id)).where(
+        Notificacion.usuario_id == Usuario.id,
+        Notificacion.leido == False
+    ).scalar_subquery()
+    
+    intereses = select(func.array_agg(InteresUsuario.interes)).where(
+        InteresUsuario.usuario_id == Usuario.id
+    ).scalar_subquery()
+    
+    lenguajes = select(func.json_agg(func.json_build_object(
+        'lenguaje', LenguajeUsuario.lenguaje,
+        'nivel', LenguajeUsuario.nivel
+    ))).where(
+        LenguajeUsuario.usuario_id == Usuario.id
+    ).scalar_subquery()
+    
+    fila = (await db.execute(
+        select(
+            Usuario,
+            PerfilUsuario,
+            no_leidas.label("no_leidas"),
+            intereses.label("intereses"),
+            lenguajes.label("lenguajes")
+        ).outerjoin(
+            PerfilUsuario, PerfilUsuario.usuario_id == Usuario.id
+        ).where(Usuario.id == user_id)
+    )).first()
+    
+    if not fila:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado"
         )
     
-    perfil = user.perfil
+    user, perfil = fila.Usuario, fila.PerfilUsuario
     
-    # --- XP Calculation Logic ---
-    # Formula Estimada: Base por Nivel + Extras
-    xp_actual = 0
+    # --- XP: materializada en perfil.xp_total ---
+    xp_actual = perfil.xp_total if perfil else 0
+    nivel_calculado = (xp_actual // 1000) + 1
+    # XP necesaria para el siguiente nivel (siempre 1000 relativo al nivel actual para la barra)
     xp_next_level = 1000
     
-    if perfil:
-        # Base XP del nivel actual
-        base_xp = (perfil.nivel - 1) * 1000
-        
-        # XP ganada por actividades
-        xp_events = perfil.eventos_asistidos * 150
-        xp_certs = perfil.certificados * 500
-        xp_achievements = perfil.logros * 200
-        xp_streak = perfil.racha_dias * 20
-        
-        # Proyectos manuales (ej: 300 XP por proyecto)
-        project_count = db.query(ProyectoUsuario).filter(ProyectoUsuario.usuario_id == user_id).count()
-        xp_proyectos = project_count * 300
-        
-        xp_actual = base_xp + xp_events + xp_certs + xp_achievements + xp_streak + xp_proyectos
-        
-        # CÁLCULO DE NIVEL: Cada 1000 XP es un nivel.
-        nivel_calculado = (xp_actual // 1000) + 1
-        
-        # XP necesaria para el siguiente nivel (siempre 1000 relativo al nivel actual para la barra)
-        xp_next_level = 1000
-
     # --- Portfolio / Recent Activity ---
-    activities = []
-    
-    # 1. Recent Events
-    from app.models.db_models import UsuarioEvento, DesafioDiario, Notificacion
-    from sqlalchemy import desc
-    
-    recent_events = db.query(UsuarioEvento).filter(
-        UsuarioEvento.usuario_id == user_id
-    ).order_by(desc(UsuarioEvento.updated_at)).limit(5).all()
-    
-    for ue in recent_events:
-        # Determinar color/icono según estado
-        status_color = "#3B82F6" # Blue default
-        icon = "calendar"
-        
-        if ue.estado == 'Asistido':
-            status_color = "#10B981" # Green
-            icon = "checkmark-circle"
-        elif ue.estado == 'Ganador':
-            status_color = "#F59E0B" # Yellow
-            icon = "trophy"
-            
-        activities.append({
-            "id": str(ue.id),
-            "type": "event",
-            "title": ue.evento.titulo,
-            "date": ue.updated_at.strftime("%d %b %Y"),
-            "status": ue.estado,
-            "icon": icon,
-            "color": status_color,
-            "timestamp": ue.updated_at
-        })
-
-    # 2. Recent Challenges (usando ProgresoDesafioDiario)
-    from app.models.db_models import ProgresoDesafioDiario
-    
-    recent_challenge_progress = db.query(ProgresoDesafioDiario, DesafioDiario).join(
-        DesafioDiario,
-        ProgresoDesafioDiario.desafio_id == DesafioDiario.id
-    ).filter(
-        ProgresoDesafioDiario.usuario_id == user_id
-    ).order_by(desc(ProgresoDesafioDiario.created_at)).limit(5).all()
-    
-    for progreso, desafio in recent_challenge_progress:
-        date_ref = progreso.completado_at if progreso.completado_at else progreso.created_at
-        is_completed = progreso.estado == 'completado'
-        
-        activities.append({
-            "id": str(desafio.id),
-            "type": "challenge",
-            "title": desafio.titulo,
-            "date": date_ref.strftime("%d %b %Y") if date_ref else "",
-            "status": "Completado" if is_completed else "Pendiente",
-            "icon": "code-slash",
-            "color": "#8B5CF6" if is_completed else "#64748B", # Purple or Gray
-            "timestamp": date_ref
-        })
-
-    # 3. Manual Projects
-    manual_projects = db.query(ProyectoUsuario).filter(
-        ProyectoUsuario.usuario_id == user_id
-    ).order_by(desc(ProyectoUsuario.created_at)).all()
-    
-    for p in manual_projects:
-        activities.append({
-            "id": str(p.id),
-            "type": "project",
-            "title": p.titulo,
-            "date": p.created_at.strftime("%d %b %Y"),
-            "status": "Publicado",
-            "icon": "briefcase",  # distintivo para proyectos
-            "color": "#EC4899",   # Pink
-            "timestamp": p.created_at,
-            "description": p.descripcion,
-            "url_repositorio": p.url_repositorio,
-            "url_demo": p.url_demo,
-            "tecnologias": p.tecnologias
-        })
-
-    # Sort combined activities by timestamp desc
-    activities.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    # Clean up timestamp before sending
-    final_activities = []
-    for a in activities[:15]: # Increased limit to show more variety
-        a_copy = a.copy()
-        del a_copy['timestamp']
-        final_activities.append(a_copy)
-
-    # Use calculation from service if needed, but here we replicated logic for simplicity 
-    # or we can just send the raw computed values
+    actividad, _ = await db.run_sync(consultar_actividad, user.id, ACTIVIDAD_PERFIL)
     
     return {
         "id": str(user.id),
@@ -308,16 +244,36 @@ async def get_user_profile(
             "xp_next_level": xp_next_level,
             "xp_nivel_actual": xp_actual % 1000 # Send progress within level
         },
-        "intereses": [i.interes for i in user.intereses],
-        "lenguajes": [{"lenguaje": l.lenguaje, "nivel": l.nivel} for l in user.lenguajes],
-        "recent_activity": final_activities,
-        "unread_notifications_count": db.query(Notificacion).filter(
-            Notificacion.usuario_id == user_id,
-            Notificacion.leido == False
-        ).count()
+        "intereses": fila.intereses or [],
+        "lenguajes": fila.lenguajes or [],
+        "recent_activity": [serializar_actividad(a) for a in actividad],
+        "unread_notifications_count": fila.no_leidas
     }
 
 
+@router.get("/me/{user_id}/actividad")
+async def get_user_activity(
+    user_id: str,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    response: Response,
+    limite: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = None
+):
+    """
+    Feed de actividad del usuario paginado por cursor.
+    El cursor de la página siguiente va en la cabecera X-Next-Cursor.
+    """
+    from app.services.actividad import consultar_actividad, serializar_actividad
+    from app.services.paginacion import exponer_cursor
+    
+    actividad, siguiente = await db.run_sync(
+        lambda sesion: consultar_actividad(sesion, user_id, limite, cursor=cursor)
+    )
+    exponer_cursor(response, siguiente)
+    
+    return [serializar_actividad(a) for a in actividad]
+
+
 
 
 
@@ -325,23 +281,23 @@ async def get_user_profile(
 async def change_password(
     user_id: str,
     request: ChangePasswordRequest,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
-    user = db.query(Usuario).filter(Usuario.id == user_id).first()
+    user = await db.get(Usuario, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado"
         )
         
-    if not verify_password(request.current_password, user.password_hash):
+    if not await verify_password(request.current_password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="La contraseña actual es incorrecta"
         )
         
-    user.password_hash = hash_password(request.new_password)
-    db.commit()
+    user.password_hash = await hash_password(request.new_password)
+    await db.commit()
     
     return {"message": "Contraseña actualizada exitosamente"}
 
@@ -413,16 +369,19 @@ async def add_project(
 async def add_user_project(
     user_id: str,
     request: ProjectRequest,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     # Verify user exists
-    user = db.query(Usuario).filter(Usuario.id == user_id).first()
+    user = await db.get(Usuario, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
     try:
         # Defensive local import to avoid NameError if global import fails or circular dependency issues arise during reload
         from app.models.db_models import ProyectoUsuario
+        from app.services.gamification_service import XP_POR_PROYECTO, sumar_xp
+        from app.services.eventos_dominio import ProyectoAgregado, publicar_evento
+        from app.services.actividad import TIPO_PROYECTO, registrar_actividad
         
         new_project = ProyectoUsuario(
             usuario_id=user_id,
@@ -435,8 +394,24 @@ async def add_user_project(
         )
         
         db.add(new_project)
-        db.commit()
-        db.refresh(new_project)
+        await db.flush()
+        
+        def recompensar(sesion: Session):
+            sumar_xp(sesion, user_id, XP_POR_PROYECTO)
+            registrar_actividad(
+                sesion, user_id, TIPO_PROYECTO, new_project.id, new_project.titulo, "Publicado",
+                datos={
+                    "descripcion": new_project.descripcion,
+                    "url_repositorio": new_project.url_repositorio,
+                    "url_demo": new_project.url_demo,
+                    "tecnologias": new_project.tecnologias
+                }
+            )
+        
+        await db.run_sync(recompensar)
+        await db.commit()
+        
+        publicar_evento(ProyectoAgregado(usuario_id=user_id, proyecto_id=str(new_project.id)))
         
         return {"status": "success", "message": "Proyecto agregado", "project_id": str(new_project.id)}
     except Exception as e:
@@ -446,11 +421,13 @@ async def add_user_project(
 @router.get("/me/{user_id}/notifications")
 async def get_notifications(
     user_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
-    notifications = db.query(Notificacion).filter(
-        Notificacion.usuario_id == user_id
-    ).order_by(desc(Notificacion.created_at)).all()
+    notifications = (await db.scalars(
+        select(Notificacion).where(
+            Notificacion.usuario_id == user_id
+        ).order_by(desc(Notificacion.created_at))
+    )).all()
     
     return [
         {
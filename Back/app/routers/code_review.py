@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import Annotated
 from pydantic import BaseModel
 from app.database import get_db
 from app.services.ia_service import IAService, get_ia_service
+from app.services.ia_cache import get_pista_cache, get_review_cache
+from app.services.cuotas_ia import consumir_cuota_ia, estimar_tokens, sujeto_cuota
+from app.services.paginacion import exponer_cursor, paginar
 
 router = APIRouter()
 
@@ -17,16 +20,29 @@ class CodeReviewRequest(BaseModel):
 class PistaRequest(BaseModel):
     codigo: str
     lenguaje: str
+    # Opcional: sin usuario la cuota de IA se cuenta por IP
+    usuario_id: str | None = None
 
 
 @router.post("/")
 async def solicitar_code_review(
     request: CodeReviewRequest,
+    http_request: Request,
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
     ia_service: Annotated[IAService, Depends(get_ia_service)]
 ):
     from app.models.db_models import Usuario
     
+    sujeto = sujeto_cuota(http_request, db, request.usuario_id)
+    
+    async def cobrar_cuota():
+        # Solo en un fallo de caché: las respuestas cacheadas no gastan modelo
+        await consumir_cuota_ia(
+            response, "code_review", sujeto,
+            estimar_tokens("code_review", request.codigo)
+        )
+    
     try:
         usuario = db.query(Usuario).filter(Usuario.id == request.usuario_id).first()
         informacion_usuario = {
@@ -37,7 +53,8 @@ async def solicitar_code_review(
             usuario_id=request.usuario_id,
             codigo=request.codigo,
             lenguaje=request.lenguaje,
-            informacion_usuario=informacion_usuario
+            informacion_usuario=informacion_usuario,
+            antes_de_generar=cobrar_cuota
         )
         
         if not review:
@@ -50,6 +67,8 @@ async def solicitar_code_review(
             "status": "success",
             "review": review
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -57,13 +76,29 @@ async def solicitar_code_review(
         )
 
 
+@router.get("/cache/stats")
+async def obtener_stats_cache_ia():
+    """
+    Contadores de las cachés de code review y pistas (hits/misses).
+    """
+    return {
+        "status": "success",
+        "stats": {
+            "review": get_review_cache().stats(),
+            "pista": get_pista_cache().stats()
+        }
+    }
+
+
 @router.get("/historial")
 async def obtener_historial_reviews(
     usuario_id: str,
     db: Annotated[Session, Depends(get_db)],
+    response: Response,
     lenguaje: str | None = None,
-    limite: int = 20,
-    skip: int = 0
+    limite: int = Query(default=20, ge=1, le=100),
+    skip: int = Query(default=0, ge=0),
+    cursor: str | None = None
 ):
     from app.models.db_models import RevisionCodigo
     
@@ -74,9 +109,13 @@ async def obtener_historial_reviews(
     if lenguaje:
         query = query.filter(RevisionCodigo.lenguaje == lenguaje)
     
-    revisiones = query.order_by(
-        RevisionCodigo.created_at.desc()
-    ).offset(skip).limit(limite).all()
+    revisiones, siguiente, _ = paginar(
+        query,
+        [(RevisionCodigo.created_at, True), (RevisionCodigo.id, True)],
+        lambda r: [r.created_at, r.id],
+        limite, cursor=cursor, skip=skip
+    )
+    exponer_cursor(response, siguiente)
     
     return revisiones
 
@@ -84,9 +123,19 @@ async def obtener_historial_reviews(
 @router.post("/pistas/generar")
 async def generar_pista(
     request: PistaRequest,
+    http_request: Request,
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
     ia_service: Annotated[IAService, Depends(get_ia_service)]
 ):
+    sujeto = sujeto_cuota(http_request, db, request.usuario_id)
+    
+    async def cobrar_cuota():
+        await consumir_cuota_ia(
+            response, "pista", sujeto,
+            estimar_tokens("pista", request.codigo)
+        )
+    
     try:
         informacion_usuario = {
             "nombre": "Usuario"
@@ -95,7 +144,8 @@ async def generar_pista(
         pista = await ia_service.generar_pista_codigo(
             codigo=request.codigo,
             lenguaje=request.lenguaje,
-            informacion_usuario=informacion_usuario
+            informacion_usuario=informacion_usuario,
+            antes_de_generar=cobrar_cuota
         )
         
         if not pista:
@@ -108,6 +158,8 @@ async def generar_pista(
             "status": "success",
             "pista": pista
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,87 +1,133 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Annotated
 from pydantic import BaseModel
 import json
 from datetime import datetime
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.services.ia_service import IAService, get_ia_service
-from app.services.code_executor import ejecutar_codigo
+from app.services.cuotas_ia import consumir_cuota_ia, estimar_tokens, sujeto_cuota
+from app.services.code_executor import ejecutar_codigo_memoizado, get_resultados_cache
+from app.services.paginacion import exponer_cursor, paginar_async
 
 router = APIRouter()
 
 
+async def _upsert_progreso(db: AsyncSession, usuario_id: str, desafio_id, valores: dict, al_actualizar: dict):
+    """
+    Crea u obtiene el progreso del usuario en un único INSERT ... SELECT ...
+    ON CONFLICT DO UPDATE ... RETURNING. El SELECT sobre usuarios hace de
+    comprobación de existencia: sin usuario no se inserta ni se devuelve nada.
+    
+    Returns:
+        Fila (id, estado, completado_at, insertado) o None si el usuario no existe
+    """
+    from uuid import uuid4
+    from sqlalchemy import literal, literal_column
+    from sqlalchemy.dialects.postgresql import insert
+    from app.models.db_models import ProgresoDesafioDiario, Usuario
+    
+    columnas = ["id", "usuario_id", "desafio_id", *valores]
+    origen = select(
+        literal(uuid4(), ProgresoDesafioDiario.id.type),
+        Usuario.id,
+        literal(desafio_id, ProgresoDesafioDiario.desafio_id.type),
+        *[literal(v, getattr(ProgresoDesafioDiario, c).type) for c, v in valores.items()]
+    ).where(Usuario.id == usuario_id)
+    
+    stmt = insert(ProgresoDesafioDiario).from_select(columnas, origen)
+    stmt = stmt.on_conflict_do_update(
+        constraint="unique_usuario_desafio",
+        set_=al_actualizar
+    ).returning(
+        ProgresoDesafioDiario.id,
+        ProgresoDesafioDiario.estado,
+        ProgresoDesafioDiario.completado_at,
+        # xmax = 0 solo en filas recién insertadas
+        literal_column("(xmax = 0)").label("insertado")
+    )
+    return (await db.execute(stmt)).first()
+
+
 @router.get("/hoy")
 async def obtener_desafio_del_dia(
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)],
-    ia_service: Annotated[IAService, Depends(get_ia_service)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     """
     Obtiene el desafío global del día y el progreso del usuario.
     Si no existe desafío para hoy, lo genera automáticamente.
+    
+    El desafío serializado sale de la caché del día; por petición solo se
+    hace el upsert del progreso del usuario.
     """
-    from app.models.db_models import DesafioDiario, ProgresoDesafioDiario, Usuario
+    from app.models.db_models import DesafioDiario, ProgresoDesafioDiario
+    from app.services.desafio_cache import get_cache_desafio_del_dia
     
     hoy = datetime.now().date()
-    
-    # Buscar el desafío global del día
-    desafio = db.query(DesafioDiario).filter(
-        DesafioDiario.fecha == hoy
-    ).first()
-    
-    # Si no existe, generar uno nuevo (desafío global)
-    if not desafio:
-        desafio = await ia_service.generar_desafio_global()
+    cache = get_cache_desafio_del_dia()
+    
+    entrada = cache.obtener(hoy)
+    if entrada is None:
+        # Buscar el desafío global del día
+        desafio = await db.scalar(select(DesafioDiario).where(
+            DesafioDiario.fecha == hoy
+        ))
+        
+        # Si no existe, generar uno nuevo (desafío global). La generación usa
+        # su propia sesión fuera del loop; aquí se carga con la AsyncSession
         if not desafio:
-            raise HTTPException(
-                status_code=500,
-                detail="No se pudo generar el desafío del día"
-            )
-    
-    # Verificar que el usuario existe
-    usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
-    if not usuario:
+            desafio_id = await IAService().generar_id_desafio_global(hoy)
+            desafio = await db.get(DesafioDiario, desafio_id) if desafio_id else None
+            if not desafio:
+                raise HTTPException(
+                    status_code=500,
+                    detail="No se pudo generar el desafío del día"
+                )
+        
+        entrada = cache.guardar(hoy, str(desafio.id), desafio.titulo, serializar_desafio_base(desafio))
+    
+    # Obtener o crear el progreso del usuario (el UPDATE no cambia nada)
+    progreso = await _upsert_progreso(
+        db, usuario_id, entrada.desafio_id,
+        valores={"estado": "pendiente"},
+        al_actualizar={"estado": ProgresoDesafioDiario.estado}
+    )
+    if progreso is None:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    # Buscar o crear el progreso del usuario para este desafío
-    progreso = db.query(ProgresoDesafioDiario).filter(
-        ProgresoDesafioDiario.usuario_id == usuario_id,
-        ProgresoDesafioDiario.desafio_id == desafio.id
-    ).first()
-    
-    if not progreso:
-        # Crear registro de progreso para el usuario
-        progreso = ProgresoDesafioDiario(
-            usuario_id=usuario_id,
-            desafio_id=desafio.id,
-            estado='pendiente'
+    if progreso.insertado:
+        from app.services.actividad import TIPO_DESAFIO, registrar_actividad
+        await db.run_sync(
+            registrar_actividad, usuario_id, TIPO_DESAFIO, entrada.desafio_id, entrada.titulo, progreso.estado
         )
-        db.add(progreso)
-        db.commit()
-        db.refresh(progreso)
+    await db.commit()
     
-    # Serializar el desafío con el estado del usuario
-    return serialize_desafio_con_progreso(desafio, progreso)
+    # Desafío ya codificado + estado del usuario
+    return Response(
+        content=cache.componer(entrada, serializar_progreso(progreso)),
+        media_type="application/json"
+    )
 
 
-def serialize_desafio_con_progreso(desafio, progreso=None) -> dict:
-    """Convierte un objeto DesafioDiario y su progreso a diccionario."""
-    if desafio is None:
-        return None
-    
-    def parse_json_field(value, default):
-        """Parsea un campo que puede ser string JSON o ya un dict/list."""
-        if value is None:
+def parse_json_field(value, default):
+    """Parsea un campo que puede ser string JSON o ya un dict/list."""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
             return default
-        if isinstance(value, str):
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return default
-        return value
-    
-    resultado = {
+    return value
+
+
+def serializar_desafio_base(desafio) -> dict:
+    """Campos del desafío comunes a todos los usuarios."""
+    return {
         "id": str(desafio.id),
         "fecha": desafio.fecha.isoformat() if desafio.fecha else None,
         "titulo": desafio.titulo,
@@ -96,18 +142,25 @@ def serialize_desafio_con_progreso(desafio, progreso=None) -> dict:
         "xp_recompensa": desafio.xp_recompensa,
         "created_at": desafio.created_at.isoformat() if desafio.created_at else None,
     }
-    
-    # Agregar información de progreso del usuario si existe
+
+
+def serializar_progreso(progreso=None) -> dict:
+    """Campos de progreso del usuario en un desafío."""
     if progreso:
-        resultado["estado"] = progreso.estado
-        resultado["completado_at"] = progreso.completado_at.isoformat() if progreso.completado_at else None
-        resultado["progreso_id"] = str(progreso.id)
-    else:
-        resultado["estado"] = "pendiente"
-        resultado["completado_at"] = None
-        resultado["progreso_id"] = None
-    
-    return resultado
+        return {
+            "estado": progreso.estado,
+            "completado_at": progreso.completado_at.isoformat() if progreso.completado_at else None,
+            "progreso_id": str(progreso.id),
+        }
+    return {"estado": "pendiente", "completado_at": None, "progreso_id": None}
+
+
+def serialize_desafio_con_progreso(desafio, progreso=None) -> dict:
+    """Convierte un objeto DesafioDiario y su progreso a diccionario."""
+    if desafio is None:
+        return None
+    
+    return {**serializar_desafio_base(desafio), **serializar_progreso(progreso)}
 
 
 # Mantener compatibilidad con código antiguo
@@ -118,8 +171,11 @@ def serialize_desafio(desafio) -> dict:
 
 @router.post("/generar")
 async def generar_nuevo_desafio(
+    request: Request,
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
-    ia_service: Annotated[IAService, Depends(get_ia_service)]
+    ia_service: Annotated[IAService, Depends(get_ia_service)],
+    usuario_id: str | None = None
 ):
     """
     Genera un nuevo desafío global del día (solo si no existe uno para hoy).
@@ -141,6 +197,13 @@ async def generar_nuevo_desafio(
             "message": "Ya existe un desafío para hoy"
         }
     
+    # Solo se descuenta cuota cuando de verdad se llama a la IA
+    await consumir_cuota_ia(
+        response, "desafio",
+        sujeto_cuota(request, db, usuario_id),
+        estimar_tokens("desafio")
+    )
+    
     desafio = await ia_service.generar_desafio_global()
     
     if not desafio:
@@ -156,13 +219,30 @@ async def generar_nuevo_desafio(
     }
 
 
+@router.get("/cache/stats")
+async def obtener_stats_cache_ejecucion():
+    """
+    Contadores de la caché de resultados de ejecución y de la del desafío
+    del día (hits/misses).
+    """
+    from app.services.desafio_cache import get_cache_desafio_del_dia
+    
+    return {
+        "status": "success",
+        "stats": get_resultados_cache().stats(),
+        "desafio_del_dia": get_cache_desafio_del_dia().stats()
+    }
+
+
 @router.get("/historial")
 async def obtener_historial(
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    response: Response,
     estado: str | None = None,
-    limite: int = 20,
-    skip: int = 0
+    limite: int = Query(default=20, ge=1, le=100),
+    skip: int = Query(default=0, ge=0),
+    cursor: str | None = None
 ):
     """
     Obtiene el historial de desafíos del usuario con su progreso.
@@ -170,19 +250,24 @@ async def obtener_historial(
     from app.models.db_models import DesafioDiario, ProgresoDesafioDiario
     
     # Consulta con join para obtener desafíos y progreso del usuario
-    query = db.query(ProgresoDesafioDiario, DesafioDiario).join(
+    query = select(ProgresoDesafioDiario, DesafioDiario).join(
         DesafioDiario,
         ProgresoDesafioDiario.desafio_id == DesafioDiario.id
-    ).filter(
+    ).where(
         ProgresoDesafioDiario.usuario_id == usuario_id
     )
     
     if estado:
-        query = query.filter(ProgresoDesafioDiario.estado == estado)
-    
-    resultados = query.order_by(
-        DesafioDiario.fecha.desc()
-    ).offset(skip).limit(limite).all()
+        query = query.where(ProgresoDesafioDiario.estado == estado)
+    
+    resultados, siguiente, _ = await paginar_async(
+        db,
+        query,
+        [(DesafioDiario.fecha, True), (ProgresoDesafioDiario.id, True)],
+        lambda fila: [fila[1].fecha, fila[0].id],
+        limite, cursor=cursor, skip=skip
+    )
+    exponer_cursor(response, siguiente)
     
     # Serializar resultados
     return [
@@ -195,24 +280,61 @@ async def obtener_historial(
 async def marcar_completado(
     desafio_id: str,
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     """
     Marca el progreso del usuario en un desafío como completado.
+    Solo la primera vez (completado_at aún nulo) suma la recompensa de XP del
+    desafío, actualiza la racha y registra la actividad: el UPDATE
+    condicional es atómico, así que ni completar → abandonar → completar ni
+    peticiones en paralelo vuelven a recompensar.
     """
-    from app.models.db_models import ProgresoDesafioDiario
+    from app.models.db_models import DesafioDiario, ProgresoDesafioDiario
+    from app.services.gamification_service import sumar_xp
+    from app.services.eventos_dominio import DesafioCompletado, publicar_evento
+    from app.services.rachas import actualizar_racha_al_completar
+    from app.services.actividad import TIPO_DESAFIO, registrar_actividad
     
-    progreso = db.query(ProgresoDesafioDiario).filter(
+    del_usuario = (
         ProgresoDesafioDiario.desafio_id == desafio_id,
         ProgresoDesafioDiario.usuario_id == usuario_id
-    ).first()
+    )
+    ahora = datetime.now()
     
-    if not progreso:
-        raise HTTPException(status_code=404, detail="Progreso de desafío no encontrado")
+    progreso_id = await db.scalar(
+        update(ProgresoDesafioDiario)
+        .where(*del_usuario, ProgresoDesafioDiario.completado_at.is_(None))
+        .values(estado='completado', completado_at=ahora)
+        .returning(ProgresoDesafioDiario.id)
+    )
     
-    progreso.estado = 'completado'
-    progreso.completado_at = datetime.now()
-    db.commit()
+    if progreso_id is None:
+        # Ya se completó antes: solo se restablece el estado, sin recompensa
+        existente = await db.scalar(
+            update(ProgresoDesafioDiario)
+            .where(*del_usuario)
+            .values(estado='completado')
+            .returning(ProgresoDesafioDiario.id)
+        )
+        if existente is None:
+            raise HTTPException(status_code=404, detail="Progreso de desafío no encontrado")
+        await db.commit()
+        return {"message": "Desafío completado exitosamente"}
+    
+    xp_recompensa, titulo = (await db.execute(select(
+        DesafioDiario.xp_recompensa, DesafioDiario.titulo
+    ).where(DesafioDiario.id == desafio_id))).one()
+    
+    def recompensar(sesion: Session):
+        sumar_xp(sesion, usuario_id, xp_recompensa or 0)
+        actualizar_racha_al_completar(sesion, usuario_id, progreso_id, ahora.date())
+        registrar_actividad(sesion, usuario_id, TIPO_DESAFIO, desafio_id, titulo, 'completado')
+    
+    # Servicios síncronos sobre la misma conexión/transacción
+    await db.run_sync(recompensar)
+    await db.commit()
+    
+    publicar_evento(DesafioCompletado(usuario_id=usuario_id, desafio_id=desafio_id))
     
     return {"message": "Desafío completado exitosamente"}
 
@@ -221,23 +343,23 @@ async def marcar_completado(
 async def marcar_abandonado(
     desafio_id: str,
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     """
     Marca el progreso del usuario en un desafío como abandonado.
     """
     from app.models.db_models import ProgresoDesafioDiario
     
-    progreso = db.query(ProgresoDesafioDiario).filter(
+    progreso = await db.scalar(select(ProgresoDesafioDiario).where(
         ProgresoDesafioDiario.desafio_id == desafio_id,
         ProgresoDesafioDiario.usuario_id == usuario_id
-    ).first()
+    ))
     
     if not progreso:
         raise HTTPException(status_code=404, detail="Progreso de desafío no encontrado")
     
     progreso.estado = 'abandonado'
-    db.commit()
+    await db.commit()
     
     return {"message": "Desafío marcado como abandonado"}
 
@@ -245,6 +367,7 @@ async def marcar_abandonado(
 class EjecutarCodigoRequest(BaseModel):
     codigo: str
     lenguaje: str
+    analizar_complejidad: bool = False
 
 
 @router.post("/{desafio_id}/ejecutar")
@@ -252,42 +375,55 @@ async def ejecutar_codigo_desafio(
     desafio_id: str,
     usuario_id: str,
     request: EjecutarCodigoRequest,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     """
     Ejecuta el código del usuario contra los casos de prueba del desafío.
     Guarda el código y lenguaje usado en el progreso.
+    
+    Con analizar_complejidad=True, si todos los casos pasan, también estima la
+    complejidad temporal con entradas escaladas y la compara con la declarada.
     """
+    from sqlalchemy import case, func
     from app.models.db_models import DesafioDiario, ProgresoDesafioDiario
     
     # Obtener el desafío global
-    desafio = db.query(DesafioDiario).filter(
+    desafio = await db.scalar(select(DesafioDiario).where(
         DesafioDiario.id == desafio_id
-    ).first()
+    ))
     
-    if not desafio:
+    # Los desafíos pre-generados no se publican antes de su fecha
+    if not desafio or desafio.fecha > datetime.now().date():
         raise HTTPException(status_code=404, detail="Desafío no encontrado")
     
-    # Obtener o crear el progreso del usuario
-    progreso = db.query(ProgresoDesafioDiario).filter(
-        ProgresoDesafioDiario.desafio_id == desafio_id,
-        ProgresoDesafioDiario.usuario_id == usuario_id
-    ).first()
+    # Crear o actualizar el progreso con el código y lenguaje usado
+    progreso = await _upsert_progreso(
+        db, usuario_id, desafio.id,
+        valores={
+            "estado": "en_progreso",
+            "codigo_enviado": request.codigo,
+            "lenguaje_usado": request.lenguaje
+        },
+        al_actualizar={
+            "codigo_enviado": request.codigo,
+            "lenguaje_usado": request.lenguaje,
+            "estado": case(
+                (ProgresoDesafioDiario.estado == "pendiente", "en_progreso"),
+                else_=ProgresoDesafioDiario.estado
+            ),
+            "updated_at": func.now()
+        }
+    )
+    if progreso is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    if not progreso:
-        progreso = ProgresoDesafioDiario(
-            usuario_id=usuario_id,
-            desafio_id=desafio_id,
-            estado='en_progreso'
+    if progreso.insertado:
+        from app.services.actividad import TIPO_DESAFIO, registrar_actividad
+        await db.run_sync(
+            registrar_actividad, usuario_id, TIPO_DESAFIO, desafio.id, desafio.titulo, progreso.estado
         )
-        db.add(progreso)
-    
-    # Actualizar el código y lenguaje usado
-    progreso.codigo_enviado = request.codigo
-    progreso.lenguaje_usado = request.lenguaje
-    if progreso.estado == 'pendiente':
-        progreso.estado = 'en_progreso'
-    db.commit()
+    await db.commit()
     
     # Obtener casos de prueba
     casos_prueba = desafio.casos_prueba_json or []
@@ -298,13 +434,28 @@ async def ejecutar_codigo_desafio(
             detail="No hay casos de prueba definidos para este desafío"
         )
     
-    # Ejecutar el código
-    resultados = ejecutar_codigo(
+    # Ejecutar el código (fuera del event loop; reenvíos idénticos salen de caché)
+    resultados = await ejecutar_codigo_memoizado(
+        desafio_id=desafio_id,
         codigo=request.codigo,
         lenguaje=request.lenguaje,
         casos_prueba=casos_prueba
     )
     
+    if request.analizar_complejidad and resultados["exito"]:
+        from app.services.complejidad import estimar_complejidad
+        
+        # Copia: el resultado memoizado se comparte entre peticiones
+        resultados = {
+            **resultados,
+            "complejidad_empirica": await estimar_complejidad(
+                codigo=request.codigo,
+                lenguaje=request.lenguaje,
+                casos_prueba=casos_prueba,
+                restricciones=parse_json_field(desafio.restricciones_json, {})
+            )
+        }
+    
     return {
         "status": "success" if resultados["exito"] else "error",
         "resultados": resultados
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Annotated
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.services.ia_service import IAService, get_ia_service
-from sqlalchemy import func
+from app.services.cuotas_ia import consumir_cuota_ia, estimar_tokens, sujeto_cuota
+from app.services.paginacion import exponer_cursor, paginar_async
+from sqlalchemy import func, select
 
 router = APIRouter()
 
@@ -13,21 +16,30 @@ from datetime import datetime
 
 @router.get("/")
 async def listar_eventos(
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    response: Response,
     categoria: str | None = None,
-    limite: int = 50,
-    skip: int = 0
+    limite: int = Query(default=50, ge=1, le=100),
+    skip: int = Query(default=0, ge=0),
+    cursor: str | None = None
 ):
     print(f"DEBUG: Listing events - Category: {categoria}, Limit: {limite}, Skip: {skip}")
     
-    query = db.query(Evento).filter(Evento.fecha >= datetime.now().date())
+    query = select(Evento).where(Evento.fecha >= datetime.now().date())
     
     if categoria:
         print(f"DEBUG: Filtering by category: '{categoria}'")
         # Case-insensitive filter just in case
-        query = query.filter(func.lower(Evento.categoria) == categoria.lower())
-    
-    eventos = query.order_by(Evento.fecha.asc()).offset(skip).limit(limite).all()
+        query = query.where(func.lower(Evento.categoria) == categoria.lower())
+    
+    eventos, siguiente, _ = await paginar_async(
+        db,
+        query,
+        [(Evento.fecha, False), (Evento.id, False)],
+        lambda e: [e.fecha, e.id],
+        limite, cursor=cursor, skip=skip
+    )
+    exponer_cursor(response, siguiente)
     print(f"DEBUG: Found {len(eventos)} events")
     return eventos
 
@@ -36,13 +48,13 @@ async def listar_eventos(
 @router.get("/guardados")
 async def listar_eventos_guardados(
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     from app.models.db_models import Evento, EventoGuardado
     
-    eventos = db.query(Evento).join(EventoGuardado).filter(
-        EventoGuardado.usuario_id == usuario_id
-    ).all()
+    eventos = (await db.scalars(
+        select(Evento).join(EventoGuardado).where(EventoGuardado.usuario_id == usuario_id)
+    )).all()
     
     return eventos
 
@@ -50,11 +62,11 @@ async def listar_eventos_guardados(
 @router.get("/{evento_id}")
 async def obtener_detalle_evento(
     evento_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     from app.models.db_models import Evento
     
-    evento = db.query(Evento).filter(Evento.id == evento_id).first()
+    evento = await db.get(Evento, evento_id)
     if not evento:
         raise HTTPException(status_code=404, detail="Evento no encontrado")
     
@@ -63,10 +75,19 @@ async def obtener_detalle_evento(
 
 @router.post("/generar")
 async def generar_eventos(
+    request: Request,
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
     ia_service: Annotated[IAService, Depends(get_ia_service)],
-    limite: int = 15
+    limite: int = 15,
+    usuario_id: str | None = None
 ):
+    await consumir_cuota_ia(
+        response, "eventos",
+        sujeto_cuota(request, db, usuario_id),
+        estimar_tokens("eventos", unidades=limite)
+    )
+    
     try:
         nuevos, duplicados = await ia_service.generar_y_guardar_eventos(limite=limite)
         
@@ -88,14 +109,14 @@ async def generar_eventos(
 async def guardar_evento(
     evento_id: str,
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     from app.models.db_models import EventoGuardado
     
-    ya_guardado = db.query(EventoGuardado).filter(
+    ya_guardado = await db.scalar(select(EventoGuardado.id).where(
         EventoGuardado.usuario_id == usuario_id,
         EventoGuardado.evento_id == evento_id
-    ).first()
+    ))
     
     if ya_guardado:
         raise HTTPException(status_code=400, detail="Evento ya está guardado")
@@ -105,7 +126,7 @@ async def guardar_evento(
         evento_id=evento_id
     )
     db.add(evento_guardado)
-    db.commit()
+    await db.commit()
     
     return {"message": "Evento guardado exitosamente"}
 
@@ -114,20 +135,20 @@ async def guardar_evento(
 async def eliminar_evento_guardado(
     evento_id: str,
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     from app.models.db_models import EventoGuardado
     
-    evento_guardado = db.query(EventoGuardado).filter(
+    evento_guardado = await db.scalar(select(EventoGuardado).where(
         EventoGuardado.usuario_id == usuario_id,
         EventoGuardado.evento_id == evento_id
-    ).first()
+    ))
     
     if not evento_guardado:
         raise HTTPException(status_code=404, detail="Evento no encontrado en favoritos")
     
-    db.delete(evento_guardado)
-    db.commit()
+    await db.delete(evento_guardado)
+    await db.commit()
     
     return {"message": "Evento eliminado de favoritos"}
 
@@ -136,14 +157,15 @@ async def eliminar_evento_guardado(
 async def registrar_asistencia(
     evento_id: str,
     usuario_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     from app.models.db_models import UsuarioEvento
+    from app.services.actividad import TIPO_EVENTO, registrar_actividad
     
-    ya_registrado = db.query(UsuarioEvento).filter(
+    ya_registrado = await db.scalar(select(UsuarioEvento.id).where(
         UsuarioEvento.usuario_id == usuario_id,
         UsuarioEvento.evento_id == evento_id
-    ).first()
+    ))
     
     if ya_registrado:
         raise HTTPException(status_code=400, detail="Ya estás registrado en este evento")
@@ -154,20 +176,31 @@ async def registrar_asistencia(
         estado='Registrado'
     )
     db.add(registro)
-    db.commit()
+    await db.flush()
+    
+    titulo_evento = await db.scalar(select(Evento.titulo).where(Evento.id == evento_id))
+    
+    # Registrarse no da XP: la del evento la aplica el trigger xp_asistencia_evento
+    # (migrations/add_xp_total.sql) cuando el estado pasa a Asistido/Completado/Ganador
+    await db.run_sync(
+        lambda sesion: registrar_actividad(
+            sesion, usuario_id, TIPO_EVENTO, registro.id, titulo_evento or "Evento", registro.estado
+        )
+    )
+    await db.commit()
     
     return {"message": "Registro exitoso"}
 
 
 @router.post("/fix-images")
 async def fix_event_images(
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ):
     from app.models.db_models import Evento
     from app.services.eventos_generator import DEFAULT_IMAGES
     import random
     
-    eventos = db.query(Evento).all()
+    eventos = (await db.scalars(select(Evento))).all()
     count = 0
     
     for evento in eventos:
@@ -202,7 +235,7 @@ async def fix_event_images(
             print(f"Updated event '{evento.titulo}' with new image: {new_image}")
             
     if count > 0:
-        db.commit()
+        await db.commit()
         
     return {"message": f"Se actualizaron {count} eventos con imágenes por defecto"}
 
@@ -3,44 +3,52 @@ Rutas de API para el sistema de gamificación: Leaderboard y Badges.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated, Optional
-from app.database import get_db
-from app.services.gamification_service import GamificationService, get_gamification_service
+from app.database import get_async_db
+from app.services.gamification_service import GamificationService
 
 router = APIRouter()
 
 
 @router.get("/leaderboard")
 async def get_leaderboard(
-    limite: int = Query(default=100, le=500, description="Número de usuarios a retornar"),
+    limite: int = Query(default=100, ge=1, le=500, description="Número de usuarios a retornar"),
     offset: int = Query(default=0, ge=0, description="Paginación"),
     lenguaje: Optional[str] = Query(default=None, description="Filtrar por lenguaje"),
-    service: Annotated[GamificationService, Depends(get_gamification_service)] = None
+    cursor: Optional[str] = Query(default=None, description="Cursor de la página siguiente"),
+    db: Annotated[AsyncSession, Depends(get_async_db)] = None
 ):
     """
     Obtiene el leaderboard global de usuarios ordenado por XP.
     
     Query params:
     - limite: Cantidad de resultados (max 500)
-    - offset: Para paginación
+    - offset: Para paginación (obsoleto, usar cursor)
     - lenguaje: Filtro opcional por lenguaje (ej: "Python", "JavaScript")
+    - cursor: Valor `next_cursor` de la respuesta anterior
     
     Returns:
         Lista de usuarios con ranking, nombre, nivel, XP, racha y badges
     """
     try:
-        leaderboard = service.get_leaderboard(
-            limite=limite,
-            offset=offset,
-            filtro_lenguaje=lenguaje
+        leaderboard, next_cursor = await db.run_sync(
+            lambda sesion: GamificationService(sesion).get_leaderboard(
+                limite=limite,
+                offset=offset,
+                filtro_lenguaje=lenguaje,
+                cursor=cursor
+            )
         )
         
         return {
             "status": "success",
             "total": len(leaderboard),
-            "leaderboard": leaderboard
+            "leaderboard": leaderboard,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -51,7 +59,7 @@ async def get_leaderboard(
 @router.get("/ranking/{usuario_id}")
 async def get_usuario_ranking(
     usuario_id: str,
-    service: Annotated[GamificationService, Depends(get_gamification_service)] = None
+    db: Annotated[AsyncSession, Depends(get_async_db)] = None
 ):
     """
     Obtiene el ranking específico de un usuario.
@@ -60,7 +68,9 @@ async def get_usuario_ranking(
         Posición en el leaderboard global, XP total, nivel y percentil
     """
     try:
-        ranking_data = service.get_usuario_ranking(usuario_id)
+        ranking_data = await db.run_sync(
+            lambda sesion: GamificationService(sesion).get_usuario_ranking(usuario_id)
+        )
         
         if ranking_data["ranking_global"] is None:
             raise HTTPException(
@@ -84,7 +94,7 @@ async def get_usuario_ranking(
 @router.get("/badges/{usuario_id}")
 async def get_badges_usuario(
     usuario_id: str,
-    service: Annotated[GamificationService, Depends(get_gamification_service)] = None
+    db: Annotated[AsyncSession, Depends(get_async_db)] = None
 ):
     """
     Obtiene todos los badges de un usuario.
@@ -94,7 +104,9 @@ async def get_badges_usuario(
         - proximos: Badges cercanos a desbloquear con progreso
     """
     try:
-        badges_data = service.get_badges_usuario(usuario_id)
+        badges_data = await db.run_sync(
+            lambda sesion: GamificationService(sesion).get_badges_usuario(usuario_id)
+        )
         
         return {
             "status": "success",
@@ -110,21 +122,22 @@ async def get_badges_usuario(
 @router.post("/badges/verificar/{usuario_id}")
 async def verificar_badges(
     usuario_id: str,
-    service: Annotated[GamificationService, Depends(get_gamification_service)] = None
+    db: Annotated[AsyncSession, Depends(get_async_db)] = None
 ):
     """
     Verifica y desbloquea nuevos badges para un usuario.
     
-    Este endpoint se debe llamar después de acciones importantes:
-    - Completar un desafío
-    - Asistir a un evento
-    - Subir de nivel
+    Completar un desafío, asistir a un evento o agregar un proyecto ya
+    publican un evento de dominio que recalcula los badges en segundo plano;
+    este endpoint queda para forzar la verificación de forma síncrona.
     
     Returns:
         Lista de badges recién desbloqueados (si hay)
     """
     try:
-        nuevos_badges = service.verificar_y_desbloquear_badges(usuario_id)
+        nuevos_badges = await db.run_sync(
+            lambda sesion: GamificationService(sesion).verificar_y_desbloquear_badges(usuario_id)
+        )
         
         return {
             "status": "success",
@@ -140,7 +153,7 @@ async def verificar_badges(
 
 @router.get("/stats/global")
 async def get_stats_globales(
-    db: Annotated[Session, Depends(get_db)] = None
+    db: Annotated[AsyncSession, Depends(get_async_db)] = None
 ):
     """
     Estadísticas globales de la plataforma para mostrar en leaderboard.
@@ -148,18 +161,22 @@ async def get_stats_globales(
     Returns:
         Total de usuarios activos, desafíos completados, eventos y XP generado
     """
-    from app.models.db_models import Usuario, ProgresoDesafioDiario, UsuarioEvento
+    from app.models.db_models import Usuario, PerfilUsuario, ProgresoDesafioDiario, UsuarioEvento
+    from sqlalchemy import func, select
     
     try:
-        total_usuarios = db.query(Usuario).count()
-        
-        desafios_completados = db.query(ProgresoDesafioDiario).filter(
-            ProgresoDesafioDiario.estado == "completado"
-        ).count()
-        
-        eventos_asistidos = db.query(UsuarioEvento).filter(
-            UsuarioEvento.estado.in_(["Asistido", "Completado", "Ganador"])
-        ).count()
+        # Los cuatro conteos en una sola consulta
+        fila = (await db.execute(select(
+            select(func.count(Usuario.id)).scalar_subquery(),
+            select(func.count(ProgresoDesafioDiario.id)).where(
+                ProgresoDesafioDiario.estado == "completado"
+            ).scalar_subquery(),
+            select(func.count(UsuarioEvento.id)).where(
+                UsuarioEvento.estado.in_(["Asistido", "Completado", "Ganador"])
+            ).scalar_subquery(),
+            select(func.coalesce(func.sum(PerfilUsuario.xp_total), 0)).scalar_subquery()
+        ))).one()
+        total_usuarios, desafios_completados, eventos_asistidos, xp_generado_total = fila
         
         return {
             "status": "success",
@@ -167,7 +184,7 @@ async def get_stats_globales(
                 "total_usuarios": total_usuarios,
                 "desafios_completados": desafios_completados,
                 "eventos_asistidos": eventos_asistidos,
-                "xp_generado_total": desafios_completados * 50 + eventos_asistidos * 150
+                "xp_generado_total": xp_generado_total
             }
         }
     except Exception as e:
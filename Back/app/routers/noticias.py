@@ -1,50 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Annotated
-from app.database import get_db
+from typing import Annotated, Optional
+from app.database import get_async_db, get_db
 from app.services.ia_service import IAService, get_ia_service
+from app.services.cuotas_ia import consumir_cuota_ia, estimar_tokens, sujeto_cuota
+from app.services.paginacion import exponer_cursor, paginar_async
 
 router = APIRouter()
 
 
 @router.get("/")
 async def obtener_noticias(
-    db: Annotated[Session, Depends(get_db)],
-    limite: int = 50,
-    skip: int = 0
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    response: Response,
+    limite: int = Query(default=50, ge=1, le=100),
+    skip: int = Query(default=0, ge=0),
+    cursor: Optional[str] = None
 ):
     from app.models.db_models import Noticia
     
-    noticias = db.query(Noticia).order_by(
-        Noticia.created_at.desc()
-    ).offset(skip).limit(limite).all()
+    noticias, siguiente, _ = await paginar_async(
+        db,
+        select(Noticia),
+        [(Noticia.created_at, True), (Noticia.id, True)],
+        lambda n: [n.created_at, n.id],
+        limite, cursor=cursor, skip=skip
+    )
+    exponer_cursor(response, siguiente)
     
     return noticias
 
 
 @router.get("/generales")
 async def obtener_noticias_generales(
-    db: Annotated[Session, Depends(get_db)],
-    limite: int = 50,
-    skip: int = 0
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    response: Response,
+    limite: int = Query(default=50, ge=1, le=100),
+    skip: int = Query(default=0, ge=0),
+    cursor: Optional[str] = None
 ):
     from app.models.db_models import Noticia
     
-    noticias = db.query(Noticia).filter(
-        Noticia.usuario_id.is_(None)
-    ).order_by(
-        Noticia.created_at.desc()
-    ).offset(skip).limit(limite).all()
+    noticias, siguiente, _ = await paginar_async(
+        db,
+        select(Noticia).where(Noticia.usuario_id.is_(None)),
+        [(Noticia.created_at, True), (Noticia.id, True)],
+        lambda n: [n.created_at, n.id],
+        limite, cursor=cursor, skip=skip
+    )
+    exponer_cursor(response, siguiente)
     
     return noticias
 
 
 @router.post("/generar")
 async def generar_noticias(
+    request: Request,
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
     ia_service: Annotated[IAService, Depends(get_ia_service)],
     limite: int = 50,
+    usuario_id: str | None = None
 ):
+    await consumir_cuota_ia(
+        response, "noticias",
+        sujeto_cuota(request, db, usuario_id),
+        estimar_tokens("noticias", unidades=limite)
+    )
+    
     try:
         nuevas, duplicadas = await ia_service.generar_y_guardar_noticias(
             usuario_id=None,
@@ -0,0 +1,122 @@
+"""
+Feed de actividad reciente del usuario (tabla actividad_usuario).
+
+Hay una entrada por registro de origen (usuario_id, tipo, referencia_id). Las
+rutas que cambian eventos, desafíos o proyectos la crean o actualizan en su
+misma transacción; un cambio de estado la sube al principio del feed. Los
+cambios de estado de usuario_eventos hechos fuera de la API los aplica un
+trigger (migrations/actividad_usuario_unica.sql). El perfil y el listado de
+actividad leen una página del feed con una consulta acotada por el índice
+(usuario_id, created_at DESC).
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.db_models import ActividadUsuario
+
+TIPO_EVENTO = "event"
+TIPO_DESAFIO = "challenge"
+TIPO_PROYECTO = "project"
+
+
+def registrar_actividad(
+    db: Session,
+    usuario_id,
+    tipo: str,
+    referencia_id,
+    titulo: str,
+    estado: str,
+    datos: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Crea la entrada del registro en el feed o, si ya existe y cambia de
+    estado, la actualiza y la mueve al principio. No hace commit: va en la
+    transacción de quien llama.
+    """
+    stmt = insert(ActividadUsuario).values(
+        usuario_id=usuario_id,
+        tipo=tipo,
+        referencia_id=referencia_id,
+        titulo=titulo,
+        estado=estado,
+        datos=datos
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ActividadUsuario.usuario_id, ActividadUsuario.tipo, ActividadUsuario.referencia_id],
+        set_={
+            "titulo": stmt.excluded.titulo,
+            "estado": stmt.excluded.estado,
+            "datos": func.coalesce(stmt.excluded.datos, ActividadUsuario.datos),
+            "created_at": func.now()
+        },
+        where=ActividadUsuario.estado.is_distinct_from(stmt.excluded.estado)
+    ))
+
+
+def consultar_actividad(
+    db: Session,
+    usuario_id,
+    limite: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[ActividadUsuario], Optional[str]]:
+    """
+    Una página del feed, de más reciente a más antigua.
+
+    Returns:
+        (entradas, cursor de la página siguiente o None)
+    """
+    from app.services.paginacion import paginar
+
+    entradas, siguiente, _ = paginar(
+        db.query(ActividadUsuario).filter(ActividadUsuario.usuario_id == usuario_id),
+        [(ActividadUsuario.created_at, True), (ActividadUsuario.id, True)],
+        lambda a: [a.created_at, a.id],
+        limite,
+        cursor=cursor
+    )
+    return entradas, siguiente
+
+
+def serializar_actividad(actividad: ActividadUsuario) -> Dict[str, Any]:
+    """Formato de `recent_activity` que consume la app."""
+    fecha = actividad.created_at.strftime("%d %b %Y") if actividad.created_at else ""
+    base = {
+        "id": str(actividad.referencia_id),
+        "type": actividad.tipo,
+        "title": actividad.titulo,
+        "date": fecha,
+    }
+
+    if actividad.tipo == TIPO_EVENTO:
+        # Color/icono según estado
+        icon, color = "calendar", "#3B82F6"  # Blue default
+        if actividad.estado == 'Asistido':
+            icon, color = "checkmark-circle", "#10B981"  # Green
+        elif actividad.estado == 'Ganador':
+            icon, color = "trophy", "#F59E0B"  # Yellow
+        return {**base, "status": actividad.estado, "icon": icon, "color": color}
+
+    if actividad.tipo == TIPO_DESAFIO:
+        completado = actividad.estado == 'completado'
+        return {
+            **base,
+            "status": "Completado" if completado else "Pendiente",
+            "icon": "code-slash",
+            "color": "#8B5CF6" if completado else "#64748B"  # Purple or Gray
+        }
+
+    datos = actividad.datos or {}
+    return {
+        **base,
+        "status": actividad.estado,
+        "icon": "briefcase",  # distintivo para proyectos
+        "color": "#EC4899",   # Pink
+        "description": datos.get("descripcion"),
+        "url_repositorio": datos.get("url_repositorio"),
+        "url_demo": datos.get("url_demo"),
+        "tecnologias": datos.get("tecnologias")
+    }
@@ -0,0 +1,131 @@
+"""
+Caché en disco de artefactos compilados (C++ y Java).
+
+Los artefactos se direccionan por contenido: la clave es el hash del código,
+el lenguaje, los flags del compilador y la versión del harness. Reenviar el
+mismo código (muy común al pulsar "Ejecutar" otra vez) evita recompilar.
+Cuando el directorio supera el tamaño máximo se eliminan los artefactos usados
+hace más tiempo (LRU por mtime). Los temporales de copias en curso no se tocan;
+solo se borran si quedaron huérfanos (más antiguos que `edad_max_temporal`).
+"""
+
+import contextlib
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Temporales de `guardar` mientras se copian al directorio de la caché
+PREFIJO_TEMPORAL = ".tmp-"
+
+
+class ArtifactCache:
+    """Caché LRU de artefactos compilados en un directorio local."""
+
+    def __init__(self, directorio: Path, max_bytes: int, edad_max_temporal: float = 3600):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        # Un temporal más antiguo que esto es de un proceso que murió a mitad de copia
+        self.edad_max_temporal = edad_max_temporal
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(codigo: str, lenguaje: str, flags: List[str], version_harness: str) -> str:
+        """Hash SHA-256 de todo lo que influye en el artefacto compilado."""
+        h = hashlib.sha256()
+        for parte in (lenguaje, " ".join(flags), version_harness, codigo):
+            h.update(parte.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _ruta(self, clave: str, extension: str) -> Path:
+        return self.directorio / f"{clave}{extension}"
+
+    def obtener(self, clave: str, extension: str) -> Optional[Path]:
+        """Retorna la ruta del artefacto si existe y lo marca como usado."""
+        ruta = self._ruta(clave, extension)
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def guardar(self, clave: str, extension: str, origen: Path) -> Path:
+        """Mueve el artefacto recién compilado a la caché (de forma atómica)."""
+        destino = self._ruta(clave, extension)
+        try:
+            os.replace(origen, destino)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # El directorio de compilación está en otro sistema de archivos:
+            # copia a un temporal junto al destino y renombrado atómico
+            descriptor, temporal = tempfile.mkstemp(dir=self.directorio, prefix=PREFIJO_TEMPORAL, suffix=extension)
+            os.close(descriptor)
+            try:
+                shutil.copy2(origen, temporal)
+                os.replace(temporal, destino)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temporal)
+                raise
+        self._desalojar()
+        return destino
+
+    def _desalojar(self) -> None:
+        with self._lock:
+            archivos = []
+            total = 0
+            ahora = time.time()
+            for entrada in os.scandir(self.directorio):
+                if not entrada.is_file():
+                    continue
+                try:
+                    stat = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                if entrada.name.startswith(PREFIJO_TEMPORAL):
+                    # Copia en curso de otro hilo o proceso: solo se borra si es huérfana
+                    if ahora - stat.st_mtime > self.edad_max_temporal:
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(entrada.path)
+                    continue
+                archivos.append((stat.st_mtime, stat.st_size, entrada.path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            archivos.sort()
+            for _, tamano, ruta in archivos:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(ruta)
+                    total -= tamano
+                except FileNotFoundError:
+                    pass
+            logger.info(f"Caché de artefactos reducida a {total // 1024} KB")
+
+
+@lru_cache
+def get_artifact_cache() -> ArtifactCache:
+    """Singleton de la caché configurada desde Settings."""
+    settings = get_settings()
+    directorio = settings.CODE_ARTIFACT_CACHE_DIR or os.path.join(tempfile.gettempdir(), "devpal_artifacts")
+    return ArtifactCache(
+        directorio=Path(directorio),
+        max_bytes=settings.CODE_ARTIFACT_CACHE_MAX_MB * 1024 * 1024
+    )
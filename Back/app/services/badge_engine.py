@@ -0,0 +1,180 @@
+"""
+Motor de reglas de badges basado en conjuntos.
+
+Los agregados que usan los criterios (racha, desafíos completados, desafíos
+difíciles, eventos, nivel) se calculan para todos los usuarios evaluados en una
+sola consulta con COUNT ... FILTER. Cada `criterio_json` se evalúa en memoria
+contra esos agregados y los badges desbloqueados se insertan en bloque.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.db_models import (
+    Badge, DesafioDiario, PerfilUsuario, ProgresoDesafioDiario, UsuarioBadge
+)
+from app.services.gamification_service import sumar_xp
+
+logger = logging.getLogger(__name__)
+
+# tipo de criterio -> (agregado del usuario, clave del umbral en criterio_json)
+REGLAS: Dict[str, Tuple[str, str]] = {
+    "racha": ("racha_dias", "dias"),
+    "desafios_completados": ("desafios_completados", "cantidad"),
+    "desafios_dificiles": ("desafios_dificiles", "cantidad"),
+    "eventos_asistidos": ("eventos_asistidos", "cantidad"),
+    "nivel": ("nivel", "nivel_minimo"),
+}
+
+
+def calcular_agregados(
+    db: Session,
+    usuario_ids: Optional[Iterable[Any]] = None
+) -> Dict[UUID, Dict[str, int]]:
+    """
+    Agregados de badges por usuario en una única consulta.
+
+    Args:
+        usuario_ids: Usuarios a evaluar (None = todos)
+    """
+    completado = ProgresoDesafioDiario.estado == "completado"
+
+    query = db.query(
+        PerfilUsuario.usuario_id,
+        PerfilUsuario.racha_dias,
+        PerfilUsuario.eventos_asistidos,
+        PerfilUsuario.nivel,
+        func.count(ProgresoDesafioDiario.id).filter(completado).label("desafios_completados"),
+        func.count(ProgresoDesafioDiario.id).filter(
+            and_(completado, DesafioDiario.dificultad == "Difícil")
+        ).label("desafios_dificiles"),
+    ).outerjoin(
+        ProgresoDesafioDiario,
+        ProgresoDesafioDiario.usuario_id == PerfilUsuario.usuario_id
+    ).outerjoin(
+        DesafioDiario,
+        ProgresoDesafioDiario.desafio_id == DesafioDiario.id
+    ).group_by(
+        PerfilUsuario.usuario_id,
+        PerfilUsuario.racha_dias,
+        PerfilUsuario.eventos_asistidos,
+        PerfilUsuario.nivel
+    )
+
+    if usuario_ids is not None:
+        query = query.filter(PerfilUsuario.usuario_id.in_(list(usuario_ids)))
+
+    return {
+        fila.usuario_id: {
+            "racha_dias": fila.racha_dias or 0,
+            "eventos_asistidos": fila.eventos_asistidos or 0,
+            "nivel": fila.nivel or 1,
+            "desafios_completados": fila.desafios_completados,
+            "desafios_dificiles": fila.desafios_dificiles,
+        }
+        for fila in query.all()
+    }
+
+
+def cumple_criterio(criterio: Dict[str, Any], agregados: Dict[str, int]) -> bool:
+    regla = REGLAS.get(criterio.get("tipo"))
+    if regla is None:
+        return False
+    campo, umbral = regla
+    return agregados[campo] >= criterio.get(umbral, 0)
+
+
+def desbloquear_badges(
+    db: Session,
+    usuario_ids: Optional[Iterable[Any]] = None
+) -> Dict[UUID, List[Badge]]:
+    """
+    Evalúa todos los badges para los usuarios dados y desbloquea los que cumplan.
+
+    La inserción usa ON CONFLICT DO NOTHING ... RETURNING, así solo se suma el
+    xp_bonus de las filas realmente insertadas aunque dos evaluaciones del
+    mismo usuario se solapen. No hace commit.
+
+    Returns:
+        Badges recién desbloqueados por usuario
+    """
+    if usuario_ids is not None:
+        usuario_ids = list(usuario_ids)
+        if not usuario_ids:
+            return {}
+
+    badges = db.query(Badge).all()
+    if not badges:
+        return {}
+
+    agregados = calcular_agregados(db, usuario_ids)
+    if not agregados:
+        return {}
+
+    existentes = set(
+        db.query(UsuarioBadge.usuario_id, UsuarioBadge.badge_id).filter(
+            UsuarioBadge.usuario_id.in_(list(agregados))
+        ).all()
+    )
+
+    pendientes = [
+        {"usuario_id": usuario_id, "badge_id": badge.id, "progreso_actual": 100, "notificado": False}
+        for usuario_id, datos in agregados.items()
+        for badge in badges
+        if (usuario_id, badge.id) not in existentes and cumple_criterio(badge.criterio_json, datos)
+    ]
+    if not pendientes:
+        return {}
+
+    insertados = db.execute(
+        insert(UsuarioBadge).values(pendientes).on_conflict_do_nothing(
+            constraint="unique_usuario_badge"
+        ).returning(UsuarioBadge.usuario_id, UsuarioBadge.badge_id)
+    ).all()
+
+    por_id = {badge.id: badge for badge in badges}
+    nuevos: Dict[UUID, List[Badge]] = defaultdict(list)
+    for usuario_id, badge_id in insertados:
+        nuevos[usuario_id].append(por_id[badge_id])
+
+    for usuario_id, badges_usuario in nuevos.items():
+        bonus = sum(badge.xp_bonus for badge in badges_usuario)
+        if bonus:
+            sumar_xp(db, usuario_id, bonus)
+
+    return dict(nuevos)
+
+
+def evaluar_todos(db: Session, tamano_lote: int = 1000) -> int:
+    """
+    Modo batch: evalúa a todos los usuarios por lotes de `tamano_lote`,
+    recorriendo perfiles_usuario por usuario_id y haciendo commit por lote.
+
+    Returns:
+        Número total de badges desbloqueados
+    """
+    total = 0
+    ultimo = None
+
+    while True:
+        query = db.query(PerfilUsuario.usuario_id)
+        if ultimo is not None:
+            query = query.filter(PerfilUsuario.usuario_id > ultimo)
+        lote = [fila.usuario_id for fila in query.order_by(PerfilUsuario.usuario_id).limit(tamano_lote)]
+        if not lote:
+            break
+
+        nuevos = desbloquear_badges(db, lote)
+        db.commit()
+
+        total += sum(len(badges) for badges in nuevos.values())
+        ultimo = lote[-1]
+
+    logger.info(f"Evaluación de badges completada: {total} badges desbloqueados")
+    return total
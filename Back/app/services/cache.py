@@ -0,0 +1,138 @@
+"""
+Cachés de la aplicación: LRU en memoria y respaldo compartido opcional (Redis).
+
+`CacheLRU` vive en el proceso (límite de elementos y TTL opcional) y lleva
+contadores de aciertos/fallos. `CacheEnCapas` la combina con Redis cuando
+REDIS_URL está configurado, para compartir resultados entre workers.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheLRU:
+    """Caché LRU thread-safe con tamaño máximo y TTL opcional."""
+
+    def __init__(self, max_items: int = 1024, ttl_segundos: Optional[float] = None):
+        self.max_items = max_items
+        self.ttl_segundos = ttl_segundos
+        self._datos: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+
+            expira, valor = entrada
+            if expira and expira < time.monotonic():
+                del self._datos[clave]
+                self.misses += 1
+                return None
+
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def guardar(self, clave: str, valor: Any) -> None:
+        expira = time.monotonic() + self.ttl_segundos if self.ttl_segundos else 0
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave: str) -> None:
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "tamano": len(self._datos),
+            "max_items": self.max_items
+        }
+
+
+def crear_cliente_redis():
+    """Cliente Redis asíncrono si REDIS_URL está configurado, o None."""
+    settings = get_settings()
+    if not settings.REDIS_URL:
+        return None
+    try:
+        import redis.asyncio as redis_asyncio
+    except ImportError:
+        logger.warning("REDIS_URL configurado pero falta la librería redis; se usa solo caché en memoria")
+        return None
+    return redis_asyncio.from_url(settings.REDIS_URL)
+
+
+class CacheEnCapas:
+    """
+    CacheLRU local con respaldo compartido opcional en Redis.
+
+    Los valores deben ser serializables a JSON. Un fallo de Redis nunca rompe
+    la petición: se registra y se continúa solo con la caché local.
+    """
+
+    def __init__(self, local: CacheLRU, prefijo: str, redis=None, ttl_segundos: Optional[int] = None):
+        self.local = local
+        self.prefijo = prefijo
+        self.redis = redis
+        self.ttl_segundos = ttl_segundos
+        self.hits_compartidos = 0
+
+    async def obtener(self, clave: str) -> Optional[Any]:
+        valor = self.local.obtener(clave)
+        if valor is not None or self.redis is None:
+            return valor
+
+        try:
+            crudo = await self.redis.get(self.prefijo + clave)
+        except Exception as e:
+            logger.warning(f"Error leyendo caché compartida: {e}")
+            return None
+
+        if crudo is None:
+            return None
+
+        valor = json.loads(crudo)
+        self.hits_compartidos += 1
+        self.local.guardar(clave, valor)
+        return valor
+
+    async def guardar(self, clave: str, valor: Any) -> None:
+        self.local.guardar(clave, valor)
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.set(self.prefijo + clave, json.dumps(valor), ex=self.ttl_segundos)
+        except Exception as e:
+            logger.warning(f"Error escribiendo caché compartida: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.local.stats(),
+            "hits_compartidos": self.hits_compartidos,
+            "compartida": self.redis is not None
+        }
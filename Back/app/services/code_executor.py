@@ -9,87 +9,207 @@ IMPORTANT SECURITY NOTES:
 - Implement proper resource limits, timeouts, and security measures
 """
 
+import asyncio
+import hashlib
 import json
 import traceback
 import subprocess
-import tempfile
 import os
-from typing import Dict, List, Any
+import sys
+import tempfile
+import time
+import zipfile
+from functools import lru_cache
+from types import CodeType
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from pathlib import Path
 
+from app.config import get_settings
+from app.services.artifact_cache import ArtifactCache, get_artifact_cache
+from app.services.cache import CacheEnCapas, CacheLRU, crear_cliente_redis
+from app.services.code_executor_seguro import (
+    CPU_POR_CASO,
+    CodeExecutionTimeout,
+    TiempoTotalAgotado,
+    cancelar_limite_tiempo,
+    limitar_tiempo_caso,
+)
+from app.services.node_executor import NodeHarnessError, get_node_pool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 
 # Configuration
 EXECUTION_TIMEOUT = 5  # seconds
+COMPILATION_TIMEOUT = 15  # seconds
 MAX_OUTPUT_LENGTH = 1000  # characters
 
+# Forman parte de la clave de la caché de artefactos: cambiarlos invalida lo compilado
+HARNESS_VERSION = "1"
+CPP_COMPILER_FLAGS = ["-std=c++17", "-O2"]
+JAVA_COMPILER_FLAGS = ["-encoding", "UTF-8"]
+CPP_PRELUDIO = "#include <bits/stdc++.h>\nusing namespace std;\n\n"
+JAVA_PRELUDIO = "import java.util.*;\n\n"
 
-def ejecutar_codigo_python(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """
-    Ejecuta código Python contra casos de prueba.
-    Usa exec() - simple pero limitado en seguridad.
-    """
-    resultados = {
-        "exito": True,
+# Un resultado con "determinista": False depende de la carga o del entorno
+# (timeouts, worker muerto por límites, toolchain ausente) y no del código,
+# así que no se memoiza. Sin la clave, el resultado es determinista.
+CLAVE_DETERMINISTA = "determinista"
+
+# Métricas por caso: se miden en cada ejecución y no se sirven desde la caché
+METRICAS_CASO = ("tiempo_ms", "tiempo_cpu_ms", "memoria_pico_kb")
+
+
+def _resultado_no_determinista(casos_totales: int, mensaje: str) -> Dict[str, Any]:
+    """Resultado de error que depende del entorno, no del código."""
+    return {
+        "exito": False,
         "casos_pasados": 0,
-        "casos_totales": len(casos_prueba),
+        "casos_totales": casos_totales,
         "casos_detalle": [],
-        "error_compilacion": None
+        "error_compilacion": mensaje,
+        CLAVE_DETERMINISTA: False
     }
+
+
+def _muestra_recursos() -> Tuple[float, int]:
+    """(segundos de CPU consumidos por el proceso, pico de RSS en KB)."""
+    if resource is None:
+        return time.process_time(), 0
+    uso = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss está en bytes en macOS y en KB en Linux
+    pico_kb = uso.ru_maxrss // 1024 if sys.platform == "darwin" else uso.ru_maxrss
+    return uso.ru_utime + uso.ru_stime, pico_kb
+
+
+class ErrorCargaPython(Exception):
+    """El código no compila, falla al cargarse o no define ninguna función."""
+    
+    def __init__(self, mensaje: str, determinista: bool = True):
+        super().__init__(mensaje)
+        self.determinista = determinista
+
+
+MENSAJE_SIN_FUNCION = (
+    "Tu código debe contener una función.\n\n"
+    "Ejemplo:\n"
+    "def solucion(parametro):\n"
+    "    # tu lógica aquí\n"
+    "    return resultado\n\n"
+    "La función será llamada con los casos de prueba."
+)
+
+
+def compilar_codigo_python(codigo: str) -> CodeType:
+    """
+    Sanea y compila el código sin ejecutar nada del usuario.
+    
+    Raises:
+        ErrorCargaPython: Si el código no compila
+    """
+    codigo_limpio = codigo
+    codigo_limpio = codigo_limpio.replace('"', '"').replace('"', '"')
+    codigo_limpio = codigo_limpio.replace(''', "'").replace(''', "'")
+    codigo_limpio = codigo_limpio.replace('—', '-').replace('–', '-')
     
     try:
-        codigo_limpio = codigo
-        codigo_limpio = codigo_limpio.replace('"', '"').replace('"', '"')
-        codigo_limpio = codigo_limpio.replace(''', "'").replace(''', "'")
-        codigo_limpio = codigo_limpio.replace('—', '-').replace('–', '-')
-        
-        # Crear namespace para la ejecución
-        namespace = {}
-        
-        # Compilar el código sanitizado
-        exec(codigo_limpio, namespace)
-        
-        # Buscar la función principal
-        funcion_principal = None
-        for name, obj in namespace.items():
-            if callable(obj) and not name.startswith('__'):
-                funcion_principal = obj
-                break
+        return compile(codigo_limpio, "<string>", "exec")
+    except Exception as e:
+        raise ErrorCargaPython(f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}")
+
+
+def evaluar_casos_python(
+    byte_code: CodeType,
+    casos_prueba: List[Dict[str, Any]],
+    cpu_por_caso: float = CPU_POR_CASO,
+    tiempo_total: float = EXECUTION_TIMEOUT
+) -> Iterator[Dict[str, Any]]:
+    """
+    Carga el código compilado una sola vez y evalúa todos los casos, emitiendo
+    el detalle de cada uno en cuanto termina.
+    
+    Cada caso tiene un presupuesto de CPU acotado por lo que queda del tiempo
+    total; agotado el total, los casos restantes se marcan como no ejecutados.
+    Los casos cortados por un límite de tiempo o memoria llevan
+    "determinista": False.
+    
+    Raises:
+        ErrorCargaPython: Si falla la carga del módulo o no define ninguna función
+    """
+    fin = time.monotonic() + tiempo_total
+    
+    # Crear namespace para la ejecución
+    namespace = {}
+    try:
+        limitar_tiempo_caso(cpu_por_caso, tiempo_total)
+        exec(byte_code, namespace)
+    except CodeExecutionTimeout:
+        raise ErrorCargaPython(f"Tiempo de ejecución excedido al cargar el código ({cpu_por_caso}s)", determinista=False)
+    except MemoryError:
+        raise ErrorCargaPython("Límite de memoria excedido al cargar el código", determinista=False)
+    except Exception as e:
+        raise ErrorCargaPython(f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}")
+    finally:
+        cancelar_limite_tiempo()
+    
+    # Buscar la función principal
+    funcion_principal = None
+    for name, obj in namespace.items():
+        if callable(obj) and not name.startswith('__'):
+            funcion_principal = obj
+            break
+    
+    if not funcion_principal:
+        raise ErrorCargaPython(MENSAJE_SIN_FUNCION)
+    
+    for i, caso in enumerate(casos_prueba):
+        resultado_caso = {
+            "numero": i + 1,
+            "input": caso.get("input", ""),
+            "output_esperado": caso.get("output", ""),
+            "output_obtenido": None,
+            "pasado": False,
+            "error": None,
+            "tiempo_ms": None,
+            "tiempo_cpu_ms": None,
+            "memoria_pico_kb": None
+        }
         
-        if not funcion_principal:
-            resultados["exito"] = False
-            resultados["error_compilacion"] = (
-                "Tu código debe contener una función.\n\n"
-                "Ejemplo:\n"
-                "def solucion(parametro):\n"
-                "    # tu lógica aquí\n"
-                "    return resultado\n\n"
-                "La función será llamada con los casos de prueba."
-            )
-            return resultados
+        restante = fin - time.monotonic()
+        if restante <= 0:
+            resultado_caso["error"] = f"No ejecutado: se agotó el tiempo total ({tiempo_total}s)"
+            resultado_caso[CLAVE_DETERMINISTA] = False
+            yield resultado_caso
+            continue
         
-        # Ejecutar cada caso de prueba
-        for i, caso in enumerate(casos_prueba):
-            resultado_caso = {
-                "numero": i + 1,
-                "input": caso.get("input", ""),
-                "output_esperado": caso.get("output", ""),
-                "output_obtenido": None,
-                "pasado": False,
-                "error": None
-            }
+        try:
+            # Parsear el input
+            try:
+                input_valor = json.loads(caso["input"])
+            except:
+                input_valor = eval(caso["input"])
             
+            # El temporizador cubre también str() y la comparación, que pueden
+            # ejecutar código del usuario (__str__, __eq__)
+            limitar_tiempo_caso(cpu_por_caso, restante)
             try:
-                # Parsear el input
+                # Ejecutar la función midiendo solo la llamada
+                cpu_inicio, _ = _muestra_recursos()
+                inicio = time.perf_counter()
                 try:
-                    input_valor = json.loads(caso["input"])
-                except:
-                    input_valor = eval(caso["input"])
-                
-                # Ejecutar la función
-                if isinstance(input_valor, list):
-                    output = funcion_principal(*input_valor)
-                else:
-                    output = funcion_principal(input_valor)
+                    if isinstance(input_valor, list):
+                        output = funcion_principal(*input_valor)
+                    else:
+                        output = funcion_principal(input_valor)
+                finally:
+                    resultado_caso["tiempo_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+                    cpu_fin, pico_kb = _muestra_recursos()
+                    resultado_caso["tiempo_cpu_ms"] = round((cpu_fin - cpu_inicio) * 1000, 3)
+                    # Pico del proceso worker (high-water mark), no solo de este caso
+                    resultado_caso["memoria_pico_kb"] = pico_kb
                 
                 resultado_caso["output_obtenido"] = str(output)
                 
@@ -101,28 +221,70 @@ def ejecutar_codigo_python(codigo: str, casos_prueba: List[Dict[str, Any]]) -> D
                 
                 if output == output_esperado or str(output) == str(output_esperado):
                     resultado_caso["pasado"] = True
-                    resultados["casos_pasados"] += 1
-                
-            except Exception as e:
-                resultado_caso["error"] = str(e)
-                resultado_caso["output_obtenido"] = f"Error: {str(e)}"
+            finally:
+                cancelar_limite_tiempo()
             
-            resultados["casos_detalle"].append(resultado_caso)
+        except TiempoTotalAgotado:
+            resultado_caso["error"] = f"Tiempo de ejecución excedido: se agotó el tiempo total ({tiempo_total}s)"
+            resultado_caso["output_obtenido"] = f"Error: {resultado_caso['error']}"
+            resultado_caso[CLAVE_DETERMINISTA] = False
+        except CodeExecutionTimeout:
+            resultado_caso["error"] = f"Tiempo de ejecución excedido: el caso superó {cpu_por_caso}s de CPU"
+            resultado_caso["output_obtenido"] = f"Error: {resultado_caso['error']}"
+            resultado_caso[CLAVE_DETERMINISTA] = False
+        except MemoryError:
+            resultado_caso["error"] = "Límite de memoria excedido"
+            resultado_caso["output_obtenido"] = f"Error: {resultado_caso['error']}"
+            resultado_caso[CLAVE_DETERMINISTA] = False
+        except Exception as e:
+            resultado_caso["error"] = str(e)
+            resultado_caso["output_obtenido"] = f"Error: {str(e)}"
         
-        # Marcar como no exitoso si algún caso falló
-        if resultados["casos_pasados"] < resultados["casos_totales"]:
-            resultados["exito"] = False
-            
-    except Exception as e:
-        resultados["exito"] = False
-        resultados["error_compilacion"] = f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}"
-    
+        yield resultado_caso
+
+
+def resumir_resultados_python(
+    casos_totales: int,
+    casos_detalle: List[Dict[str, Any]],
+    error: Optional[str] = None,
+    determinista: bool = True
+) -> Dict[str, Any]:
+    """
+    Resultado completo a partir del detalle de los casos evaluados. La marca
+    de no determinismo de los casos pasa al resultado.
+    """
+    casos_deterministas = [c.pop(CLAVE_DETERMINISTA, True) for c in casos_detalle]
+    casos_pasados = sum(1 for c in casos_detalle if c["pasado"])
+    resultados = {
+        # No exitoso si algún caso falló o la evaluación no terminó
+        "exito": error is None and casos_pasados == casos_totales,
+        "casos_pasados": casos_pasados,
+        "casos_totales": casos_totales,
+        "casos_detalle": casos_detalle,
+        "error_compilacion": error
+    }
+    if not (determinista and all(casos_deterministas)):
+        resultados[CLAVE_DETERMINISTA] = False
     return resultados
 
 
+def ejecutar_codigo_python(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Ejecuta código Python contra casos de prueba.
+    Usa exec() - simple pero limitado en seguridad.
+    """
+    try:
+        byte_code = compilar_codigo_python(codigo)
+        casos_detalle = list(evaluar_casos_python(byte_code, casos_prueba))
+    except ErrorCargaPython as e:
+        return resumir_resultados_python(len(casos_prueba), [], str(e), e.determinista)
+    
+    return resumir_resultados_python(len(casos_prueba), casos_detalle)
+
+
 def ejecutar_codigo_javascript(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Ejecuta código JavaScript usando Node.js.
+    Ejecuta código JavaScript en el pool persistente de Node.js.
     Requiere Node.js instalado en el sistema.
     """
     resultados = {
@@ -133,127 +295,143 @@ def ejecutar_codigo_javascript(codigo: str, casos_prueba: List[Dict[str, Any]])
         "error_compilacion": None
     }
     
-    # Verificar si Node.js está disponible
+    pool = get_node_pool()
+    if not pool.disponible():
+        return _resultado_no_determinista(
+            len(casos_prueba), "Node.js no está instalado. Instálalo desde https://nodejs.org/"
+        )
+    
+    # Parsear los casos aquí; el harness solo recibe argumentos ya decodificados
+    casos_harness = []
+    for caso in casos_prueba:
+        try:
+            entrada = json.loads(caso["input"])
+            esperado = json.loads(caso["output"])
+            casos_harness.append({
+                "args": entrada if isinstance(entrada, list) else [entrada],
+                "esperado": esperado
+            })
+        except (KeyError, TypeError, ValueError) as e:
+            casos_harness.append({"error": str(e)})
+    
     try:
-        subprocess.run(["node", "--version"], capture_output=True, timeout=2)
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return {
-            "exito": False,
-            "casos_pasados": 0,
-            "casos_totales": len(casos_prueba),
-            "casos_detalle": [],
-            "error_compilacion": "Node.js no está instalado. Instálalo desde https://nodejs.org/"
-        }
+        respuesta = pool.evaluar(codigo, casos_harness, EXECUTION_TIMEOUT)
+    except NodeHarnessError as e:
+        return _resultado_no_determinista(len(casos_prueba), str(e))
     
+    if respuesta["error"]:
+        resultados["exito"] = False
+        resultados["error_compilacion"] = respuesta["error"][:MAX_OUTPUT_LENGTH]
+        if respuesta.get("determinista") is False:
+            resultados[CLAVE_DETERMINISTA] = False
+        return resultados
+    
+    for i, (caso, resultado) in enumerate(zip(casos_prueba, respuesta["resultados"])):
+        error = resultado["error"]
+        resultados["casos_detalle"].append({
+            "numero": i + 1,
+            "input": caso.get("input", ""),
+            "output_esperado": caso.get("output", ""),
+            "output_obtenido": f"Error: {error}" if error else resultado["output"],
+            "pasado": resultado["pasado"],
+            "error": error,
+            "tiempo_ms": resultado.get("tiempo_ms"),
+            "tiempo_cpu_ms": resultado.get("tiempo_cpu_ms"),
+            "memoria_pico_kb": resultado.get("memoria_pico_kb")
+        })
+    
+    resultados["casos_pasados"] = sum(1 for c in resultados["casos_detalle"] if c["pasado"])
+    if resultados["casos_pasados"] < resultados["casos_totales"]:
+        resultados["exito"] = False
+    
+    return resultados
+
+
+@lru_cache
+def _compilador_disponible(comando: str) -> bool:
+    """Comprueba una sola vez si el compilador está instalado."""
     try:
-        # Crear archivo temporal
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False, encoding='utf-8') as f:
-            # Escribir el código del usuario
-            f.write(codigo + "\n\n")
-            
-            # Agregar código de prueba
-            f.write("""
-// Test runner
-const testCases = """ + json.dumps(casos_prueba) + """;
-const results = [];
-
-// Buscar la función principal (asumimos que es la primera función exportada o definida)
-let mainFunction;
-if (typeof solution !== 'undefined') mainFunction = solution;
-else if (typeof solve !== 'undefined') mainFunction = solve;
-else {
-    // Buscar cualquier función definida
-    for (let key of Object.keys(global)) {
-        if (typeof global[key] === 'function' && !key.startsWith('_')) {
-            mainFunction = global[key];
-            break;
-        }
-    }
-}
+        subprocess.run([comando, "--version"], capture_output=True, timeout=2)
+        return True
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return False
 
-if (!mainFunction) {
-    console.log(JSON.stringify({error: "No se encontró una función en el código"}));
-    process.exit(1);
-}
 
-testCases.forEach((testCase, i) => {
-    try {
-        let input = JSON.parse(testCase.input);
-        let expectedOutput = JSON.parse(testCase.output);
-        
-        let output;
-        if (Array.isArray(input)) {
-            output = mainFunction(...input);
-        } else {
-            output = mainFunction(input);
-        }
-        
-        const passed = JSON.stringify(output) === JSON.stringify(expectedOutput);
-        results.push({
-            numero: i + 1,
-            input: testCase.input,
-            output_esperado: testCase.output,
-            output_obtenido: JSON.stringify(output),
-            pasado: passed,
-            error: null
-        });
-    } catch (error) {
-        results.push({
-            numero: i + 1,
-            input: testCase.input,
-            output_esperado: testCase.output,
-            output_obtenido: `Error: ${error.message}`,
-            pasado: false,
-            error: error.message
-        });
-    }
-});
+def _error_compilacion(stderr: str, directorio: Path) -> str:
+    """Limpia la salida del compilador (sin rutas temporales) y la trunca."""
+    mensaje = stderr.replace(str(directorio) + os.sep, "")
+    return mensaje[:MAX_OUTPUT_LENGTH] or "Error de compilación"
 
-console.log(JSON.stringify(results));
-""")
-            temp_file = f.name
-        
-        # Ejecutar el código
-        result = subprocess.run(
-            ["node", temp_file],
-            capture_output=True,
-            text=True,
-            timeout=EXECUTION_TIMEOUT
-        )
-        
-        # Limpiar archivo temporal
-        os.unlink(temp_file)
-        
-        if result.returncode != 0:
-            # Error de compilación o ejecución
-            error_msg = result.stderr[:MAX_OUTPUT_LENGTH] if result.stderr else "Error desconocido"
-            if "No se encontró una función" in result.stdout:
-                resultados["error_compilacion"] = "No se encontró una función en el código"
-            else:
-                resultados["error_compilacion"] = error_msg
-            resultados["exito"] = False
-            return resultados
-        
-        # Parsear resultados
-        casos_detalle = json.loads(result.stdout)
-        resultados["casos_detalle"] = casos_detalle
-        resultados["casos_pasados"] = sum(1 for c in casos_detalle if c["pasado"])
-        
-        if resultados["casos_pasados"] < resultados["casos_totales"]:
-            resultados["exito"] = False
-            
-    except subprocess.TimeoutExpired:
-        resultados["exito"] = False
-        resultados["error_compilacion"] = f"Tiempo de ejecución excedido ({EXECUTION_TIMEOUT}s)"
-        if 'temp_file' in locals():
-            os.unlink(temp_file)
-    except Exception as e:
-        resultados["exito"] = False
-        resultados["error_compilacion"] = f"{type(e).__name__}: {str(e)}"
-        if 'temp_file' in locals() and os.path.exists(temp_file):
-            os.unlink(temp_file)
+
+def _compilar_cpp(codigo: str, directorio: Path) -> Tuple[Optional[Path], Optional[str]]:
+    fuente = directorio / "solucion.cpp"
+    objeto = directorio / "solucion.o"
+    fuente.write_text(CPP_PRELUDIO + codigo, encoding="utf-8")
     
-    return resultados
+    result = subprocess.run(
+        ["g++", *CPP_COMPILER_FLAGS, "-c", str(fuente), "-o", str(objeto)],
+        capture_output=True,
+        text=True,
+        timeout=COMPILATION_TIMEOUT
+    )
+    if result.returncode != 0:
+        return None, _error_compilacion(result.stderr, directorio)
+    return objeto, None
+
+
+def _compilar_java(codigo: str, directorio: Path) -> Tuple[Optional[Path], Optional[str]]:
+    fuente = directorio / "Solution.java"
+    clases = directorio / "clases"
+    clases.mkdir()
+    fuente.write_text(JAVA_PRELUDIO + codigo, encoding="utf-8")
+    
+    result = subprocess.run(
+        ["javac", *JAVA_COMPILER_FLAGS, "-d", str(clases), str(fuente)],
+        capture_output=True,
+        text=True,
+        timeout=COMPILATION_TIMEOUT
+    )
+    if result.returncode != 0:
+        return None, _error_compilacion(result.stderr, directorio)
+    
+    # Empaquetar las .class en un jar para guardarlas como un único artefacto
+    jar = directorio / "solucion.jar"
+    with zipfile.ZipFile(jar, "w") as zf:
+        for clase in clases.rglob("*.class"):
+            zf.write(clase, clase.relative_to(clases).as_posix())
+    return jar, None
+
+
+def compilar_con_cache(
+    codigo: str,
+    lenguaje: str,
+    cache: Optional[ArtifactCache] = None
+) -> Tuple[Optional[Path], Optional[str]]:
+    """
+    Compila código C++ o Java reutilizando artefactos ya compilados.
+    
+    Returns:
+        (ruta del artefacto, None) si compila, o (None, error de compilación)
+    
+    Raises:
+        subprocess.TimeoutExpired: Si la compilación excede COMPILATION_TIMEOUT
+    """
+    cache = cache or get_artifact_cache()
+    if lenguaje == "java":
+        flags, extension, compilar = JAVA_COMPILER_FLAGS, ".jar", _compilar_java
+    else:
+        flags, extension, compilar = CPP_COMPILER_FLAGS, ".o", _compilar_cpp
+    
+    clave = cache.clave(codigo, lenguaje, flags, HARNESS_VERSION)
+    artefacto = cache.obtener(clave, extension)
+    if artefacto:
+        return artefacto, None
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        artefacto, error = compilar(codigo, Path(directorio))
+        if error:
+            return None, error
+        return cache.guardar(clave, extension, artefacto), None
 
 
 def ejecutar_codigo_java(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -270,25 +448,32 @@ def ejecutar_codigo_java(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dic
     }
     
     # Verificar si Java está disponible
+    if not _compilador_disponible("javac"):
+        return _resultado_no_determinista(
+            len(casos_prueba),
+            "JDK no está instalado. Instálalo desde https://www.oracle.com/java/technologies/downloads/"
+        )
+    
+    # Compilar (o reutilizar el .jar en caché) para reportar errores de compilación
     try:
-        subprocess.run(["javac", "-version"], capture_output=True, timeout=2)
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return {
-            "exito": False,
-            "casos_pasados": 0,
-            "casos_totales": len(casos_prueba),
-            "casos_detalle": [],
-            "error_compilacion": "JDK no está instalado. Instálalo desde https://www.oracle.com/java/technologies/downloads/"
-        }
+        _, error = compilar_con_cache(codigo, "java")
+    except subprocess.TimeoutExpired:
+        return _resultado_no_determinista(
+            len(casos_prueba), f"Tiempo de compilación excedido ({COMPILATION_TIMEOUT}s)"
+        )
+    if error:
+        resultados["exito"] = False
+        resultados["error_compilacion"] = error
+        return resultados
     
     # Por ahora, retornar mensaje de no implementado
-    # La implementación completa requiere compilación y manejo más complejo
+    # La ejecución de los casos de prueba requiere un harness específico
     return {
         "exito": False,
         "casos_pasados": 0,
         "casos_totales": len(casos_prueba),
         "casos_detalle": [],
-        "error_compilacion": "Ejecución de Java en desarrollo. Por ahora usa Python o JavaScript."
+        "error_compilacion": "Compilación exitosa. Ejecución de Java en desarrollo. Por ahora usa Python o JavaScript."
     }
 
 
@@ -306,16 +491,23 @@ def ejecutar_codigo_cpp(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict
     }
     
     # Verificar si g++ está disponible
+    if not _compilador_disponible("g++"):
+        return _resultado_no_determinista(
+            len(casos_prueba),
+            "g++ no está instalado. Instala MinGW (Windows) o build-essential (Linux)"
+        )
+    
+    # Compilar (o reutilizar el objeto en caché) para reportar errores de compilación
     try:
-        subprocess.run(["g++", "--version"], capture_output=True, timeout=2)
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return {
-            "exito": False,
-            "casos_pasados": 0,
-            "casos_totales": len(casos_prueba),
-            "casos_detalle": [],
-            "error_compilacion": "g++ no está instalado. Instala MinGW (Windows) o build-essential (Linux)"
-        }
+        _, error = compilar_con_cache(codigo, "cpp")
+    except subprocess.TimeoutExpired:
+        return _resultado_no_determinista(
+            len(casos_prueba), f"Tiempo de compilación excedido ({COMPILATION_TIMEOUT}s)"
+        )
+    if error:
+        resultados["exito"] = False
+        resultados["error_compilacion"] = error
+        return resultados
     
     # Por ahora, retornar mensaje de no implementado
     return {
@@ -323,7 +515,7 @@ def ejecutar_codigo_cpp(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict
         "casos_pasados": 0,
         "casos_totales": len(casos_prueba),
         "casos_detalle": [],
-        "error_compilacion": "Ejecución de C++ en desarrollo. Por ahora usa Python o JavaScript."
+        "error_compilacion": "Compilación exitosa. Ejecución de C++ en desarrollo. Por ahora usa Python o JavaScript."
     }
 
 
@@ -361,3 +553,92 @@ def ejecutar_codigo(
             "casos_detalle": [],
             "error_compilacion": f"Lenguaje '{lenguaje}' no soportado. Soportados: Python, JavaScript"
         }
+
+
+async def ejecutar_codigo_async(
+    codigo: str,
+    lenguaje: str,
+    casos_prueba: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Versión asíncrona de ejecutar_codigo para los endpoints.
+    
+    Python se evalúa en el pool de workers precalentados con el harness por
+    lotes (todos los casos en un único viaje); el resto de lenguajes en un
+    thread, para no bloquear el event loop.
+    """
+    if lenguaje.lower() == "python":
+        from app.services.python_worker_pool import get_python_pool
+        return await get_python_pool().ejecutar(codigo, casos_prueba)
+    
+    return await asyncio.to_thread(ejecutar_codigo, codigo, lenguaje, casos_prueba)
+
+
+@lru_cache
+def get_resultados_cache() -> CacheEnCapas:
+    """Singleton de la caché de resultados de ejecución."""
+    settings = get_settings()
+    return CacheEnCapas(
+        local=CacheLRU(
+            max_items=settings.EXECUTION_CACHE_MAX_ITEMS,
+            ttl_segundos=settings.EXECUTION_CACHE_TTL_SECONDS
+        ),
+        prefijo="devpal:ejecucion:",
+        redis=crear_cliente_redis(),
+        ttl_segundos=settings.EXECUTION_CACHE_TTL_SECONDS
+    )
+
+
+def clave_resultado(
+    desafio_id: str,
+    lenguaje: str,
+    codigo: str,
+    casos_prueba: List[Dict[str, Any]]
+) -> str:
+    """Clave (desafio_id, lenguaje, sha256(codigo), hash(casos_prueba))."""
+    hash_codigo = hashlib.sha256(codigo.encode("utf-8")).hexdigest()
+    hash_casos = hashlib.sha256(
+        json.dumps(casos_prueba, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"{desafio_id}:{lenguaje.lower()}:{hash_codigo}:{hash_casos}"
+
+
+def es_resultado_determinista(resultado: Dict[str, Any]) -> bool:
+    return resultado.get(CLAVE_DETERMINISTA, True)
+
+
+def _resultado_para_cache(resultado: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia sin las métricas por caso, que solo valen para la ejecución que las midió."""
+    return {
+        **resultado,
+        "casos_detalle": [
+            {**caso, **{metrica: None for metrica in METRICAS_CASO if metrica in caso}}
+            for caso in resultado.get("casos_detalle", [])
+        ]
+    }
+
+
+async def ejecutar_codigo_memoizado(
+    desafio_id: str,
+    codigo: str,
+    lenguaje: str,
+    casos_prueba: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Como ejecutar_codigo_async, pero reutiliza el resultado de envíos idénticos
+    (mismo desafío, lenguaje, código y casos de prueba).
+    
+    Un resultado servido desde la caché lleva "desde_cache": True y las
+    métricas por caso (tiempo, CPU, memoria) vacías: no se midieron ahora.
+    """
+    cache = get_resultados_cache()
+    clave = clave_resultado(desafio_id, lenguaje, codigo, casos_prueba)
+    
+    resultado = await cache.obtener(clave)
+    if resultado is not None:
+        return {**resultado, "desde_cache": True}
+    
+    resultado = await ejecutar_codigo_async(codigo, lenguaje, casos_prueba)
+    if es_resultado_determinista(resultado):
+        await cache.guardar(clave, _resultado_para_cache(resultado))
+    return resultado
@@ -1,60 +1,58 @@
 """
 Ejecución segura de código Python usando RestrictedPython.
 Alternativa a Docker para sandboxing rápido.
+
+El código se compila con RestrictedPython y se evalúa contra todos los casos
+con un presupuesto de CPU por caso y un presupuesto de tiempo total. Los
+temporizadores (`limitar_tiempo_caso`) los comparte el harness por lotes del
+pool de workers (app.services.code_executor).
 """
 
-from RestrictedPython import compile_restricted, safe_globals, limited_builtins
+from RestrictedPython import compile_restricted_exec, safe_globals, limited_builtins
 from RestrictedPython.Guards import guarded_iter_unpack_sequence, safe_builtins
 import sys
+import threading
+import time
 from io import StringIO
-from typing import List, Dict, Any
+from types import CodeType
+from typing import List, Dict, Any, Iterator, Optional
 import signal
 import resource
 
 
+# Presupuestos por defecto del harness por lotes (segundos)
+CPU_POR_CASO = 2
+TIEMPO_TOTAL = 5
+
+
 class CodeExecutionTimeout(Exception):
     """Excepción para timeout de ejecución."""
     pass
 
 
+class TiempoTotalAgotado(CodeExecutionTimeout):
+    """El caso se interrumpió porque se agotó el presupuesto de tiempo total."""
+    pass
+
+
+class ErrorCodigoSeguro(Exception):
+    """Error que impide evaluar los casos (compilación, carga del módulo o falta de 'solucion')."""
+    pass
+
+
 def timeout_handler(signum, frame):
     """Handler para timeout."""
     raise CodeExecutionTimeout("Código excedió el límite de tiempo de ejecución")
 
 
-def ejecutar_codigo_python_seguro(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """
-    Ejecuta código Python en entorno restringido.
-    
-    Args:
-        codigo: Código fuente del usuario
-        casos_prueba: Lista de casos con 'input' y 'expected'
-    
-    Returns:
-        Resultado de ejecución con casos pasados/fallados
-    """
-    
-    # Configurar límites de recursos (solo en Unix)
-    if hasattr(resource, 'RLIMIT_AS'):
-        # Limitar memoria a 128MB
-        resource.setrlimit(resource.RLIMIT_AS, (128 * 1024 * 1024, 128 * 1024 * 1024))
-    
-    # Compilar código con restricciones
-    byte_code = compile_restricted(
-        codigo,
-        filename='<user_code>',
-        mode='exec'
-    )
-    
-    if byte_code.errors:
-        return {
-            'exito': False,
-            'error_compilacion': '\n'.join(byte_code.errors),
-            'casos_detalle': []
-        }
-    
-    # Namespace restringido - SOLO funciones seguras
-    restricted_globals = {
+def tiempo_total_handler(signum, frame):
+    """Handler para el presupuesto de tiempo total."""
+    raise TiempoTotalAgotado("Se agotó el tiempo total de ejecución")
+
+
+def _globals_restringidos() -> Dict[str, Any]:
+    """Namespace restringido - SOLO funciones seguras."""
+    return {
         '__builtins__': {
             # Tipos básicos
             'int': int,
@@ -92,186 +90,261 @@ def ejecutar_codigo_python_seguro(codigo: str, casos_prueba: List[Dict[str, Any]
         '_getiter_': lambda x: iter(x),
         '__name__': 'restricted_module',
     }
+
+
+def _temporizadores_disponibles() -> bool:
+    return hasattr(signal, 'ITIMER_PROF') and threading.current_thread() is threading.main_thread()
+
+
+def limitar_tiempo_caso(cpu: float, restante: float) -> None:
+    """
+    Arma un temporizador de CPU para el caso y otro de tiempo real con lo que
+    queda del presupuesto total, así un caso no puede pasarse del total
+    aunque le sobre CPU (solo en Unix y en el hilo principal).
+    """
+    if _temporizadores_disponibles():
+        signal.signal(signal.SIGPROF, timeout_handler)
+        signal.signal(signal.SIGALRM, tiempo_total_handler)
+        signal.setitimer(signal.ITIMER_PROF, cpu)
+        # setitimer(0) desarmaría el temporizador en lugar de dispararlo
+        signal.setitimer(signal.ITIMER_REAL, max(restante, 0.001))
+
+
+def cancelar_limite_tiempo() -> None:
+    if _temporizadores_disponibles():
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def compilar_codigo_seguro(codigo: str) -> CodeType:
+    """
+    Compila el código con RestrictedPython.
+    
+    Raises:
+        ErrorCodigoSeguro: Si el código no compila con las restricciones
+    """
+    byte_code = compile_restricted_exec(
+        codigo,
+        filename='<user_code>'
+    )
+    
+    if byte_code.errors:
+        raise ErrorCodigoSeguro('\n'.join(byte_code.errors))
+    
+    return byte_code.code
+
+
+def evaluar_casos_seguro(
+    byte_code: CodeType,
+    casos_prueba: List[Dict[str, Any]],
+    cpu_por_caso: float = CPU_POR_CASO,
+    tiempo_total: float = TIEMPO_TOTAL
+) -> Iterator[Dict[str, Any]]:
+    """
+    Carga el código compilado y evalúa todos los casos, emitiendo el detalle de
+    cada uno en cuanto termina.
+    
+    Cada caso (y la carga del módulo) tiene su propio presupuesto de CPU, acotado
+    además por lo que queda del tiempo total. Si se agota el tiempo total, el
+    caso en curso se interrumpe y los restantes se marcan como no ejecutados.
+    
+    Raises:
+        ErrorCodigoSeguro: Si falla la carga del módulo o no existe 'solucion'
+    """
+    restricted_globals = _globals_restringidos()
+    fin = time.monotonic() + tiempo_total
     
     try:
-        # Configurar timeout de 5 segundos (solo en Unix)
-        if hasattr(signal, 'SIGALRM'):
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(5)
-        
-        # Ejecutar código del usuario
-        exec(byte_code.code, restricted_globals)
-        
-        # Cancelar timeout
-        if hasattr(signal, 'SIGALRM'):
-            signal.alarm(0)
-        
+        limitar_tiempo_caso(cpu_por_caso, tiempo_total)
+        exec(byte_code, restricted_globals)
+    except TiempoTotalAgotado:
+        raise ErrorCodigoSeguro(f'El código excedió el tiempo total ({tiempo_total} segundos)')
     except CodeExecutionTimeout:
-        return {
-            'exito': False,
-            'error_compilacion': 'El código excedió el límite de tiempo (5 segundos)',
-            'casos_detalle': []
-        }
+        raise ErrorCodigoSeguro(f'El código excedió el límite de tiempo ({cpu_por_caso} segundos)')
     except Exception as e:
-        return {
-            'exito': False,
-            'error_compilacion': f'Error al ejecutar código: {str(e)}',
-            'casos_detalle': []
-        }
+        raise ErrorCodigoSeguro(f'Error al ejecutar código: {str(e)}')
+    finally:
+        cancelar_limite_tiempo()
     
     # Verificar que existe la función 'solucion'
     if 'solucion' not in restricted_globals:
-        return {
-            'exito': False,
-            'error_compilacion': 'No se encontró la función "solucion" en tu código',
-            'casos_detalle': []
-        }
+        raise ErrorCodigoSeguro('No se encontró la función "solucion" en tu código')
     
     solucion_func = restricted_globals['solucion']
     
-    # Ejecutar casos de prueba
-    casos_detalle = []
-    casos_pasados = 0
-    
     for i, caso in enumerate(casos_prueba):
+        entrada = caso.get('input', [])
+        if not isinstance(entrada, list):
+            entrada = [entrada]
+        esperado = caso.get('expected')
+        
+        restante = fin - time.monotonic()
+        if restante <= 0:
+            yield {
+                'caso': i + 1,
+                'input': entrada,
+                'expected': esperado,
+                'output': None,
+                'paso': False,
+                'error': f'No ejecutado: se agotó el tiempo total ({tiempo_total} segundos)',
+                'tiempo_ms': 0.0
+            }
+            continue
+        
+        # Capturar stdout
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        t0 = time.perf_counter()
+        
         try:
-            # Capturar stdout
-            old_stdout = sys.stdout
-            sys.stdout = StringIO()
-            
-            # Ejecutar función del usuario
-            entrada = caso.get('input', [])
-            if not isinstance(entrada, list):
-                entrada = [entrada]
-            
+            limitar_tiempo_caso(cpu_por_caso, restante)
             resultado = solucion_func(*entrada)
-            
-            # Restaurar stdout
+            error = None
+        except TiempoTotalAgotado:
+            resultado, error = None, f'El caso se interrumpió: se agotó el tiempo total ({tiempo_total} segundos)'
+        except CodeExecutionTimeout:
+            resultado, error = None, f'El caso excedió el límite de CPU ({cpu_por_caso} segundos)'
+        except Exception as e:
+            resultado, error = None, str(e)
+        finally:
+            cancelar_limite_tiempo()
+            tiempo_ms = round((time.perf_counter() - t0) * 1000, 3)
             output_capturado = sys.stdout.getvalue()
             sys.stdout = old_stdout
-            
-            # Comparar resultado
-            esperado = caso.get('expected')
-            paso = (resultado == esperado)
-            
-            if paso:
-                casos_pasados += 1
-            
-            casos_detalle.append({
+        
+        if error is not None:
+            yield {
                 'caso': i + 1,
                 'input': entrada,
                 'expected': esperado,
-                'output': resultado,
-                'paso': paso,
-                'stdout': output_capturado if output_capturado else None
-            })
-            
-        except Exception as e:
-            sys.stdout = old_stdout
-            casos_detalle.append({
-                'caso': i + 1,
-                'input': caso.get('input'),
-                'expected': caso.get('expected'),
                 'output': None,
                 'paso': False,
-                'error': str(e)
-            })
+                'error': error,
+                'tiempo_ms': tiempo_ms
+            }
+            continue
+        
+        yield {
+            'caso': i + 1,
+            'input': entrada,
+            'expected': esperado,
+            'output': resultado,
+            'paso': resultado == esperado,
+            'stdout': output_capturado if output_capturado else None,
+            'tiempo_ms': tiempo_ms
+        }
+
+
+def _resumir_resultados(
+    casos_prueba: List[Dict[str, Any]],
+    casos_detalle: List[Dict[str, Any]],
+    error: Optional[str] = None
+) -> Dict[str, Any]:
+    if error and not casos_detalle:
+        return {
+            'exito': False,
+            'error_compilacion': error,
+            'casos_detalle': []
+        }
+    
+    casos_pasados = sum(1 for c in casos_detalle if c.get('paso'))
     
     return {
-        'exito': casos_pasados == len(casos_prueba),
+        'exito': error is None and casos_pasados == len(casos_prueba),
         'casos_pasados': casos_pasados,
         'casos_totales': len(casos_prueba),
         'casos_detalle': casos_detalle,
-        'error_compilacion': None
+        'error_compilacion': error
     }
 
 
-# Mantener función original para JavaScript (sin cambios)
-def ejecutar_codigo_javascript(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
+def ejecutar_codigo_python_seguro(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Ejecuta código JavaScript usando Node.js (sin sandbox por ahora).
-    TODO: Implementar sandboxing similar con vm2 o Docker.
+    Ejecuta código Python en entorno restringido dentro del proceso actual.
+    
+    Pensada para scripts o procesos aislados: limita la memoria del proceso que
+    la llama, así que no debe invocarse desde el proceso del servidor.
+    
+    Args:
+        codigo: Código fuente del usuario
+        casos_prueba: Lista de casos con 'input' y 'expected'
+    
+    Returns:
+        Resultado de ejecución con casos pasados/fallados
     """
-    import subprocess
-    import json
-    import tempfile
-    import os
     
-    # Crear archivo temporal con el código
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False) as f:
-        # Agregar código de test
-        test_code = f"""
-{codigo}
-
-const testCases = {json.dumps(casos_prueba)};
-const results = [];
-
-for (const testCase of testCases) {{
-    try {{
-        const input = Array.isArray(testCase.input) ? testCase.input : [testCase.input];
-        const result = solucion(...input);
-        results.push({{
-            input: testCase.input,
-            expected: testCase.expected,
-            output: result,
-            paso: JSON.stringify(result) === JSON.stringify(testCase.expected)
-        }});
-    }} catch (error) {{
-        results.push({{
-            input: testCase.input,
-            expected: testCase.expected,
-            output: null,
-            paso: false,
-            error: error.message
-        }});
-    }}
-}}
-
-console.log(JSON.stringify(results));
-"""
-        f.write(test_code)
-        temp_path = f.name
+    # Configurar límites de recursos (solo en Unix)
+    if hasattr(resource, 'RLIMIT_AS'):
+        # Limitar memoria a 128MB
+        resource.setrlimit(resource.RLIMIT_AS, (128 * 1024 * 1024, 128 * 1024 * 1024))
     
     try:
-        # Ejecutar con Node.js con timeout
-        result = subprocess.run(
-            ['node', temp_path],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode != 0:
-            return {
-                'exito': False,
-                'error_compilacion': result.stderr,
-                'casos_detalle': []
-            }
-        
-        # Parsear resultados
-        casos_detalle = json.loads(result.stdout)
-        casos_pasados = sum(1 for c in casos_detalle if c.get('paso'))
-        
+        byte_code = compilar_codigo_seguro(codigo)
+        casos_detalle = list(evaluar_casos_seguro(byte_code, casos_prueba))
+    except ErrorCodigoSeguro as e:
+        return _resumir_resultados(casos_prueba, [], str(e))
+    
+    return _resumir_resultados(casos_prueba, casos_detalle)
+
+
+def ejecutar_codigo_javascript(codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Ejecuta código JavaScript en el pool persistente de Node.js.
+    Cada envío corre en un contexto `vm` nuevo con timeout.
+    """
+    import json
+    from app.services.node_executor import NodeHarnessError, get_node_pool
+    
+    pool = get_node_pool()
+    if not pool.disponible():
         return {
-            'exito': casos_pasados == len(casos_prueba),
-            'casos_pasados': casos_pasados,
-            'casos_totales': len(casos_prueba),
-            'casos_detalle': casos_detalle,
-            'error_compilacion': None
+            'exito': False,
+            'error_compilacion': 'Node.js no está instalado',
+            'casos_detalle': []
         }
-        
-    except subprocess.TimeoutExpired:
+    
+    casos_harness = []
+    for caso in casos_prueba:
+        entrada = caso.get('input')
+        casos_harness.append({
+            'args': entrada if isinstance(entrada, list) else [entrada],
+            'esperado': caso.get('expected')
+        })
+    
+    try:
+        respuesta = pool.evaluar(codigo, casos_harness, 5)
+    except NodeHarnessError as e:
         return {
             'exito': False,
-            'error_compilacion': 'El código excedió el límite de tiempo (5 segundos)',
+            'error_compilacion': str(e),
             'casos_detalle': []
         }
-    except Exception as e:
+    
+    if respuesta['error']:
         return {
             'exito': False,
-            'error_compilacion': str(e),
+            'error_compilacion': respuesta['error'],
             'casos_detalle': []
         }
-    finally:
-        # Limpiar archivo temporal
-        os.unlink(temp_path)
+    
+    casos_detalle = []
+    for caso, resultado in zip(casos_prueba, respuesta['resultados']):
+        detalle = {
+            'input': caso.get('input'),
+            'expected': caso.get('expected'),
+            'output': json.loads(resultado['output']) if resultado['output'] is not None else None,
+            'paso': resultado['pasado']
+        }
+        if resultado['error']:
+            detalle['error'] = resultado['error']
+        casos_detalle.append(detalle)
+    
+    casos_pasados = sum(1 for c in casos_detalle if c.get('paso'))
+    
+    return {
+        'exito': casos_pasados == len(casos_prueba),
+        'casos_pasados': casos_pasados,
+        'casos_totales': len(casos_prueba),
+        'casos_detalle': casos_detalle,
+        'error_compilacion': None
+    }
@@ -2,17 +2,19 @@ import time
 import json
 from google import genai
 
+# Forma parte de la clave de la caché de respuestas: subirla al cambiar el prompt
+PISTA_PROMPT_VERSION = "2"
 
-def generar_pista(codigo, lenguaje, client, informacion_usuario):
-    nombre = informacion_usuario.get("nombre", "Usuario")
-    
+
+async def generar_pista(codigo, lenguaje, client, informacion_usuario):
+    # La respuesta se cachea y se comparte entre usuarios con el mismo código:
+    # el prompt no incluye datos personales (informacion_usuario no se envía)
     prompt = f"""
     Actúa como una API de Mentoría de Código (Backend).
 
     INPUTS:
     - Lenguaje: {lenguaje}
     - Código del usuario (Snippet/Intento): {codigo}
-    - Perfil del Candidato: Nombre: {nombre}
 
     TASK:
     Analiza el código proporcionado e identifica el bloqueo lógico o la optimización necesaria. Genera una pista conceptual sin revelar la solución directa.
@@ -30,7 +32,7 @@ def generar_pista(codigo, lenguaje, client, informacion_usuario):
     """
     
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash',
             contents=prompt,
             config={'temperature': 0.6}
@@ -0,0 +1,191 @@
+"""
+Estimación empírica de la complejidad temporal de una solución.
+
+A partir del primer caso de prueba se generan entradas de tamaño creciente
+(repitiendo las listas y strings del input), se ejecutan todas en un único
+envío al executor y se ajusta por mínimos cuadrados cada curva candidata
+(O(1), O(log n), O(n), O(n log n), O(n^2)) a los tiempos medidos. La curva con
+menor error se compara con la complejidad declarada en `restricciones.tiempo`.
+"""
+
+import ast
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.code_executor import ejecutar_codigo_async
+
+
+# Tamaños de entrada generados y repeticiones por tamaño (se usa el mínimo)
+TAMANOS_ESCALADOS = [128, 256, 512, 1024, 2048]
+REPETICIONES = 3
+
+# Un modelo más simple gana si su error no supera al mejor en este margen
+# (O(n) y O(n log n) son difíciles de separar con tamaños pequeños)
+TOLERANCIA_MODELO = 0.5
+
+LENGUAJES_MEDIBLES = ("python", "javascript")
+
+MODELOS = {
+    "O(1)": lambda n: 1.0,
+    "O(log n)": lambda n: math.log2(n),
+    "O(n)": lambda n: float(n),
+    "O(n log n)": lambda n: n * math.log2(n),
+    "O(n^2)": lambda n: float(n * n),
+}
+ORDEN_MODELOS = list(MODELOS)
+
+
+def _parsear_valor(texto: str) -> Any:
+    try:
+        return json.loads(texto)
+    except (TypeError, ValueError):
+        return ast.literal_eval(texto)
+
+
+def _escalar(valor: Any, n: int) -> Tuple[Any, bool]:
+    """Repite listas y strings hasta tener n elementos; el resto no cambia."""
+    if isinstance(valor, (list, str)) and valor:
+        repetido = valor * math.ceil(n / len(valor))
+        return repetido[:n], True
+    return valor, False
+
+
+def generar_entrada_escalada(input_original: str, n: int) -> Optional[str]:
+    """
+    Input (JSON) del caso escalado a tamaño n, o None si no hay nada que escalar.
+
+    Igual que el executor, un input lista se interpreta como la lista de
+    argumentos de la función.
+    """
+    try:
+        valor = _parsear_valor(input_original)
+    except (ValueError, SyntaxError):
+        return None
+
+    if isinstance(valor, list):
+        argumentos = [_escalar(arg, n) for arg in valor]
+        if not any(escalado for _, escalado in argumentos):
+            return None
+        return json.dumps([arg for arg, _ in argumentos])
+
+    escalado, ok = _escalar(valor, n)
+    return json.dumps([escalado]) if ok else None
+
+
+def ajustar_complejidad(mediciones: List[Tuple[int, float]]) -> Tuple[str, Dict[str, float]]:
+    """
+    Ajusta t = a·f(n) + b (con a >= 0) para cada modelo.
+
+    Returns:
+        (modelo elegido, error relativo (RMSE / media) de cada modelo)
+    """
+    tiempos = [t for _, t in mediciones]
+    media_t = sum(tiempos) / len(tiempos)
+    errores = {}
+
+    for nombre, f in MODELOS.items():
+        xs = [f(n) for n, _ in mediciones]
+        media_x = sum(xs) / len(xs)
+        varianza = sum((x - media_x) ** 2 for x in xs)
+        a = sum((x - media_x) * (t - media_t) for x, t in zip(xs, tiempos)) / varianza if varianza else 0.0
+        a = max(a, 0.0)
+        b = media_t - a * media_x
+        rss = sum((t - (a * x + b)) ** 2 for x, t in zip(xs, tiempos))
+        errores[nombre] = round(math.sqrt(rss / len(tiempos)) / media_t, 4) if media_t else 0.0
+
+    mejor = min(errores.values())
+    elegido = next(
+        nombre for nombre in ORDEN_MODELOS
+        if errores[nombre] <= mejor * (1 + TOLERANCIA_MODELO) + 1e-9
+    )
+    return elegido, errores
+
+
+def _normalizar_notacion(notacion: str) -> str:
+    return (
+        notacion.lower()
+        .replace(" ", "")
+        .replace("*", "")
+        .replace("²", "^2")
+        .replace("·", "")
+    )
+
+
+def comparar_con_declarada(estimacion: str, declarada: Optional[str]) -> Optional[bool]:
+    """True si la estimación no es peor que la declarada; None si no se puede comparar."""
+    if not declarada:
+        return None
+
+    normalizados = [_normalizar_notacion(m) for m in ORDEN_MODELOS]
+    try:
+        indice_declarado = normalizados.index(_normalizar_notacion(declarada))
+    except ValueError:
+        return None
+    return ORDEN_MODELOS.index(estimacion) <= indice_declarado
+
+
+async def estimar_complejidad(
+    codigo: str,
+    lenguaje: str,
+    casos_prueba: List[Dict[str, Any]],
+    restricciones: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Ejecuta la solución con entradas escaladas y estima su complejidad temporal.
+
+    Returns:
+        Diccionario con 'estimacion', 'declarada', 'cumple', 'mediciones' y
+        'errores_ajuste'; 'estimacion' es None (con 'motivo') si no se pudo medir.
+    """
+    declarada = (restricciones or {}).get("tiempo")
+    resultado = {"estimacion": None, "declarada": declarada, "cumple": None, "mediciones": []}
+
+    if lenguaje.lower() not in LENGUAJES_MEDIBLES:
+        return {**resultado, "motivo": f"Análisis de complejidad no disponible para {lenguaje}"}
+
+    if not casos_prueba:
+        return {**resultado, "motivo": "No hay casos de prueba de referencia"}
+
+    entradas = {}
+    for n in TAMANOS_ESCALADOS:
+        entradas[n] = generar_entrada_escalada(casos_prueba[0].get("input", ""), n)
+        if entradas[n] is None:
+            return {**resultado, "motivo": "El input del desafío no tiene listas ni strings que escalar"}
+
+    # Rondas completas de tamaños: el calentamiento (JIT, cachés) no sesga un solo n
+    casos_escalados = [
+        {"input": entradas[n], "output": "null", "n": n}
+        for _ in range(REPETICIONES)
+        for n in TAMANOS_ESCALADOS
+    ]
+
+    ejecucion = await ejecutar_codigo_async(codigo, lenguaje, casos_escalados)
+    if ejecucion.get("error_compilacion"):
+        return {**resultado, "motivo": ejecucion["error_compilacion"]}
+
+    # Mínimo de las repeticiones de cada tamaño, descartando casos con error
+    por_tamano: Dict[int, Dict[str, Any]] = {}
+    for caso, detalle in zip(casos_escalados, ejecucion["casos_detalle"]):
+        if detalle.get("error") or detalle.get("tiempo_ms") is None:
+            continue
+        previo = por_tamano.get(caso["n"])
+        if previo is None or detalle["tiempo_ms"] < previo["tiempo_ms"]:
+            por_tamano[caso["n"]] = {
+                "n": caso["n"],
+                "tiempo_ms": detalle["tiempo_ms"],
+                "memoria_pico_kb": detalle.get("memoria_pico_kb")
+            }
+
+    mediciones = [por_tamano[n] for n in TAMANOS_ESCALADOS if n in por_tamano]
+    if len(mediciones) < 3:
+        return {**resultado, "mediciones": mediciones, "motivo": "La función falló con las entradas escaladas"}
+
+    estimacion, errores = ajustar_complejidad([(m["n"], m["tiempo_ms"]) for m in mediciones])
+    return {
+        **resultado,
+        "estimacion": estimacion,
+        "cumple": comparar_con_declarada(estimacion, declarada),
+        "mediciones": mediciones,
+        "errores_ajuste": errores
+    }
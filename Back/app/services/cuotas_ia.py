@@ -0,0 +1,112 @@
+"""
+Cuotas de tokens por usuario para los endpoints de IA.
+
+Cada endpoint tiene un presupuesto de tokens por ventana (token bucket) por
+usuario, o por IP cuando la petición no trae un usuario_id existente: un id
+inventado no abre un cubo nuevo. Cada llamada consume los tokens estimados
+de su prompt y su respuesta. Se reutiliza el
+GCRA de app.services.rate_limit con el coste igual a esos tokens, así que con
+Redis la cuota se comparte entre workers. Las rutas con caché de respuestas
+solo cobran cuando realmente llaman al modelo.
+
+El presupuesto restante se expone en X-Quota-Limit / X-Quota-Remaining; al
+agotarse se responde 429 con Retry-After.
+"""
+
+import math
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.services.rate_limit import get_rate_limit_backend
+
+# Aproximación habitual para texto y código con el tokenizer de Gemini
+CARACTERES_POR_TOKEN = 4
+
+CABECERA_LIMITE = "X-Quota-Limit"
+CABECERA_RESTANTE = "X-Quota-Remaining"
+
+
+@dataclass(frozen=True)
+class CuotaIA:
+    tokens: int  # presupuesto por ventana
+    ventana: int  # segundos
+    # Tokens fijos del prompt (instrucciones de la plantilla)
+    tokens_prompt: int
+    # Tokens esperados de respuesta por unidad generada
+    tokens_respuesta: int
+
+
+@lru_cache
+def get_cuotas_ia() -> Dict[str, CuotaIA]:
+    """Presupuesto por endpoint de IA, a partir de los settings."""
+    settings = get_settings()
+    ventana = settings.IA_CUOTA_VENTANA_SECONDS
+    return {
+        "code_review": CuotaIA(settings.IA_CUOTA_REVIEW_TOKENS, ventana, 600, 1500),
+        "pista": CuotaIA(settings.IA_CUOTA_PISTA_TOKENS, ventana, 300, 250),
+        "desafio": CuotaIA(settings.IA_CUOTA_GENERACION_TOKENS, ventana, 800, 1200),
+        "eventos": CuotaIA(settings.IA_CUOTA_GENERACION_TOKENS, ventana, 500, 200),
+        "noticias": CuotaIA(settings.IA_CUOTA_GENERACION_TOKENS, ventana, 500, 150),
+    }
+
+
+def estimar_tokens(endpoint: str, texto: str = "", unidades: int = 1) -> int:
+    """Tokens estimados de una llamada: plantilla + texto del usuario + respuesta."""
+    cuota = get_cuotas_ia()[endpoint]
+    return cuota.tokens_prompt + math.ceil(len(texto) / CARACTERES_POR_TOKEN) + cuota.tokens_respuesta * max(unidades, 1)
+
+
+def sujeto_cuota(request: Request, db: Session, usuario_id: Optional[str] = None) -> str:
+    """
+    Clave de la cuota: el usuario si existe en BD, si no la IP del cliente.
+    """
+    from app.models.db_models import Usuario
+    
+    if usuario_id:
+        try:
+            usuario = db.get(Usuario, uuid.UUID(str(usuario_id)))
+        except ValueError:
+            usuario = None
+        if usuario is not None:
+            return f"usuario:{usuario.id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def consumir_cuota_ia(response: Response, endpoint: str, sujeto: str, costo: int) -> None:
+    """
+    Descuenta `costo` tokens de la cuota del sujeto en el endpoint.
+
+    Raises:
+        HTTPException 429 si la cuota no alcanza, con Retry-After y las
+        cabeceras de cuota
+    """
+    cuota = get_cuotas_ia()[endpoint]
+    # Una sola petición nunca puede costar más que el presupuesto completo
+    costo = min(costo, cuota.tokens)
+
+    resultado = await get_rate_limit_backend().consumir(
+        f"cuota_ia:{endpoint}:{sujeto}", cuota.tokens, cuota.ventana, costo=costo
+    )
+    cabeceras = {
+        CABECERA_LIMITE: str(cuota.tokens),
+        CABECERA_RESTANTE: str(resultado.restante),
+    }
+
+    if not resultado.permitido:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "error": "Too Many Requests",
+                "message": "Has agotado tu cuota de IA. Intenta nuevamente más tarde.",
+                "tokens_solicitados": costo
+            },
+            headers={**cabeceras, "Retry-After": str(math.ceil(resultado.retry_after))}
+        )
+
+    response.headers.update(cabeceras)
@@ -0,0 +1,61 @@
+"""
+Caché en proceso del desafío global del día.
+
+El desafío es idéntico para todos los usuarios durante el día, así que se
+serializa y codifica a JSON una sola vez. Cada respuesta de /hoy concatena
+esos bytes con el fragmento de progreso del usuario.
+
+La clave es la fecha: al cambiar de día la entrada anterior deja de usarse.
+La generación de un desafío invalida su fecha y un TTL corto cubre los
+cambios hechos por otros workers.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.config import get_settings
+from app.services.cache import CacheLRU
+
+
+@dataclass(frozen=True)
+class DesafioCacheado:
+    desafio_id: str
+    titulo: str
+    # JSON del desafío sin la llave de cierre, listo para añadir el progreso
+    prefijo: bytes
+
+
+class CacheDesafioDelDia:
+    def __init__(self, ttl_segundos: float):
+        # Hoy y, como mucho, el día anterior justo después de medianoche
+        self._cache = CacheLRU(max_items=2, ttl_segundos=ttl_segundos)
+
+    def obtener(self, fecha: date) -> Optional[DesafioCacheado]:
+        return self._cache.obtener(fecha.isoformat())
+
+    def guardar(self, fecha: date, desafio_id: str, titulo: str, datos: Dict[str, Any]) -> DesafioCacheado:
+        cuerpo = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        entrada = DesafioCacheado(desafio_id=desafio_id, titulo=titulo, prefijo=cuerpo[:-1])
+        self._cache.guardar(fecha.isoformat(), entrada)
+        return entrada
+
+    def invalidar(self, fecha: date) -> None:
+        self._cache.invalidar(fecha.isoformat())
+
+    @staticmethod
+    def componer(entrada: DesafioCacheado, progreso: Dict[str, Any]) -> bytes:
+        """JSON completo: desafío cacheado + campos de progreso del usuario."""
+        fragmento = json.dumps(progreso, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return entrada.prefijo + b"," + fragmento[1:]
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+@lru_cache
+def get_cache_desafio_del_dia() -> CacheDesafioDelDia:
+    """Singleton de la caché del desafío del día."""
+    return CacheDesafioDelDia(ttl_segundos=get_settings().DESAFIO_HOY_CACHE_TTL_SECONDS)
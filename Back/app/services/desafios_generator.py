@@ -3,7 +3,7 @@ import json
 from google import genai
 
 
-def generar_desafio_diario(client, user_info, historia_desafios):
+async def generar_desafio_diario(client, user_info, historia_desafios):
     nivel = user_info.get("nivel", 1)
     intereses = user_info.get("intereses", ["Programación general"])
     lenguajes = user_info.get("lenguajes", ["Python", "JavaScript"])
@@ -60,13 +60,16 @@ def generar_desafio_diario(client, user_info, historia_desafios):
         {{ "input": "string", "output": "string", "tipo": "Normal", "explicacion": "string (breve)" }},
         {{ "input": "string", "output": "string", "tipo": "Edge Case", "explicacion": "string (breve)" }}
       ],
-      "pista": "string (Pista conceptual sin dar la solución directamente)"
+      "pista": "string (Pista conceptual sin dar la solución directamente)",
+      "solucion_referencia": "string (Solución correcta en Python: una función 'solucion' que pase todos los casos de prueba)"
     }}
     
     IMPORTANTE: Los templates deben ser estructuras realistas tipo LeetCode, con firma de función/clase predefinida.
+    IMPORTANTE: En casos_prueba, "input" es un array JSON con los argumentos de la función (ej: "[[1, 2, 3], 5]") y "output" es el valor JSON esperado.
+    La solucion_referencia se ejecutará contra los casos_prueba para validar el desafío: ambos deben ser consistentes.
     """
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash',
             contents=prompt,
             config={'temperature': 0.8}
@@ -83,7 +86,7 @@ def generar_desafio_diario(client, user_info, historia_desafios):
         campos_requeridos = {
             "lenguaje_recomendado", "titulo", "dificultad", "xp_recompensa",
             "contexto_negocio", "definicion_problema", "templates_por_lenguaje",
-            "restricciones", "casos_prueba", "pista"
+            "restricciones", "casos_prueba", "pista", "solucion_referencia"
         }
         campos_faltantes = campos_requeridos - set(desafio.keys())
         if campos_faltantes:
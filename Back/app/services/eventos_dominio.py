@@ -0,0 +1,158 @@
+"""
+Bus de eventos de dominio en proceso.
+
+Las rutas publican eventos (desafío completado, proyecto agregado) después de
+su commit y responden sin esperar. Un worker asíncrono los consume, agrupa los
+de un mismo usuario durante una ventana de debounce y recalcula su
+gamificación (badges, y con ellos el xp_bonus y el nivel) fuera del camino de
+la petición, en un hilo con su propia sesión.
+
+La asistencia a eventos se marca fuera de la API: quien cambie el estado puede
+publicar EventoAsistido; si no, la recoge la evaluación batch del scheduler.
+
+Si el bus está lleno o detenido el evento se descarta: la evaluación batch de
+badges del scheduler acaba recogiendo cualquier cambio perdido.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Set
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EventoDominio:
+    usuario_id: str
+
+
+@dataclass(frozen=True)
+class DesafioCompletado(EventoDominio):
+    desafio_id: str
+
+
+@dataclass(frozen=True)
+class EventoAsistido(EventoDominio):
+    evento_id: str
+
+
+@dataclass(frozen=True)
+class ProyectoAgregado(EventoDominio):
+    proyecto_id: str
+
+
+def recalcular_gamificacion_usuario(usuario_id: str) -> int:
+    """
+    Recalcula la gamificación derivada de un usuario. Síncrono: se ejecuta
+    en un hilo del worker.
+
+    Returns:
+        Número de badges desbloqueados
+    """
+    from app.database import SessionLocal
+    from app.services.badge_engine import desbloquear_badges
+
+    db = SessionLocal()
+    try:
+        # sumar_xp ya mantiene xp_total y nivel; el motor de badges suma el
+        # xp_bonus de los badges nuevos en la misma transacción
+        nuevos = desbloquear_badges(db, [usuario_id])
+        db.commit()
+        return sum(len(badges) for badges in nuevos.values())
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class BusEventosDominio:
+    """
+    Cola de eventos con un worker que hace debounce por usuario.
+
+    Un usuario con un recálculo ya programado no vuelve a programarse:
+    todos los eventos de la ventana se resuelven con un único recálculo.
+    """
+
+    def __init__(self, debounce_segundos: float, max_cola: int, concurrencia: int):
+        self.debounce_segundos = debounce_segundos
+        self.max_cola = max_cola
+        self.concurrencia = concurrencia
+        self._cola: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._programados: Dict[str, asyncio.TimerHandle] = {}
+        self._en_curso: Set[asyncio.Task] = set()
+
+    def iniciar(self) -> None:
+        if self._worker is not None:
+            return
+        self._cola = asyncio.Queue(maxsize=self.max_cola)
+        self._semaforo = asyncio.Semaphore(self.concurrencia)
+        self._worker = asyncio.create_task(self._consumir())
+        logger.info("Bus de eventos de dominio iniciado")
+
+    async def detener(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        for handle in self._programados.values():
+            handle.cancel()
+        self._programados.clear()
+        await asyncio.gather(self._worker, *self._en_curso, return_exceptions=True)
+        self._worker = None
+        self._cola = None
+
+    def publicar(self, evento: EventoDominio) -> None:
+        """No bloquea: se llama desde las rutas después del commit."""
+        if self._cola is None:
+            logger.debug(f"Bus de eventos detenido, se descarta {evento}")
+            return
+        try:
+            self._cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            logger.warning(f"Cola de eventos de dominio llena, se descarta {evento}")
+
+    async def _consumir(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            evento = await self._cola.get()
+            usuario_id = str(evento.usuario_id)
+            if usuario_id not in self._programados:
+                self._programados[usuario_id] = loop.call_later(
+                    self.debounce_segundos, self._lanzar, usuario_id
+                )
+
+    def _lanzar(self, usuario_id: str) -> None:
+        self._programados.pop(usuario_id, None)
+        tarea = asyncio.create_task(self._recalcular(usuario_id))
+        self._en_curso.add(tarea)
+        tarea.add_done_callback(self._en_curso.discard)
+
+    async def _recalcular(self, usuario_id: str) -> None:
+        async with self._semaforo:
+            try:
+                nuevos = await asyncio.to_thread(recalcular_gamificacion_usuario, usuario_id)
+                if nuevos:
+                    logger.info(f"Usuario {usuario_id}: {nuevos} badges desbloqueados")
+            except Exception as e:
+                logger.error(f"Error al recalcular gamificación de {usuario_id}: {str(e)}")
+
+
+@lru_cache
+def get_bus_eventos() -> BusEventosDominio:
+    """Singleton del bus de eventos de dominio."""
+    settings = get_settings()
+    return BusEventosDominio(
+        debounce_segundos=settings.EVENTOS_DOMINIO_DEBOUNCE_SECONDS,
+        max_cola=settings.EVENTOS_DOMINIO_MAX_COLA,
+        concurrencia=settings.EVENTOS_DOMINIO_CONCURRENCIA
+    )
+
+
+def publicar_evento(evento: EventoDominio) -> None:
+    get_bus_eventos().publicar(evento)
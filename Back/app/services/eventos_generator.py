@@ -55,7 +55,7 @@ DEFAULT_IMAGES = {
     ]
 }
 
-def buscar_eventos_generales(client, limite=15):
+async def buscar_eventos_generales(client, limite=15):
     fecha_inicio = datetime.now().strftime("%Y-%m-%d")
     fecha_fin = (datetime.now() + timedelta(days=60)).strftime("%Y-%m-%d")
     
@@ -94,7 +94,7 @@ def buscar_eventos_generales(client, limite=15):
     try:
         tools = [types.Tool(google_search=types.GoogleSearch())]
         
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash',
             contents=prompt,
             config=types.GenerateContentConfig(
@@ -3,14 +3,44 @@ Servicio de gamificación: Leaderboard, Badges y cálculo de XP.
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from typing import List, Dict, Any, Optional
+from sqlalchemy import and_, func, or_
+from typing import List, Dict, Any, Optional, Tuple
 from app.models.db_models import (
     Usuario, PerfilUsuario, DesafioDiario, ProgresoDesafioDiario, UsuarioEvento,
     Badge, UsuarioBadge
 )
 
 
+# XP por actividad (la recompensa de cada desafío está en DesafioDiario.xp_recompensa)
+XP_POR_EVENTO = 150  # la aplica el trigger xp_asistencia_evento (migrations/add_xp_total.sql)
+XP_POR_CERTIFICADO = 500
+XP_POR_LOGRO = 200
+XP_POR_DIA_RACHA = 20
+XP_POR_PROYECTO = 300
+XP_POR_NIVEL = 1000
+
+
+def sumar_xp(db: Session, usuario_id, delta: int, **contadores: int) -> None:
+    """
+    Suma `delta` a xp_total y recalcula el nivel en un único UPDATE atómico.
+    
+    Los `contadores` opcionales (ej: eventos_asistidos=1) se incrementan en el
+    mismo UPDATE. No hace commit: va en la transacción de quien llama.
+    """
+    valores = {
+        PerfilUsuario.xp_total: PerfilUsuario.xp_total + delta,
+        # En el SET, xp_total aún es el valor anterior
+        PerfilUsuario.nivel: (PerfilUsuario.xp_total + delta) // XP_POR_NIVEL + 1,
+    }
+    for campo, incremento in contadores.items():
+        columna = getattr(PerfilUsuario, campo)
+        valores[columna] = columna + incremento
+    
+    db.query(PerfilUsuario).filter(
+        PerfilUsuario.usuario_id == usuario_id
+    ).update(valores, synchronize_session=False)
+
+
 class GamificationService:
     """Gestiona el sistema de recompensas, badges y leaderboard."""
     
@@ -19,54 +49,23 @@ class GamificationService:
     
     def calcular_xp_usuario(self, perfil: PerfilUsuario) -> Dict[str, int]:
         """
-        Calcula XP total de un usuario basado en su perfil.
+        Datos de XP de un usuario a partir de su xp_total materializada.
         
         Returns:
             dict con 'xp_actual' y 'xp_next_level'
         """
         if not perfil:
-            return {"xp_actual": 0, "xp_next_level": 1000}
+            return {"xp_actual": 0, "xp_next_level": XP_POR_NIVEL}
         
-        # Base XP del nivel actual
-        base_xp = (perfil.nivel - 1) * 1000
-        
-        # XP ganada por actividades
-        # XP ganada por actividades (incluyendo proyectos manuales si se requiere, por ahora eventos/retos)
-        xp_events = perfil.eventos_asistidos * 150
-        xp_certs = perfil.certificados * 500
-        xp_achievements = perfil.logros * 200
-        xp_streak = perfil.racha_dias * 20
-        
-        # Sumar bonus de badges
-        usuario = perfil.usuario
-        xp_badges = sum(
-            ub.badge.xp_bonus 
-            for ub in usuario.badges 
-            if ub.badge
-        )
-
-        # Proyectos manuales (ej: 300 XP por proyecto)
-        xp_proyectos = 0
-        if hasattr(usuario, 'proyectos'):
-             xp_proyectos = len(usuario.proyectos) * 300
-        
-        # XP TOTAL ACUMULADO
-        xp_total = xp_events + xp_certs + xp_achievements + xp_streak + xp_badges + xp_proyectos
+        xp_total = perfil.xp_total or 0
         
         # CÁLCULO DE NIVEL: Cada 1000 XP es un nivel. Nivel 1 es 0-999 XP.
-        # Nivel = floor(xp_total / 1000) + 1
-        nivel_calculado = (xp_total // 1000) + 1
-        
-        # XP para el siguiente nivel (siempre múltiplo de 1000 superior)
-        xp_next_level_total = nivel_calculado * 1000
-        
-        # Si el nivel calculado es mayor al guardado, podríamos actualizarlo aquí o dejar que un proceso lo haga
-        # Para visualización, retornamos el calculado.
+        nivel_calculado = (xp_total // XP_POR_NIVEL) + 1
         
         return {
             "xp_actual": xp_total,           # XP Total acumulado en la vida
-            "xp_nivel_actual": xp_total % 1000, # XP dentro del nivel actual (barra de progreso)
-            "xp_next_level": 1000,           # Meta del nivel (siempre 1000 en este modelo lineal)
+            "xp_nivel_actual": xp_total % XP_POR_NIVEL, # XP dentro del nivel actual (barra de progreso)
+            "xp_next_level": XP_POR_NIVEL,   # Meta del nivel (siempre 1000 en este modelo lineal)
             "nivel_calculado": nivel_calculado
         }
     
@@ -74,24 +73,30 @@ class GamificationService:
         self, 
         limite: int = 100, 
         offset: int = 0,
-        filtro_lenguaje: Optional[str] = None
-    ) -> List[Dict[str, Any]]:
+        filtro_lenguaje: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
         Obtiene el leaderboard global ordenado por XP.
         
         Args:
             limite: Número de usuarios a retornar
-            offset: Paginación
+            offset: Paginación clásica (ignorado si hay cursor)
             filtro_lenguaje: Filtrar por lenguaje de programación
+            cursor: Cursor opaco devuelto por la página anterior
         
         Returns:
-            Lista de usuarios con su ranking y XP
+            (lista de usuarios con su ranking y XP, cursor de la página siguiente)
         """
-        from sqlalchemy.orm import joinedload
+        from app.services.paginacion import codificar_cursor, paginar
+        
+        # Conteo de badges como subconsulta escalar: sin cargar los badges
+        badges_count = self.db.query(func.count(UsuarioBadge.id)).filter(
+            UsuarioBadge.usuario_id == Usuario.id
+        ).correlate(Usuario).scalar_subquery()
         
-        query = self.db.query(Usuario, PerfilUsuario)\
-            .join(PerfilUsuario, Usuario.id == PerfilUsuario.usuario_id)\
-            .options(joinedload(Usuario.badges).joinedload(UsuarioBadge.badge))
+        query = self.db.query(Usuario, PerfilUsuario, badges_count.label("badges_count"))\
+            .join(PerfilUsuario, Usuario.id == PerfilUsuario.usuario_id)
         
         # Filtro opcional por lenguaje
         if filtro_lenguaje:
@@ -101,21 +106,20 @@ class GamificationService:
                 Usuario.id == LenguajeUsuario.usuario_id
             ).filter(LenguajeUsuario.lenguaje == filtro_lenguaje)
         
-        # Obtener usuarios ordenados por nivel y logros
-        usuarios = query.order_by(
-            desc(PerfilUsuario.nivel),
-            desc(PerfilUsuario.logros),
-            desc(PerfilUsuario.racha_dias)
-        ).limit(limite).offset(offset).all()
+        # Recorrido del índice (xp_total DESC, usuario_id): el orden es la XP mostrada
+        orden = [(PerfilUsuario.xp_total, True), (PerfilUsuario.usuario_id, False)]
+        clave = lambda fila: [fila[1].xp_total, fila[1].usuario_id]
+        usuarios, siguiente, extra = paginar(
+            query, orden, clave, limite, cursor=cursor, skip=offset
+        )
+        
+        # El cursor lleva el ranking de su última fila: sin recontar lo anterior
+        inicio = extra.get("r", 0) + 1 if cursor else offset + 1
+        if siguiente:
+            siguiente = codificar_cursor(clave(usuarios[-1]), r=inicio + len(usuarios) - 1)
         
-        # Calcular XP y armar leaderboard
         leaderboard = []
-        for rank, (usuario, perfil) in enumerate(usuarios, start=offset + 1):
-            xp_data = self.calcular_xp_usuario(perfil)
-            
-            # Contar badges desbloqueados (sin query adicional)
-            badges_count = len(usuario.badges)
-            
+        for rank, (usuario, perfil, badges_count) in enumerate(usuarios, start=inicio):
             leaderboard.append({
                 "ranking": rank,
                 "usuario_id": str(usuario.id),
@@ -123,120 +127,87 @@ class GamificationService:
                 "apellidos": usuario.apellidos,
                 "avatar_url": usuario.avatar_url,
                 "nivel": perfil.nivel,
-                "xp_total": xp_data["xp_actual"],
+                "xp_total": perfil.xp_total,
                 "racha_dias": perfil.racha_dias,
                 "badges_count": badges_count,
                 "eventos_asistidos": perfil.eventos_asistidos
             })
         
-        return leaderboard
+        return leaderboard, siguiente
     
     def get_usuario_ranking(self, usuario_id: str) -> Dict[str, Any]:
         """
         Obtiene el ranking específico de un usuario.
         
+        La posición es el número de perfiles por delante en el orden del
+        leaderboard (xp_total DESC, usuario_id) más uno: un conteo de rango
+        sobre idx_perfil_xp_total, sin materializar el leaderboard.
+        
         Returns:
             Posición en el leaderboard y datos de progreso
         """
-        # Obtener todos los usuarios con XP calculado
-        leaderboard_completo = self.get_leaderboard(limite=10000)
+        perfil = self.db.query(PerfilUsuario).filter(
+            PerfilUsuario.usuario_id == usuario_id
+        ).first()
         
-        # Buscar posición del usuario
-        for entry in leaderboard_completo:
-            if entry["usuario_id"] == usuario_id:
-                return {
-                    "ranking_global": entry["ranking"],
-                    "xp_total": entry["xp_total"],
-                    "nivel": entry["nivel"],
-                    "percentil": round((1 - entry["ranking"] / len(leaderboard_completo)) * 100, 1)
-                }
+        if not perfil:
+            return {
+                "ranking_global": None,
+                "xp_total": 0,
+                "nivel": 1,
+                "percentil": 0
+            }
+        
+        por_delante = self.db.query(func.count(PerfilUsuario.id)).filter(
+            or_(
+                PerfilUsuario.xp_total > perfil.xp_total,
+                and_(
+                    PerfilUsuario.xp_total == perfil.xp_total,
+                    PerfilUsuario.usuario_id < perfil.usuario_id
+                )
+            )
+        ).scalar()
+        total = self.db.query(func.count(PerfilUsuario.id)).scalar()
         
+        ranking = por_delante + 1
         return {
-            "ranking_global": None,
-            "xp_total": 0,
-            "nivel": 1,
-            "percentil": 0
+            "ranking_global": ranking,
+            "xp_total": perfil.xp_total,
+            "nivel": perfil.nivel,
+            "percentil": round((1 - ranking / total) * 100, 1)
         }
     
     def verificar_y_desbloquear_badges(self, usuario_id: str) -> List[Dict[str, Any]]:
         """
         Verifica si el usuario cumple criterios para nuevos badges.
         
+        Delega en el motor de reglas: una consulta de agregados para todos
+        los criterios e inserción en bloque de los badges desbloqueados.
+        
         Returns:
             Lista de badges recién desbloqueados
         """
-        usuario = self.db.query(Usuario).filter(Usuario.id == usuario_id).first()
-        if not usuario:
-            return []
-        
-        perfil = usuario.perfil
-        nuevos_badges = []
-        
-        # Obtener todos los badges disponibles
-        todos_badges = self.db.query(Badge).all()
-        
-        # Badges ya desbloqueados por el usuario
-        badges_desbloqueados_ids = {ub.badge_id for ub in usuario.badges}
+        from app.services.badge_engine import desbloquear_badges
         
-        for badge in todos_badges:
-            if badge.id in badges_desbloqueados_ids:
-                continue  # Ya tiene este badge
-            
-            criterio = badge.criterio_json
-            cumple = False
-            
-            # Evaluar criterios según tipo
-            if criterio.get("tipo") == "racha":
-                cumple = perfil.racha_dias >= criterio.get("dias", 0)
-            
-            elif criterio.get("tipo") == "desafios_completados":
-                desafios_completados = self.db.query(ProgresoDesafioDiario).filter(
-                    ProgresoDesafioDiario.usuario_id == usuario_id,
-                    ProgresoDesafioDiario.estado == "completado"
-                ).count()
-                cumple = desafios_completados >= criterio.get("cantidad", 0)
-            
-            elif criterio.get("tipo") == "desafios_dificiles":
-                desafios_dificiles = self.db.query(ProgresoDesafioDiario).join(
-                    DesafioDiario,
-                    ProgresoDesafioDiario.desafio_id == DesafioDiario.id
-                ).filter(
-                    ProgresoDesafioDiario.usuario_id == usuario_id,
-                    ProgresoDesafioDiario.estado == "completado",
-                    DesafioDiario.dificultad == "Difícil"
-                ).count()
-                cumple = desafios_dificiles >= criterio.get("cantidad", 0)
-            
-            elif criterio.get("tipo") == "eventos_asistidos":
-                cumple = perfil.eventos_asistidos >= criterio.get("cantidad", 0)
-            
-            elif criterio.get("tipo") == "nivel":
-                cumple = perfil.nivel >= criterio.get("nivel_minimo", 0)
-            
-            # Si cumple, desbloquear badge
-            if cumple:
-                nuevo_usuario_badge = UsuarioBadge(
-                    usuario_id=usuario_id,
-                    badge_id=badge.id,
-                    progreso_actual=100,  # 100% completado
-                    notificado=False
-                )
-                self.db.add(nuevo_usuario_badge)
-                
-                nuevos_badges.append({
-                    "id": str(badge.id),
-                    "nombre": badge.nombre,
-                    "descripcion": badge.descripcion,
-                    "icono": badge.icono,
-                    "color": badge.color,
-                    "rareza": badge.rareza,
-                    "xp_bonus": badge.xp_bonus
-                })
+        nuevos = desbloquear_badges(self.db, [usuario_id])
+        if not nuevos:
+            return []
         
-        if nuevos_badges:
-            self.db.commit()
+        self.db.commit()
         
-        return nuevos_badges
+        return [
+            {
+                "id": str(badge.id),
+                "nombre": badge.nombre,
+                "descripcion": badge.descripcion,
+                "icono": badge.icono,
+                "color": badge.color,
+                "rareza": badge.rareza,
+                "xp_bonus": badge.xp_bonus
+            }
+            for badges in nuevos.values()
+            for badge in badges
+        ]
     
     def get_badges_usuario(self, usuario_id: str) -> Dict[str, Any]:
         """
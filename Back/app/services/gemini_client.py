@@ -0,0 +1,26 @@
+"""
+Cliente de Gemini compartido por todo el proceso.
+
+Crear un `genai.Client` por petición vuelve a leer la API key y a montar el
+cliente HTTP cada vez; este singleton se crea una sola vez y los servicios usan
+su interfaz asíncrona (`client.aio`) directamente desde el event loop.
+"""
+
+import logging
+from functools import lru_cache
+
+from google import genai
+
+from app.credenciales import api_key
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache
+def get_gemini_client() -> genai.Client | None:
+    """Singleton del cliente de Gemini, o None si no se pudo inicializar."""
+    try:
+        return genai.Client(api_key=api_key())
+    except Exception as e:
+        logger.error(f"Error initializing GenAI client: {e}")
+        return None
@@ -0,0 +1,94 @@
+"""
+Caché de respuestas de IA para code review y pistas.
+
+La clave es (lenguaje, hash del código normalizado, versión del prompt). El
+código se normaliza a su secuencia de tokens, sin comentarios ni diferencias de
+espacios, así dos envíos que solo difieren en formato reutilizan la misma
+respuesta. Se guarda el JSON ya parseado que devuelve el modelo.
+
+Las respuestas se comparten entre usuarios, así que los prompts cacheados no
+pueden llevar datos del usuario (nombre, perfil): cambiar eso exige subir la
+versión del prompt.
+"""
+
+import hashlib
+import io
+import re
+import tokenize
+from functools import lru_cache
+
+from app.config import get_settings
+from app.services.cache import CacheEnCapas, CacheLRU, crear_cliente_redis
+
+# Tokens de Python que no cambian el significado del código
+_TOKENS_IGNORADOS = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+
+# Strings (se conservan) o comentarios estilo C (se eliminan)
+_PATRON_C = re.compile(
+    r'"(?:\\.|[^"\\])*"'
+    r"|'(?:\\.|[^'\\])*'"
+    r"|`(?:\\.|[^`\\])*`"
+    r"|//[^\n]*"
+    r"|/\*.*?\*/",
+    re.DOTALL
+)
+
+
+def _normalizar_python(codigo: str) -> str:
+    tokens = tokenize.generate_tokens(io.StringIO(codigo).readline)
+    return " ".join(
+        # INDENT/DEDENT cuentan como bloque, no como número de espacios
+        tok.string if tok.type not in (tokenize.INDENT, tokenize.DEDENT) else tokenize.tok_name[tok.type]
+        for tok in tokens
+        if tok.type not in _TOKENS_IGNORADOS
+    )
+
+
+def _normalizar_estilo_c(codigo: str) -> str:
+    sin_comentarios = _PATRON_C.sub(
+        lambda m: " " if m.group(0).startswith("/") else m.group(0),
+        codigo
+    )
+    return " ".join(sin_comentarios.split())
+
+
+def normalizar_codigo(codigo: str, lenguaje: str) -> str:
+    """Representación del código sin comentarios ni espacios irrelevantes."""
+    if lenguaje.lower() == "python":
+        try:
+            return _normalizar_python(codigo)
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            # Código incompleto: basta con normalizar espacios
+            return " ".join(codigo.split())
+    return _normalizar_estilo_c(codigo)
+
+
+def clave_semantica(lenguaje: str, codigo: str, version_prompt: str) -> str:
+    normalizado = normalizar_codigo(codigo, lenguaje)
+    hash_codigo = hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+    return f"{lenguaje.lower()}:{version_prompt}:{hash_codigo}"
+
+
+def _crear_cache(prefijo: str) -> CacheEnCapas:
+    settings = get_settings()
+    return CacheEnCapas(
+        local=CacheLRU(
+            max_items=settings.IA_CACHE_MAX_ITEMS,
+            ttl_segundos=settings.IA_CACHE_TTL_SECONDS
+        ),
+        prefijo=prefijo,
+        redis=crear_cliente_redis(),
+        ttl_segundos=settings.IA_CACHE_TTL_SECONDS
+    )
+
+
+@lru_cache
+def get_review_cache() -> CacheEnCapas:
+    """Singleton de la caché de code reviews."""
+    return _crear_cache("devpal:review:")
+
+
+@lru_cache
+def get_pista_cache() -> CacheEnCapas:
+    """Singleton de la caché de pistas."""
+    return _crear_cache("devpal:pista:")
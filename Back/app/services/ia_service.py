@@ -1,34 +1,36 @@
-from google import genai
-from google.genai import types
+import asyncio
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from typing import Tuple, Any
-from starlette.concurrency import run_in_threadpool
+from typing import Tuple, Any, Awaitable, Callable, Optional
 import logging
 
 from app.services.noticias_generator import buscar_noticias_generales
 from app.services.eventos_generator import buscar_eventos_generales
 from app.services.desafios_generator import generar_desafio_diario
-from app.services.code_review_generator import generar_pista
-from app.services.review_code_generator import review_code
-from app.credenciales import api_key
+from app.services.code_review_generator import PISTA_PROMPT_VERSION, generar_pista
+from app.services.review_code_generator import REVIEW_PROMPT_VERSION, review_code
+from app.services.ia_cache import clave_semantica, get_pista_cache, get_review_cache
+from app.services.gemini_client import get_gemini_client
+from app.services.single_flight import SingleFlight, advisory_lock
 from app.config import get_settings
 from app.database import get_db
 
 settings = get_settings()
-# client initialization moved to __init__ for safety
 logger = logging.getLogger(__name__)
 
+# Generaciones del desafío global en curso en este proceso, por fecha
+_generaciones_desafio = SingleFlight()
+
 class IAService:
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Optional[Session] = None):
+        # Sin sesión solo sirven los métodos que abren la suya propia
+        # (generar_id_desafio_global)
         self.db = db
-        try:
-            self.client = genai.Client(api_key=api_key())
-        except Exception as e:
-            logger.error(f"Error initializing GenAI client: {e}")
-            self.client = None
+        # Cliente compartido por el proceso (None si no se pudo inicializar)
+        self.client = get_gemini_client()
     
-    def generar_y_guardar_noticias(
+    async def generar_y_guardar_noticias(
         self, 
         usuario_id: str | None = None, 
         limite: int = 50
@@ -41,7 +43,7 @@ class IAService:
             return 0, 0
 
         try:
-            noticias_raw, timestamp = buscar_noticias_generales(self.client, limite)
+            noticias_raw, timestamp = await buscar_noticias_generales(self.client, limite)
             
             if not noticias_raw:
                 return 0, 0
@@ -76,7 +78,7 @@ class IAService:
             self.db.rollback()
             return 0, 0
     
-    def generar_y_guardar_eventos(
+    async def generar_y_guardar_eventos(
         self, 
         limite: int = 15
     ) -> Tuple[int, int]:
@@ -89,7 +91,7 @@ class IAService:
             return 0, 0
 
         try:
-            eventos_raw, timestamp = buscar_eventos_generales(self.client, limite)
+            eventos_raw, timestamp = await buscar_eventos_generales(self.client, limite)
             
             if not eventos_raw:
                 return 0, 0
@@ -142,17 +144,20 @@ class IAService:
             self.db.rollback()
             return 0, 0
     
-    async def generar_desafio_global(self) -> dict | None:
+    async def generar_desafio_global(self, fecha=None) -> dict | None:
         """
-        Genera un desafío diario GLOBAL (el mismo para todos los usuarios).
-        Si ya existe uno para hoy, lo retorna.
+        Genera un desafío diario GLOBAL (el mismo para todos los usuarios)
+        para `fecha` (hoy por defecto). Si ya existe uno, lo retorna.
+        
+        Las peticiones concurrentes comparten una única generación: dentro del
+        proceso mediante single-flight y entre workers con un advisory lock.
         """
         from app.models.db_models import DesafioDiario
         from datetime import datetime
         
-        hoy = datetime.now().date()
+        hoy = fecha or datetime.now().date()
         
-        # Verificar si ya existe un desafío para hoy
+        # Verificar si ya existe un desafío para esa fecha
         desafio_existente = self.db.query(DesafioDiario).filter(
             DesafioDiario.fecha == hoy
         ).first()
@@ -160,15 +165,66 @@ class IAService:
         if desafio_existente:
             return desafio_existente
         
+        desafio_id = await self.generar_id_desafio_global(hoy)
+        if desafio_id is None:
+            return None
+        
+        # Cada petición carga el desafío en su propia sesión
+        return self.db.query(DesafioDiario).filter(DesafioDiario.id == desafio_id).first()
+    
+    async def generar_id_desafio_global(self, fecha) -> Any:
+        """
+        Genera el desafío global de `fecha` si aún no existe y retorna su id
+        (None si no se pudo generar). No usa la sesión del servicio: las rutas
+        async lo cargan después con su AsyncSession.
+        """
         if not self.client:
             logger.warning("GenAI client not initialized. Skipping challenge generation.")
             return None
-
+        
+        return await _generaciones_desafio.ejecutar(
+            fecha.isoformat(),
+            lambda: self._generar_desafio_exclusivo(fecha)
+        )
+    
+    async def _generar_desafio_exclusivo(self, fecha) -> Any:
+        """
+        Genera el desafío de `fecha` con el advisory lock tomado y retorna su id.
+        Usa una sesión propia: la operación es compartida por varias peticiones.
+        Las consultas a esa sesión se hacen en un thread, fuera del event loop.
+        """
+        from app.models.db_models import DesafioDiario
+        from app.database import SessionLocal
+        
+        db = SessionLocal()
+        try:
+            async with advisory_lock(f"desafio_global:{fecha.isoformat()}"):
+                # Otro worker pudo generarlo mientras esperábamos el lock
+                desafio_id = await asyncio.to_thread(
+                    lambda: db.query(DesafioDiario.id).filter(DesafioDiario.fecha == fecha).scalar()
+                )
+                if desafio_id:
+                    return desafio_id
+                
+                desafio = await self._crear_desafio(db, fecha)
+                return desafio.id if desafio else None
+        except TimeoutError as e:
+            logger.error(f"Error generando desafío global: {e}")
+            return None
+        finally:
+            db.close()
+    
+    async def _crear_desafio(self, db: Session, fecha) -> Any:
+        """Llama a la IA y guarda el desafío global de `fecha`."""
+        from app.models.db_models import DesafioDiario
+        
         try:
             # 1. Obtener historial de desafíos previos para evitar repetición
-            desafios_previos = self.db.query(DesafioDiario.titulo).order_by(
-                DesafioDiario.fecha.desc()
-            ).limit(30).all()
+            desafios_previos = await asyncio.to_thread(
+                lambda: db.query(DesafioDiario.titulo).order_by(
+                    DesafioDiario.fecha.desc()
+                ).limit(30).all()
+            )
             historia_titulos = [d[0] for d in desafios_previos]
             
             # 2. User info genérico para desafío global
@@ -179,19 +235,29 @@ class IAService:
                 "lenguajes": ["Python", "JavaScript", "Java"]
             }
             
-            # 3. Generar desafío con IA
-            desafio_raw, timestamp = generar_desafio_diario(
-                self.client, 
-                user_info, 
-                historia_titulos
-            )
+            # 3. Generar desafío con IA y validarlo con su solución de referencia
+            desafio_raw = None
+            for intento in range(1, settings.DESAFIOS_INTENTOS_VALIDACION + 1):
+                candidato, timestamp = await generar_desafio_diario(
+                    self.client, 
+                    user_info, 
+                    historia_titulos
+                )
+                if not candidato:
+                    continue
+                
+                error = await self._validar_desafio(candidato)
+                if error is None:
+                    desafio_raw = candidato
+                    break
+                logger.warning(f"Desafío para {fecha} descartado (intento {intento}): {error}")
             
             if not desafio_raw:
                 return None
             
             # 4. Guardar en base de datos como desafío global
             desafio = DesafioDiario(
-                fecha=hoy,
+                fecha=fecha,
                 titulo=desafio_raw['titulo'],
                 lenguaje_recomendado=desafio_raw.get('lenguaje_recomendado', 'python'),
                 contexto_negocio=desafio_raw.get('contexto_negocio', ''),
@@ -203,18 +269,74 @@ class IAService:
                 dificultad=desafio_raw.get('dificultad', 'Medio'),
                 xp_recompensa=desafio_raw.get('xp_recompensa', 50),
             )
-            self.db.add(desafio)
-            self.db.commit()
-            self.db.refresh(desafio)
+            db.add(desafio)
+            
+            def persistir():
+                db.commit()
+                db.refresh(desafio)
+            
+            await asyncio.to_thread(persistir)
+            
+            from app.services.desafio_cache import get_cache_desafio_del_dia
+            get_cache_desafio_del_dia().invalidar(fecha)
             
-            logger.info(f"Desafío global generado para {hoy}: {desafio.titulo}")
+            logger.info(f"Desafío global generado para {fecha}: {desafio.titulo}")
             return desafio
 
         except Exception as e:
             logger.error(f"Error generando desafío global (posible quota limit): {e}")
-            self.db.rollback()
+            await asyncio.to_thread(db.rollback)
             return None
     
+    async def _validar_desafio(self, desafio_raw: dict) -> str | None:
+        """
+        Ejecuta la solución de referencia contra los casos de prueba generados.
+        Retorna None si el desafío es válido o el motivo del rechazo.
+        """
+        from app.services.code_executor import ejecutar_codigo_async
+        
+        solucion = desafio_raw.get('solucion_referencia')
+        casos_prueba = desafio_raw.get('casos_prueba') or []
+        if not solucion or not casos_prueba:
+            return "Falta la solución de referencia o los casos de prueba"
+        
+        resultado = await ejecutar_codigo_async(solucion, "python", casos_prueba)
+        if resultado.get("error_compilacion"):
+            return resultado["error_compilacion"][:200]
+        if not resultado["exito"]:
+            return f"La solución de referencia pasa {resultado['casos_pasados']}/{resultado['casos_totales']} casos"
+        return None
+    
+    async def asegurar_buffer_desafios(self, dias: int) -> int:
+        """
+        Genera los desafíos que falten desde hoy hasta `dias` días adelante.
+        Los desafíos futuros no se publican hasta su fecha.
+        
+        Returns:
+            Número de desafíos generados
+        """
+        from app.models.db_models import DesafioDiario
+        from datetime import datetime, timedelta
+        
+        hoy = datetime.now().date()
+        fechas = [hoy + timedelta(days=i) for i in range(dias)]
+        existentes = {
+            f for (f,) in self.db.query(DesafioDiario.fecha).filter(
+                DesafioDiario.fecha.in_(fechas)
+            ).all()
+        }
+        
+        generados = 0
+        # En orden: los títulos de los días anteriores entran en el historial
+        for fecha in fechas:
+            if fecha in existentes:
+                continue
+            if await self.generar_desafio_global(fecha):
+                generados += 1
+            else:
+                logger.warning(f"No se pudo pre-generar el desafío para {fecha}")
+        return generados
+    
     def generar_y_guardar_desafio(
         self,
         usuario_id: str,
@@ -243,10 +365,15 @@ class IAService:
         usuario_id: str,
         codigo: str,
         lenguaje: str,
-        informacion_usuario: dict
+        informacion_usuario: dict,
+        antes_de_generar: Optional[Callable[[], Awaitable[None]]] = None
     ) -> dict | None:
         """
         Realiza revisión de código con IA y guarda el resultado.
+        Envíos equivalentes (mismo código normalizado) reutilizan la respuesta
+        en caché, pero siempre se guarda la revisión del usuario.
+        `antes_de_generar` se espera solo si hay que llamar al modelo (p. ej.
+        para cobrar la cuota de IA); sus HTTPException se propagan.
         """
         from app.models.db_models import RevisionCodigo
         
@@ -259,17 +386,24 @@ class IAService:
             }
 
         try:
-            # 1. Generar review con IA (Ejecutado en threadpool para no bloquear)
-            review_raw, timestamp = await run_in_threadpool(
-                review_code,
-                codigo, 
-                lenguaje, 
-                self.client, 
-                informacion_usuario
-            )
+            # 1. Generar review con IA (o reutilizarla de la caché)
+            cache = get_review_cache()
+            clave = clave_semantica(lenguaje, codigo, REVIEW_PROMPT_VERSION)
+            review_raw = await cache.obtener(clave)
             
-            if not review_raw:
-                return None
+            if review_raw is None:
+                if antes_de_generar is not None:
+                    await antes_de_generar()
+                review_raw, timestamp = await review_code(
+                    codigo, 
+                    lenguaje, 
+                    self.client, 
+                    informacion_usuario
+                )
+                
+                if not review_raw:
+                    return None
+                await cache.guardar(clave, review_raw)
             
             # 2. Guardar en base de datos
             revision = RevisionCodigo(
@@ -288,6 +422,8 @@ class IAService:
             
             return revision
 
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error en Code Review (posible quota limit): {e}")
             self.db.rollback()
@@ -303,26 +439,38 @@ class IAService:
         self,
         codigo: str,
         lenguaje: str,
-        informacion_usuario: dict
+        informacion_usuario: dict,
+        antes_de_generar: Optional[Callable[[], Awaitable[None]]] = None
     ) -> dict | None:
         """
         Genera una pista para código del usuario.
-        No se guarda en BD (es efímera).
+        No se guarda en BD (es efímera). `antes_de_generar` como en
+        realizar_code_review: solo se espera en un fallo de caché.
         """
         if not self.client:
              return {"pista": "Servicio de IA no inicializado."}
 
         try:
-            # Ejecutado en threadpool para no bloquear
-            pista_raw, timestamp = await run_in_threadpool(
-                generar_pista,
+            cache = get_pista_cache()
+            clave = clave_semantica(lenguaje, codigo, PISTA_PROMPT_VERSION)
+            pista_raw = await cache.obtener(clave)
+            if pista_raw is not None:
+                return pista_raw
+            
+            if antes_de_generar is not None:
+                await antes_de_generar()
+            pista_raw, timestamp = await generar_pista(
                 codigo, 
                 lenguaje, 
                 self.client, 
                 informacion_usuario
             )
             
+            if pista_raw:
+                await cache.guardar(clave, pista_raw)
             return pista_raw
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error generando pista (posible quota limit): {e}")
             return {"pista": "No se pudo generar una pista en este momento (IA ocupada)."}
@@ -0,0 +1,185 @@
+"""
+Ejecución de JavaScript en procesos Node.js persistentes.
+
+En lugar de escribir un archivo temporal y lanzar `node` por cada envío, se
+mantiene un pequeño pool de procesos que ejecutan `node_harness.js` y reciben
+los envíos como JSON por stdin. La comprobación de versión de Node.js se hace
+una sola vez, al iniciar el pool.
+"""
+
+import json
+import logging
+import queue
+import shutil
+import subprocess
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+NODE_HARNESS_PATH = Path(__file__).with_name("node_harness.js")
+
+# Margen sobre el timeout del harness antes de dar el proceso por colgado
+MARGEN_TIMEOUT = 1.0
+
+
+class NodeHarnessError(Exception):
+    """Error de infraestructura al ejecutar en el harness de Node.js."""
+    pass
+
+
+class _NodeProceso:
+    """Proceso `node node_harness.js` con un thread lector de su stdout."""
+
+    def __init__(self, memoria_mb: int):
+        self.proceso = subprocess.Popen(
+            ["node", f"--max-old-space-size={memoria_mb}", str(NODE_HARNESS_PATH)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1
+        )
+        self._respuestas: queue.Queue = queue.Queue()
+        self._siguiente_id = 0
+        self.tareas = 0
+        threading.Thread(target=self._leer, daemon=True).start()
+
+    def _leer(self) -> None:
+        for linea in self.proceso.stdout:
+            self._respuestas.put(linea)
+        self._respuestas.put(None)  # EOF: el proceso terminó
+
+    def evaluar(self, codigo: str, casos: List[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+        self._siguiente_id += 1
+        peticion = {
+            "id": self._siguiente_id,
+            "codigo": codigo,
+            "casos": casos,
+            "timeout_ms": int(timeout * 1000)
+        }
+        try:
+            self.proceso.stdin.write(json.dumps(peticion) + "\n")
+            self.proceso.stdin.flush()
+            linea = self._respuestas.get(timeout=timeout + MARGEN_TIMEOUT)
+        except (OSError, ValueError) as e:
+            raise NodeHarnessError(f"El proceso de Node.js no está disponible: {e}")
+        except queue.Empty:
+            raise NodeHarnessError(f"Tiempo de ejecución excedido ({timeout}s)")
+
+        if linea is None:
+            raise NodeHarnessError("La ejecución terminó inesperadamente (posible límite de memoria excedido)")
+
+        try:
+            respuesta = json.loads(linea)
+        except ValueError:
+            raise NodeHarnessError("Respuesta inválida del harness de Node.js")
+        if respuesta.get("id") != peticion["id"]:
+            raise NodeHarnessError("Respuesta inesperada del harness de Node.js")
+        return respuesta
+
+    def matar(self) -> None:
+        try:
+            self.proceso.kill()
+            self.proceso.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+
+class NodeHarnessPool:
+    """
+    Pool de procesos Node.js reutilizables.
+
+    Es síncrono y thread-safe: los llamadores ya se ejecutan fuera del event loop.
+    Como en PythonWorkerPool, cada proceso se recicla al llegar a
+    `max_tareas_por_worker` envíos o tras cualquier fallo. Un hueco del pool
+    con None se rellena con un proceso nuevo al usarse.
+    """
+
+    def __init__(self, tamano: int = 2, memoria_mb: int = 256, max_tareas_por_worker: int = 50):
+        self.tamano = tamano
+        self.memoria_mb = memoria_mb
+        self.max_tareas_por_worker = max_tareas_por_worker
+        self.version: Optional[str] = None
+        self._libres: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._iniciado = False
+
+    def iniciar(self) -> None:
+        """Comprueba Node.js (una sola vez) y arranca los procesos."""
+        with self._lock:
+            if self._iniciado:
+                return
+            self._iniciado = True
+
+            if shutil.which("node"):
+                try:
+                    resultado = subprocess.run(
+                        ["node", "--version"], capture_output=True, text=True, timeout=2
+                    )
+                    self.version = resultado.stdout.strip() or None
+                except (OSError, subprocess.TimeoutExpired):
+                    self.version = None
+
+            if not self.version:
+                logger.warning("Node.js no está disponible; la ejecución de JavaScript está deshabilitada")
+                return
+
+            for _ in range(self.tamano):
+                self._libres.put(_NodeProceso(self.memoria_mb))
+            logger.info(f"Pool de Node.js {self.version} iniciado con {self.tamano} procesos")
+
+    def disponible(self) -> bool:
+        self.iniciar()
+        return self.version is not None
+
+    def evaluar(self, codigo: str, casos: List[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+        """
+        Evalúa un envío y retorna {"error", "resultados"} del harness.
+
+        Raises:
+            NodeHarnessError: si el proceso se cuelga o muere (se reemplaza).
+        """
+        self.iniciar()
+        proceso = self._libres.get()
+        reciclar = True
+        try:
+            if proceso is None:
+                try:
+                    proceso = _NodeProceso(self.memoria_mb)
+                except OSError as e:
+                    raise NodeHarnessError(f"No se pudo iniciar Node.js: {e}")
+            proceso.tareas += 1
+            resultado = proceso.evaluar(codigo, casos, timeout)
+            reciclar = proceso.tareas >= self.max_tareas_por_worker
+            return resultado
+        finally:
+            if reciclar:
+                # El reemplazo se crea en el siguiente uso del hueco
+                if proceso is not None:
+                    proceso.matar()
+                proceso = None
+            self._libres.put(proceso)
+
+    def detener(self) -> None:
+        while not self._libres.empty():
+            proceso = self._libres.get_nowait()
+            if proceso is not None:
+                proceso.matar()
+        self._iniciado = False
+
+
+@lru_cache
+def get_node_pool() -> NodeHarnessPool:
+    """Singleton del pool configurado desde Settings."""
+    settings = get_settings()
+    return NodeHarnessPool(
+        tamano=settings.CODE_EXECUTOR_NODE_POOL_SIZE,
+        memoria_mb=settings.CODE_EXECUTOR_MEMORY_MB,
+        max_tareas_por_worker=settings.CODE_EXECUTOR_MAX_TASKS_PER_WORKER
+    )
@@ -0,0 +1,174 @@
+/**
+ * Harness persistente de ejecución JavaScript para DevPal.
+ *
+ * Protocolo: una petición JSON por línea en stdin y una respuesta JSON por
+ * línea en stdout.
+ *
+ *   petición:  {"id", "codigo", "casos": [{"args": [...], "esperado": ...} | {"error": "..."}], "timeout_ms"}
+ *   respuesta: {"id", "error": null | "mensaje", "determinista", "resultados": [{"output", "pasado",
+ *               "error", "tiempo_ms", "tiempo_cpu_ms", "memoria_pico_kb"}]}
+ *
+ * `determinista` es false cuando el error es un timeout: depende de la carga
+ * de la máquina, no solo del código.
+ *
+ * Cada envío se evalúa en un contexto `vm` nuevo; el timeout cubre tanto la
+ * carga del código como la ejecución de todos los casos.
+ *
+ * El contexto solo recibe valores primitivos: la consola y el runner se crean
+ * dentro de él y los casos llegan como JSON. Ningún objeto o función del realm
+ * del host (cuyo `constructor` daría acceso a `process`) es alcanzable desde
+ * el código del usuario. El host mide cada caso y compara la salida.
+ */
+'use strict';
+
+const vm = require('vm');
+const readline = require('readline');
+
+const ERROR_SIN_FUNCION = 'No se encontró una función en el código';
+
+// Se ejecuta dentro del contexto antes del código del usuario. `console`
+// silenciosa: el stdout de este proceso es el canal del protocolo
+const PRELUDIO = `(function () {
+    const nada = function () {};
+    globalThis.console = Object.freeze({ log: nada, info: nada, warn: nada, error: nada, debug: nada });
+})();`;
+
+// Se ejecuta dentro del contexto después del código del usuario, para que
+// las declaraciones `const`/`let` de nivel superior también sean visibles.
+// Define __devpal_ejecutar(i), que devuelve el resultado del caso i como JSON.
+const RUNNER = `(function (casosJson) {
+    const candidatos = [
+        typeof solucion !== 'undefined' ? solucion : undefined,
+        typeof solution !== 'undefined' ? solution : undefined,
+        typeof solve !== 'undefined' ? solve : undefined,
+    ];
+    let mainFunction = candidatos.find((f) => typeof f === 'function');
+    if (!mainFunction) {
+        for (const key of Object.keys(globalThis)) {
+            if (typeof globalThis[key] === 'function' && !key.startsWith('_')) {
+                mainFunction = globalThis[key];
+                break;
+            }
+        }
+    }
+    if (!mainFunction) {
+        return false;
+    }
+    const casos = JSON.parse(casosJson);
+    globalThis.__devpal_ejecutar = function (i) {
+        try {
+            const outputJson = JSON.stringify(mainFunction(...casos[i].args));
+            return JSON.stringify({ output: outputJson === undefined ? null : outputJson, error: null });
+        } catch (error) {
+            return JSON.stringify({ output: null, error: String(error && error.message || error) });
+        }
+    };
+    return true;
+})(__devpal_casos)`;
+
+// Muestra de métricas del proceso, tomada en el host alrededor de cada caso
+function medir() {
+    const cpu = process.cpuUsage();
+    return {
+        reloj: performance.now(),
+        cpu: (cpu.user + cpu.system) / 1000,
+        rssPicoKb: process.resourceUsage().maxRSS,
+    };
+}
+
+function redondear(valor) {
+    return Math.round(valor * 1000) / 1000;
+}
+
+function esTimeout(error) {
+    return Boolean(error && error.code === 'ERR_SCRIPT_EXECUTION_TIMEOUT');
+}
+
+function describirError(error, timeoutMs) {
+    if (esTimeout(error)) {
+        return `Tiempo de ejecución excedido (${timeoutMs / 1000}s)`;
+    }
+    if (error && error.name && error.message) {
+        return `${error.name}: ${error.message}`;
+    }
+    return String(error);
+}
+
+function evaluar(peticion) {
+    const inicio = Date.now();
+    const timeoutMs = peticion.timeout_ms || 5000;
+    const casos = peticion.casos || [];
+    const restante = () => Math.max(1, timeoutMs - (Date.now() - inicio));
+
+    // Sandbox sin prototipo y con solo primitivos
+    const sandbox = Object.create(null);
+    sandbox.__devpal_casos = JSON.stringify(casos.map((caso) => (caso.error ? { args: [] } : caso)));
+    const contexto = vm.createContext(sandbox, { microtaskMode: 'afterEvaluate' });
+
+    try {
+        vm.runInContext(PRELUDIO, contexto, { filename: 'preludio.js' });
+        vm.runInContext(peticion.codigo, contexto, { filename: 'solucion.js', timeout: timeoutMs });
+        const encontrada = vm.runInContext(RUNNER, contexto, { filename: 'runner.js', timeout: restante() });
+        if (encontrada !== true) {
+            return { id: peticion.id, error: ERROR_SIN_FUNCION, determinista: true, resultados: [] };
+        }
+
+        const resultados = casos.map((caso, i) => {
+            if (caso.error) {
+                return { output: null, pasado: false, error: caso.error };
+            }
+            const antes = medir();
+            const crudo = vm.runInContext(`__devpal_ejecutar(${i})`, contexto, { filename: 'caso.js', timeout: restante() });
+            const despues = medir();
+            const metricas = {
+                tiempo_ms: redondear(despues.reloj - antes.reloj),
+                tiempo_cpu_ms: redondear(despues.cpu - antes.cpu),
+                memoria_pico_kb: despues.rssPicoKb,
+            };
+
+            // Solo se acepta un string: el host nunca toca objetos del contexto
+            let caso_resultado;
+            try {
+                caso_resultado = typeof crudo === 'string' ? JSON.parse(crudo) : null;
+            } catch (error) {
+                caso_resultado = null;
+            }
+            if (caso_resultado === null || typeof caso_resultado !== 'object') {
+                return { output: null, pasado: false, error: 'Resultado inválido', ...metricas };
+            }
+            const output = typeof caso_resultado.output === 'string' ? caso_resultado.output : null;
+            const error = caso_resultado.error === null ? null : String(caso_resultado.error);
+            return {
+                output,
+                pasado: error === null && output !== null && output === JSON.stringify(caso.esperado),
+                error,
+                ...metricas,
+            };
+        });
+        return { id: peticion.id, error: null, determinista: true, resultados };
+    } catch (error) {
+        return {
+            id: peticion.id,
+            error: describirError(error, timeoutMs),
+            determinista: !esTimeout(error),
+            resultados: [],
+        };
+    }
+}
+
+const entrada = readline.createInterface({ input: process.stdin, terminal: false });
+
+entrada.on('line', (linea) => {
+    if (!linea.trim()) {
+        return;
+    }
+    let respuesta;
+    try {
+        respuesta = evaluar(JSON.parse(linea));
+    } catch (error) {
+        respuesta = { id: null, error: describirError(error), determinista: false, resultados: [] };
+    }
+    process.stdout.write(JSON.stringify(respuesta) + '\n');
+});
+
+entrada.on('close', () => process.exit(0));
@@ -4,7 +4,7 @@ from google import genai
 from google.genai import types
 
 
-def buscar_noticias_generales(client, limite=50):
+async def buscar_noticias_generales(client, limite=50):
     prompt = f"""
     Busca las {limite} noticias más relevantes y recientes sobre TECNOLOGÍA de las últimas 24-48 horas.
     
@@ -39,7 +39,7 @@ def buscar_noticias_generales(client, limite=50):
     try:
         tools = [types.Tool(google_search=types.GoogleSearch())]
         
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash',
             contents=prompt,
             config=types.GenerateContentConfig(
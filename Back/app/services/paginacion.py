@@ -0,0 +1,167 @@
+"""
+Paginación por cursor (keyset) para los listados de la API.
+
+En lugar de OFFSET, cada página filtra por los valores de ordenación de la
+última fila de la página anterior (con el id como desempate), así una página
+profunda cuesta lo mismo que la primera. El cursor es opaco para el cliente:
+JSON en base64 con esos valores.
+"""
+
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select, and_, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+# (columna, descendente)
+Orden = Sequence[Tuple[Any, bool]]
+
+# Los listados que devuelven un array informan del cursor en esta cabecera
+CABECERA_CURSOR = "X-Next-Cursor"
+
+
+def _a_json(valor: Any) -> Any:
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    return valor
+
+
+def _desde_json(valor: Any, columna) -> Any:
+    """Reconstruye el valor con el tipo Python de la columna."""
+    if valor is None:
+        return None
+    tipo = columna.type.python_type
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    if tipo is uuid.UUID:
+        return uuid.UUID(valor)
+    return tipo(valor)
+
+
+def codificar_cursor(valores: List[Any], **extra: Any) -> str:
+    payload = {"k": [_a_json(v) for v in valores], **extra}
+    crudo = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, orden: Orden) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Returns:
+        (valores de ordenación tipados, datos extra del cursor)
+
+    Raises:
+        HTTPException 400: Si el cursor no es válido para este listado
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        claves = payload.pop("k")
+        if len(claves) != len(orden):
+            raise ValueError("longitud de cursor inesperada")
+        valores = [_desde_json(v, columna) for v, (columna, _) in zip(claves, orden)]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+    return valores, payload
+
+
+def _condicion_posterior(orden: Orden, valores: List[Any]):
+    """Filas que van después de `valores` en el orden dado."""
+    direcciones = {descendente for _, descendente in orden}
+    if len(direcciones) == 1:
+        # Misma dirección en todas las columnas: comparación de tuplas (usa el índice)
+        columnas = tuple_(*[columna for columna, _ in orden])
+        return columnas < tuple_(*valores) if direcciones.pop() else columnas > tuple_(*valores)
+
+    # Direcciones mixtas: (a > x) OR (a = x AND b > y) ...
+    condiciones = []
+    for i, (columna, descendente) in enumerate(orden):
+        iguales = [c == v for (c, _), v in zip(orden[:i], valores[:i])]
+        siguiente = columna < valores[i] if descendente else columna > valores[i]
+        condiciones.append(and_(*iguales, siguiente))
+    return or_(*condiciones)
+
+
+def _preparar(consulta, orden: Orden, limite: int, cursor: Optional[str], skip: int):
+    """Filtro de cursor (u offset), orden y límite+1. Vale para Query y Select."""
+    extra: Dict[str, Any] = {}
+    if cursor:
+        valores, extra = decodificar_cursor(cursor, orden)
+        consulta = consulta.filter(_condicion_posterior(orden, valores))
+    elif skip:
+        consulta = consulta.offset(skip)
+
+    consulta = consulta.order_by(*[
+        columna.desc() if descendente else columna.asc()
+        for columna, descendente in orden
+    ])
+    return consulta.limit(limite + 1), extra
+
+
+def _recortar(filas: List[Any], clave: Callable[[Any], List[Any]], limite: int) -> Tuple[List[Any], Optional[str]]:
+    # Sin filas en la página no hay última clave de la que partir
+    if len(filas) <= limite or limite <= 0:
+        return filas[:max(limite, 0)], None
+    filas = filas[:limite]
+    return filas, codificar_cursor(clave(filas[-1]))
+
+
+def paginar(
+    query: Query,
+    orden: Orden,
+    clave: Callable[[Any], List[Any]],
+    limite: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Tuple[List[Any], Optional[str], Dict[str, Any]]:
+    """
+    Aplica orden, filtro de cursor y límite a `query`.
+
+    Args:
+        orden: Columnas de ordenación; la última debe ser única (id)
+        clave: Extrae de una fila los valores de las columnas de `orden`
+        skip: Offset clásico, solo se usa sin cursor (compatibilidad)
+
+    Returns:
+        (filas, cursor de la página siguiente o None, datos extra del cursor recibido)
+    """
+    query, extra = _preparar(query, orden, limite, cursor, skip)
+    filas, siguiente = _recortar(query.all(), clave, limite)
+    return filas, siguiente, extra
+
+
+async def paginar_async(
+    db: AsyncSession,
+    stmt: Select,
+    orden: Orden,
+    clave: Callable[[Any], List[Any]],
+    limite: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Tuple[List[Any], Optional[str], Dict[str, Any]]:
+    """
+    Igual que `paginar` para un `select()` sobre una AsyncSession. Si el
+    select es de una sola entidad/columna se devuelven escalares.
+    """
+    stmt, extra = _preparar(stmt, orden, limite, cursor, skip)
+    resultado = await db.execute(stmt)
+    filas = resultado.scalars().all() if len(stmt.column_descriptions) == 1 else resultado.all()
+    filas, siguiente = _recortar(list(filas), clave, limite)
+    return filas, siguiente, extra
+
+
+def exponer_cursor(response: Response, cursor: Optional[str]) -> None:
+    """Añade la cabecera con el cursor de la página siguiente, si la hay."""
+    if cursor:
+        response.headers[CABECERA_CURSOR] = cursor
@@ -0,0 +1,128 @@
+"""
+Hash y verificación de contraseñas fuera del event loop.
+
+bcrypt cuesta ~200ms de CPU por llamada; ejecutado dentro de una ruta async
+bloquea el worker entero. Las llamadas se envían a un ThreadPoolExecutor
+dedicado (bcrypt libera el GIL) y el loop queda libre mientras tanto.
+
+El número de operaciones admitidas (en curso + en espera) está acotado: si
+una ráfaga lo supera, la petición se rechaza con 503 y Retry-After en vez de
+acumular esperas que disparan la latencia de todos los logins.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HasherContrasenas:
+    """Pool acotado de threads para bcrypt con métricas de cola."""
+
+    def __init__(self, workers: int, max_pendientes: int, retry_after_segundos: int):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self.retry_after_segundos = retry_after_segundos
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._en_curso = 0
+        self._pico_pendientes = 0
+        self._completadas = 0
+        self._rechazadas = 0
+        self._espera_total = 0.0
+        self._ejecucion_total = 0.0
+
+    def _reservar(self) -> None:
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self._rechazadas += 1
+                rechazar = True
+            else:
+                self._pendientes += 1
+                self._pico_pendientes = max(self._pico_pendientes, self._pendientes)
+                rechazar = False
+        if rechazar:
+            logger.warning(f"Cola de hashing llena ({self.max_pendientes}), se rechaza la petición")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio saturado, inténtalo de nuevo en unos segundos",
+                headers={"Retry-After": str(self.retry_after_segundos)}
+            )
+
+    def _medir(self, funcion: Callable, encolado: float, *args) -> Any:
+        inicio = time.perf_counter()
+        with self._lock:
+            self._en_curso += 1
+            self._espera_total += inicio - encolado
+        try:
+            return funcion(*args)
+        finally:
+            with self._lock:
+                self._en_curso -= 1
+                self._completadas += 1
+                self._ejecucion_total += time.perf_counter() - inicio
+
+    def _liberar(self, _futuro: Optional[Future] = None) -> None:
+        with self._lock:
+            self._pendientes -= 1
+
+    async def _ejecutar(self, funcion: Callable, *args) -> Any:
+        self._reservar()
+        try:
+            futuro = self._executor.submit(self._medir, funcion, time.perf_counter(), *args)
+        except RuntimeError:
+            # Executor ya detenido
+            self._liberar()
+            raise
+        # El hueco se libera al terminar el futuro, también si se cancela
+        # antes de empezar (cliente desconectado mientras esperaba en cola)
+        futuro.add_done_callback(self._liberar)
+        return await asyncio.wrap_future(futuro)
+
+    async def hash(self, password: str) -> str:
+        return await self._ejecutar(pwd_context.hash, password)
+
+    async def verificar(self, password: str, password_hash: str) -> bool:
+        return await self._ejecutar(pwd_context.verify, password, password_hash)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            completadas = self._completadas
+            return {
+                "workers": self.workers,
+                "max_pendientes": self.max_pendientes,
+                "en_curso": self._en_curso,
+                "en_cola": self._pendientes - self._en_curso,
+                "pico_pendientes": self._pico_pendientes,
+                "completadas": completadas,
+                "rechazadas": self._rechazadas,
+                "espera_media_ms": round(self._espera_total / completadas * 1000, 2) if completadas else 0.0,
+                "ejecucion_media_ms": round(self._ejecucion_total / completadas * 1000, 2) if completadas else 0.0
+            }
+
+    def detener(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache
+def get_password_hasher() -> HasherContrasenas:
+    """Singleton del pool de hashing de contraseñas."""
+    settings = get_settings()
+    return HasherContrasenas(
+        workers=settings.PASSWORD_HASH_WORKERS,
+        max_pendientes=settings.PASSWORD_HASH_MAX_PENDIENTES,
+        retry_after_segundos=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS
+    )
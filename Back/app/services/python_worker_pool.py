@@ -0,0 +1,289 @@
+"""
+Pool persistente de procesos Python para ejecutar código de usuarios.
+
+El código se compila en el proceso del servidor (compilar no ejecuta nada del
+usuario) y se envía ya compilado, junto con todos los casos de prueba, a un
+worker precalentado en un único mensaje. El worker lo carga una vez, aplica un
+presupuesto de CPU por caso y un presupuesto de tiempo total, y devuelve el
+detalle de cada caso en cuanto termina.
+
+Los workers se reciclan tras un número fijo de tareas y se matan si exceden el
+tiempo límite, así un envío lento nunca bloquea el event loop.
+"""
+
+import asyncio
+import logging
+import marshal
+import multiprocessing
+import signal
+import time
+from functools import lru_cache
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.services.code_executor import (
+    EXECUTION_TIMEOUT,
+    ErrorCargaPython,
+    compilar_codigo_python,
+    evaluar_casos_python,
+    resumir_resultados_python,
+)
+from app.services.code_executor_seguro import CPU_POR_CASO
+
+logger = logging.getLogger(__name__)
+
+# Margen sobre el presupuesto total antes de dar el worker por colgado
+MARGEN_TIMEOUT = 1.0
+
+
+def _aplicar_limites(memoria_mb: int) -> None:
+    """Limita la memoria del worker (solo en Unix)."""
+    try:
+        import resource
+    except ImportError:
+        return
+
+    if hasattr(resource, 'RLIMIT_AS'):
+        limite = memoria_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+
+
+def _evaluar_lote(
+    conn: Connection,
+    codigo_compilado: bytes,
+    casos_prueba: List[Dict[str, Any]],
+    cpu_por_caso: float,
+    tiempo_total: float
+) -> None:
+    """
+    Evalúa todos los casos y envía ("caso", detalle) por cada uno y
+    ("fin", (error, determinista)).
+    """
+    error, determinista = None, True
+    try:
+        casos = evaluar_casos_python(marshal.loads(codigo_compilado), casos_prueba, cpu_por_caso, tiempo_total)
+        for detalle in casos:
+            conn.send(("caso", detalle))
+    except ErrorCargaPython as e:
+        error, determinista = str(e), e.determinista
+    except BaseException as e:
+        # SystemExit, MemoryError, etc. no deben tumbar el worker
+        error, determinista = f"{type(e).__name__}: {str(e)}", not isinstance(e, MemoryError)
+
+    conn.send(("fin", (error, determinista)))
+
+
+def _worker_main(conn: Connection, memoria_mb: int) -> None:
+    """Bucle principal del proceso worker: recibe tareas hasta recibir None."""
+    # Ctrl+C lo gestiona el proceso padre
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _aplicar_limites(memoria_mb)
+
+    while True:
+        try:
+            tarea = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        if tarea is None:
+            break
+
+        _evaluar_lote(conn, *tarea)
+
+
+def _recibir_casos(conn: Connection, timeout: float) -> Tuple[Tuple[List[Dict[str, Any]], Optional[str], bool], bool]:
+    """
+    Recibe el detalle de cada caso hasta el mensaje de fin (se ejecuta en un thread).
+
+    Returns:
+        ((casos, error, determinista), completado). Si se agota el tiempo o el
+        worker muere, los casos recibidos hasta ese momento junto con el
+        error, determinista=False y completado=False.
+    """
+    limite = time.monotonic() + timeout
+    detalles = []
+    try:
+        while True:
+            restante = limite - time.monotonic()
+            if restante <= 0 or not conn.poll(restante):
+                return (detalles, f"Tiempo de ejecución excedido ({timeout - MARGEN_TIMEOUT:g}s)", False), False
+
+            tipo, dato = conn.recv()
+            if tipo == "fin":
+                error, determinista = dato
+                return (detalles, error, determinista), True
+            detalles.append(dato)
+    except (EOFError, OSError):
+        return (detalles, "La ejecución terminó inesperadamente (posible límite de memoria excedido)", False), False
+
+
+class _Worker:
+    """Proceso worker y su extremo del Pipe."""
+
+    def __init__(self, ctx, memoria_mb: int):
+        self.conn, conn_hijo = ctx.Pipe()
+        self.proceso = ctx.Process(
+            target=_worker_main,
+            args=(conn_hijo, memoria_mb),
+            daemon=True
+        )
+        self.proceso.start()
+        conn_hijo.close()
+        self.tareas = 0
+
+    def detener(self) -> None:
+        """Pide al worker que termine; si no responde, lo mata."""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.proceso.join(timeout=1)
+        if self.proceso.is_alive():
+            self.matar()
+        else:
+            self.conn.close()
+
+    def matar(self) -> None:
+        self.proceso.kill()
+        self.proceso.join(timeout=1)
+        self.conn.close()
+
+
+class PythonWorkerPool:
+    """
+    Pool de workers Python precalentados.
+
+    Los endpoints llaman a `await pool.ejecutar(...)`; la espera ocurre en un
+    thread, por lo que el event loop sigue atendiendo otras peticiones.
+    """
+
+    def __init__(
+        self,
+        tamano: int = 4,
+        max_tareas_por_worker: int = 50,
+        memoria_mb: int = 256,
+        timeout: float = EXECUTION_TIMEOUT,
+        cpu_por_caso: float = CPU_POR_CASO
+    ):
+        metodos = multiprocessing.get_all_start_methods()
+        # forkserver evita heredar el estado (conexiones, threads) de uvicorn
+        self._ctx = multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+        self.tamano = tamano
+        self.max_tareas_por_worker = max_tareas_por_worker
+        self.memoria_mb = memoria_mb
+        self.timeout = timeout
+        self.cpu_por_caso = cpu_por_caso
+        self._libres: Optional[asyncio.Queue] = None
+        self._workers: set = set()
+        self._lock_inicio: Optional[asyncio.Lock] = None
+
+    def _crear_worker(self) -> _Worker:
+        worker = _Worker(self._ctx, self.memoria_mb)
+        self._workers.add(worker)
+        return worker
+
+    def _retirar_worker(self, worker: _Worker, matar: bool = False) -> None:
+        self._workers.discard(worker)
+        if matar:
+            worker.matar()
+        else:
+            worker.detener()
+
+    async def iniciar(self) -> None:
+        """Arranca los workers. Es idempotente."""
+        if self._lock_inicio is None:
+            self._lock_inicio = asyncio.Lock()
+
+        async with self._lock_inicio:
+            if self._libres is not None:
+                return
+
+            loop = asyncio.get_running_loop()
+            workers = await asyncio.gather(*[
+                loop.run_in_executor(None, self._crear_worker)
+                for _ in range(self.tamano)
+            ])
+            libres = asyncio.Queue()
+            for worker in workers:
+                libres.put_nowait(worker)
+            self._libres = libres
+            logger.info(f"Pool de ejecución Python iniciado con {self.tamano} workers")
+
+    async def _devolver(self, worker: Optional[_Worker]) -> None:
+        """Devuelve el worker al pool, reemplazándolo si murió o agotó sus tareas."""
+        if worker is not None and worker.tareas < self.max_tareas_por_worker:
+            self._libres.put_nowait(worker)
+            return
+
+        loop = asyncio.get_running_loop()
+        if worker is not None:
+            await loop.run_in_executor(None, self._retirar_worker, worker)
+        nuevo = await loop.run_in_executor(None, self._crear_worker)
+        self._libres.put_nowait(nuevo)
+
+    async def _despachar(self, mensaje: tuple, recibir: Callable, timeout: float) -> Any:
+        """
+        Envía una tarea a un worker libre y espera la respuesta con `recibir`
+        en un thread, sin bloquear el loop.
+
+        Si la respuesta no se completa (timeout, crash o petición cancelada) el
+        worker queda en estado desconocido: se mata y se reemplaza.
+        """
+        if self._libres is None:
+            await self.iniciar()
+
+        loop = asyncio.get_running_loop()
+        worker = await self._libres.get()
+        completada = False
+
+        try:
+            worker.tareas += 1
+            worker.conn.send(mensaje)
+            respuesta, completada = await loop.run_in_executor(None, recibir, worker.conn, timeout)
+            return respuesta
+        finally:
+            if not completada:
+                await loop.run_in_executor(None, self._retirar_worker, worker, True)
+                worker = None
+            await self._devolver(worker)
+
+    async def ejecutar(self, codigo: str, casos_prueba: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Evalúa el código contra todos los casos en un único viaje a un worker
+        libre y retorna el resultado con el formato de ejecutar_codigo_python.
+
+        Los errores de compilación se devuelven sin tocar el pool.
+        """
+        try:
+            byte_code = compilar_codigo_python(codigo)
+        except ErrorCargaPython as e:
+            return resumir_resultados_python(len(casos_prueba), [], str(e), e.determinista)
+
+        mensaje = (marshal.dumps(byte_code), casos_prueba, self.cpu_por_caso, self.timeout)
+        try:
+            casos_detalle, error, determinista = await self._despachar(
+                mensaje, _recibir_casos, self.timeout + MARGEN_TIMEOUT
+            )
+        except OSError as e:
+            # El worker murió antes de recibir la tarea
+            logger.warning(f"Worker de ejecución Python terminó inesperadamente: {e}")
+            casos_detalle, error, determinista = [], "La ejecución terminó inesperadamente (posible límite de memoria excedido)", False
+        return resumir_resultados_python(len(casos_prueba), casos_detalle, error, determinista)
+
+    def detener(self) -> None:
+        """Detiene todos los workers (usado en el shutdown de la app)."""
+        for worker in list(self._workers):
+            self._retirar_worker(worker)
+        self._libres = None
+
+
+@lru_cache
+def get_python_pool() -> PythonWorkerPool:
+    """Singleton del pool configurado desde Settings."""
+    settings = get_settings()
+    return PythonWorkerPool(
+        tamano=settings.CODE_EXECUTOR_POOL_SIZE,
+        max_tareas_por_worker=settings.CODE_EXECUTOR_MAX_TASKS_PER_WORKER,
+        memoria_mb=settings.CODE_EXECUTOR_MEMORY_MB
+    )
@@ -0,0 +1,162 @@
+"""
+Motor de rachas: mantiene PerfilUsuario.racha_dias a partir de los desafíos
+completados (ProgresoDesafioDiario.completado_at).
+
+Una racha es el número de días consecutivos con al menos un desafío
+completado, terminando hoy o ayer (hoy todavía puede completarse). Se
+actualiza de forma incremental al completar un desafío y una pasada nocturna
+la recalcula para todos los usuarios desde el array ordenado de fechas de
+cada uno, aplicando los cambios en UPDATEs masivos.
+
+La racha forma parte de la XP (XP_POR_DIA_RACHA por día), así que cada cambio
+ajusta xp_total y nivel en la misma sentencia.
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Date, Integer, and_, cast, column, func, or_, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, aggregate_order_by
+from sqlalchemy.orm import Session
+
+from app.models.db_models import PerfilUsuario, ProgresoDesafioDiario
+from app.services.gamification_service import XP_POR_DIA_RACHA, XP_POR_NIVEL
+
+logger = logging.getLogger(__name__)
+
+# Filas por sentencia UPDATE ... FROM (VALUES ...) en la pasada nocturna
+TAMANO_LOTE_UPDATE = 1000
+
+
+def calcular_racha(fechas_desc: Sequence[date], hoy: date) -> int:
+    """
+    Racha vigente a partir de las fechas de completado ordenadas de más
+    reciente a más antigua (se admiten duplicados).
+    """
+    racha = 0
+    esperada: Optional[date] = None
+
+    for fecha in fechas_desc:
+        if fecha > hoy:
+            continue
+        if esperada is None:
+            # La racha solo sigue viva si lo último fue hoy o ayer
+            if fecha < hoy - timedelta(days=1):
+                return 0
+            racha, esperada = 1, fecha - timedelta(days=1)
+        elif fecha == esperada:
+            racha += 1
+            esperada = fecha - timedelta(days=1)
+        elif fecha > esperada:
+            continue  # mismo día que la anterior
+        else:
+            break
+
+    return racha
+
+
+def _valores_racha(nueva_racha) -> Dict:
+    """SET de racha_dias con el ajuste de XP y nivel (en el SET, racha_dias y xp_total son los anteriores)."""
+    xp_nueva = PerfilUsuario.xp_total + (nueva_racha - PerfilUsuario.racha_dias) * XP_POR_DIA_RACHA
+    return {
+        PerfilUsuario.racha_dias: nueva_racha,
+        PerfilUsuario.xp_total: xp_nueva,
+        PerfilUsuario.nivel: xp_nueva // XP_POR_NIVEL + 1,
+    }
+
+
+def actualizar_racha_al_completar(db: Session, usuario_id, progreso_id, hoy: date) -> None:
+    """
+    Actualización incremental al completar un desafío. Mira solo el último
+    día completado antes de este: hoy no cambia nada, ayer suma uno y
+    cualquier otro reinicia la racha a 1. No hace commit.
+    """
+    fecha_completado = cast(ProgresoDesafioDiario.completado_at, Date)
+    ultimo = db.query(func.max(fecha_completado)).filter(
+        ProgresoDesafioDiario.usuario_id == usuario_id,
+        ProgresoDesafioDiario.estado == "completado",
+        ProgresoDesafioDiario.id != progreso_id
+    ).scalar()
+
+    if ultimo is not None and ultimo >= hoy:
+        return
+
+    if ultimo == hoy - timedelta(days=1):
+        nueva = PerfilUsuario.racha_dias + 1
+    else:
+        nueva = 1
+
+    db.query(PerfilUsuario).filter(
+        PerfilUsuario.usuario_id == usuario_id
+    ).update(_valores_racha(nueva), synchronize_session=False)
+
+
+def _aplicar_rachas(db: Session, rachas: Dict[UUID, int]) -> None:
+    """Un UPDATE ... FROM (VALUES ...) por lote."""
+    items = list(rachas.items())
+    for i in range(0, len(items), TAMANO_LOTE_UPDATE):
+        nuevas = values(
+            column("usuario_id", PG_UUID(as_uuid=True)),
+            column("racha", Integer),
+            name="nuevas_rachas"
+        ).data(items[i:i + TAMANO_LOTE_UPDATE])
+
+        db.execute(
+            update(PerfilUsuario)
+            .where(PerfilUsuario.usuario_id == nuevas.c.usuario_id)
+            .values(_valores_racha(nuevas.c.racha))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def recalcular_rachas(db: Session, hoy: Optional[date] = None) -> int:
+    """
+    Pasada nocturna: recalcula la racha de todos los usuarios que tienen una
+    racha activa o han completado algo desde ayer, y reinicia las rotas.
+
+    Una sola consulta trae, por usuario, el array de fechas de completado
+    ordenado (array_agg ... ORDER BY); las rachas se calculan en memoria y
+    solo se escriben las que cambian.
+
+    Returns:
+        Número de perfiles actualizados
+    """
+    hoy = hoy or date.today()
+    ayer = hoy - timedelta(days=1)
+    fecha_completado = cast(ProgresoDesafioDiario.completado_at, Date)
+
+    filas = db.query(
+        PerfilUsuario.usuario_id,
+        PerfilUsuario.racha_dias,
+        func.array_agg(aggregate_order_by(fecha_completado, fecha_completado.desc())),
+    ).outerjoin(
+        ProgresoDesafioDiario,
+        and_(
+            ProgresoDesafioDiario.usuario_id == PerfilUsuario.usuario_id,
+            ProgresoDesafioDiario.estado == "completado",
+            ProgresoDesafioDiario.completado_at.isnot(None)
+        )
+    ).group_by(
+        PerfilUsuario.usuario_id,
+        PerfilUsuario.racha_dias
+    ).having(
+        or_(
+            PerfilUsuario.racha_dias > 0,
+            func.max(fecha_completado) >= ayer
+        )
+    ).all()
+
+    cambios: Dict[UUID, int] = {}
+    for usuario_id, racha_actual, fechas in filas:
+        nueva = calcular_racha([f for f in fechas if f is not None], hoy)
+        if nueva != racha_actual:
+            cambios[usuario_id] = nueva
+
+    if cambios:
+        _aplicar_rachas(db, cambios)
+    db.commit()
+
+    logger.info(f"Rachas recalculadas: {len(filas)} perfiles revisados, {len(cambios)} actualizados")
+    return len(cambios)
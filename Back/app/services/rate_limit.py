@@ -0,0 +1,218 @@
+"""
+Backends de rate limiting con GCRA (Generic Cell Rate Algorithm).
+
+Un límite de `limite` unidades por `ventana` segundos se modela como un
+intervalo de emisión T = ventana / limite. Por clave solo se guarda el TAT
+(theoretical arrival time): el instante en que el cubo volvería a estar
+vacío. Una petición de coste c se admite si TAT + c·T - ventana <= ahora, y
+entonces el TAT avanza c·T. Equivale a un token bucket de capacidad
+`limite` con memoria O(1) por clave activa.
+
+- `BackendMemoria`: por proceso. Las claves cuyo TAT ya pasó equivalen a un
+  cubo vacío y se purgan periódicamente.
+- `BackendRedis`: compartido entre workers. Un script Lua aplica el GCRA de
+  forma atómica con el reloj de Redis y deja que la clave expire sola.
+
+`RATE_LIMIT_STORAGE` elige el backend ("memory" o "redis" con REDIS_URL). Con
+"redis", el arranque comprueba la conexión (`verificar`) y falla si Redis no
+responde: volver en silencio a la memoria del proceso multiplicaría los
+límites por el número de workers. Un fallo de Redis ya en marcha deja pasar
+las peticiones (fail-open) hasta que se recupere.
+"""
+
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ResultadoLimite:
+    permitido: bool
+    limite: int
+    # Unidades que aún caben en la ráfaga tras esta petición
+    restante: int
+    # Segundos hasta que una petición de este coste sería admitida (0 si se admitió)
+    retry_after: float
+    # Segundos hasta que el cubo vuelva a estar vacío
+    reset_after: float
+
+
+def _resultado_gcra(limite: int, ventana: float, tat: float, ahora: float, costo: int):
+    """
+    Aplica el GCRA a un TAT ya leído.
+
+    Returns:
+        (resultado, nuevo TAT o None si se rechaza)
+    """
+    intervalo = ventana / limite
+    tat = max(tat, ahora)
+    nuevo_tat = tat + intervalo * costo
+    admitido_desde = nuevo_tat - ventana
+
+    if ahora < admitido_desde:
+        return ResultadoLimite(
+            permitido=False,
+            limite=limite,
+            restante=max(0, math.floor((ventana - (tat - ahora)) / intervalo)),
+            retry_after=admitido_desde - ahora,
+            reset_after=tat - ahora
+        ), None
+
+    return ResultadoLimite(
+        permitido=True,
+        limite=limite,
+        restante=max(0, math.floor((ventana - (nuevo_tat - ahora)) / intervalo)),
+        retry_after=0.0,
+        reset_after=nuevo_tat - ahora
+    ), nuevo_tat
+
+
+class BackendRateLimit(ABC):
+    """Interfaz común de los backends de rate limiting."""
+
+    @abstractmethod
+    async def consumir(self, clave: str, limite: int, ventana: float, costo: int = 1) -> ResultadoLimite:
+        """Intenta consumir `costo` unidades del límite `limite`/`ventana` de la clave."""
+
+    async def verificar(self) -> None:
+        """Comprueba que el backend está disponible (se llama al arrancar)."""
+
+    async def cerrar(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {"backend": type(self).__name__}
+
+
+class BackendMemoria(BackendRateLimit):
+    """
+    GCRA en un dict del proceso. Sin awaits entre leer y escribir el TAT, así
+    que es atómico dentro del event loop.
+    """
+
+    def __init__(self, intervalo_purga: float = 60.0):
+        self._tats: Dict[str, float] = {}
+        self.intervalo_purga = intervalo_purga
+        self._proxima_purga = time.monotonic() + intervalo_purga
+
+    async def consumir(self, clave: str, limite: int, ventana: float, costo: int = 1) -> ResultadoLimite:
+        ahora = time.monotonic()
+        if ahora >= self._proxima_purga:
+            self._purgar(ahora)
+
+        resultado, nuevo_tat = _resultado_gcra(limite, ventana, self._tats.get(clave, ahora), ahora, costo)
+        if nuevo_tat is not None:
+            self._tats[clave] = nuevo_tat
+        return resultado
+
+    def _purgar(self, ahora: float) -> None:
+        vencidas = [clave for clave, tat in self._tats.items() if tat <= ahora]
+        for clave in vencidas:
+            del self._tats[clave]
+        self._proxima_purga = ahora + self.intervalo_purga
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "claves": len(self._tats)}
+
+
+# KEYS[1] = clave; ARGV = ventana (ms), intervalo de emisión (ms), coste.
+# Devuelve {permitido, restante, retry_after_ms, reset_after_ms}.
+SCRIPT_GCRA = """
+local ventana = tonumber(ARGV[1])
+local intervalo = tonumber(ARGV[2])
+local costo = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local ahora = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if tat == nil or tat < ahora then
+    tat = ahora
+end
+
+local nuevo_tat = tat + intervalo * costo
+local admitido_desde = nuevo_tat - ventana
+if ahora < admitido_desde then
+    local restante = math.floor((ventana - (tat - ahora)) / intervalo)
+    return {0, math.max(restante, 0), math.ceil(admitido_desde - ahora), math.ceil(tat - ahora)}
+end
+
+redis.call('SET', KEYS[1], tostring(nuevo_tat), 'PX', math.ceil(nuevo_tat - ahora))
+local restante = math.floor((ventana - (nuevo_tat - ahora)) / intervalo)
+return {1, math.max(restante, 0), 0, math.ceil(nuevo_tat - ahora)}
+"""
+
+
+class BackendRedis(BackendRateLimit):
+    """
+    GCRA compartido en Redis. Acepta cualquier cliente asíncrono con
+    `register_script` (redis.asyncio o un sustituto local como fakeredis).
+
+    Si Redis falla con la API ya en marcha, la petición se admite: un fallo
+    del limitador no debe tumbar la API. Al arrancar, `verificar` sí falla.
+    """
+
+    def __init__(self, redis, prefijo: str = "ratelimit:"):
+        self.redis = redis
+        self.prefijo = prefijo
+        self._script = redis.register_script(SCRIPT_GCRA)
+        self.errores = 0
+
+    async def consumir(self, clave: str, limite: int, ventana: float, costo: int = 1) -> ResultadoLimite:
+        ventana_ms = ventana * 1000
+        try:
+            permitido, restante, retry_ms, reset_ms = await self._script(
+                keys=[self.prefijo + clave],
+                args=[ventana_ms, ventana_ms / limite, costo]
+            )
+        except Exception as e:
+            self.errores += 1
+            logger.warning(f"Error en rate limit compartido, se admite la petición: {e}")
+            return ResultadoLimite(True, limite, limite, 0.0, 0.0)
+
+        return ResultadoLimite(
+            permitido=bool(permitido),
+            limite=limite,
+            restante=int(restante),
+            retry_after=int(retry_ms) / 1000,
+            reset_after=int(reset_ms) / 1000
+        )
+
+    async def verificar(self) -> None:
+        """
+        Raises:
+            RuntimeError: Si Redis no responde al PING
+        """
+        try:
+            await self.redis.ping()
+        except Exception as e:
+            raise RuntimeError(f"RATE_LIMIT_STORAGE=redis pero Redis no responde: {e}") from e
+
+    async def cerrar(self) -> None:
+        await self.redis.aclose()
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "errores": self.errores}
+
+
+@lru_cache
+def get_rate_limit_backend() -> BackendRateLimit:
+    """Singleton del backend elegido por RATE_LIMIT_STORAGE."""
+    from app.services.cache import crear_cliente_redis
+
+    settings = get_settings()
+    if settings.RATE_LIMIT_STORAGE == "redis":
+        redis = crear_cliente_redis()
+        if redis is None:
+            raise RuntimeError(
+                "RATE_LIMIT_STORAGE=redis requiere REDIS_URL y la librería redis instalada"
+            )
+        return BackendRedis(redis)
+    return BackendMemoria(intervalo_purga=settings.RATE_LIMIT_PURGA_SECONDS)
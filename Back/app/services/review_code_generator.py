@@ -2,17 +2,19 @@ import time
 import json
 from google import genai
 
+# Forma parte de la clave de la caché de respuestas: subirla al cambiar el prompt
+REVIEW_PROMPT_VERSION = "2"
 
-def review_code(codigo, lenguaje, client, informacion_usuario):
-    nombre = informacion_usuario.get("nombre", "Usuario")
-    
+
+async def review_code(codigo, lenguaje, client, informacion_usuario):
+    # La respuesta se cachea y se comparte entre usuarios con el mismo código:
+    # el prompt no incluye datos personales (informacion_usuario no se envía)
     prompt = f"""
     Actúa como una API de Revisión de Código Estático y Calidad de Software.
 
     INPUTS:
     - Lenguaje: {lenguaje}
     - Snippet a revisar: {codigo}
-    - Perfil del Candidato: Nombre: {nombre}
     
     TASK:
     Realiza un análisis de calidad de código (Code Review) estilo FAANG. Sé crítico pero constructivo.
@@ -40,7 +42,7 @@ def review_code(codigo, lenguaje, client, informacion_usuario):
     """
     
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model='gemini-2.5-flash',
             contents=prompt,
             config={'temperature': 0.5}
@@ -0,0 +1,95 @@
+"""
+Coalescencia de peticiones (single-flight) y locks entre workers.
+
+`SingleFlight` agrupa las llamadas concurrentes con la misma clave dentro del
+proceso: la primera ejecuta la operación y el resto espera el mismo resultado.
+`advisory_lock` extiende la exclusión a todos los workers usando un advisory
+lock de Postgres.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, TypeVar
+
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Una sola ejecución en curso por clave; el resto de llamadas la espera."""
+
+    def __init__(self):
+        self._en_curso: Dict[str, asyncio.Task] = {}
+
+    async def ejecutar(self, clave: str, operacion: Callable[[], Awaitable[T]]) -> T:
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(operacion())
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+
+        # shield: si una petición se cancela, la operación sigue para los demás
+        return await asyncio.shield(tarea)
+
+
+def clave_advisory_lock(nombre: str) -> int:
+    """Entero de 64 bits con signo estable para pg_advisory_lock."""
+    return int.from_bytes(hashlib.sha256(nombre.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+@asynccontextmanager
+async def advisory_lock(
+    nombre: str,
+    espera_maxima: float = 120.0,
+    intervalo: float = 0.5
+) -> AsyncIterator[None]:
+    """
+    Adquiere un advisory lock de sesión de Postgres en una conexión dedicada.
+
+    Se sondea con pg_try_advisory_lock para no bloquear el event loop; la
+    conexión y cada intento se hacen en un thread.
+
+    Raises:
+        TimeoutError: Si no se obtiene el lock en `espera_maxima` segundos
+    """
+    clave = clave_advisory_lock(nombre)
+    limite = time.monotonic() + espera_maxima
+    conn = await asyncio.to_thread(
+        lambda: engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    )
+
+    def intentar() -> bool:
+        return conn.execute(text("SELECT pg_try_advisory_lock(:clave)"), {"clave": clave}).scalar()
+
+    # Hasta saber si el lock está tomado o no, una cancelación deja la
+    # conexión en estado desconocido
+    interrumpido = True
+    try:
+        while not await asyncio.to_thread(intentar):
+            if time.monotonic() > limite:
+                interrumpido = False
+                raise TimeoutError(f"No se obtuvo el lock '{nombre}' en {espera_maxima}s")
+            await asyncio.sleep(intervalo)
+        interrumpido = False
+
+        try:
+            yield
+        finally:
+            # El lock es de sesión: liberarlo antes de devolver la conexión al
+            # pool. Síncrono a propósito: una cancelación a mitad de un await
+            # devolvería la conexión con el lock tomado
+            conn.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": clave})
+    finally:
+        if interrumpido:
+            # Un intento en curso pudo tomar el lock: se descarta la conexión
+            # en lugar de devolverla al pool (al cerrarse, Postgres lo libera)
+            conn.invalidate()
+        conn.close()
@@ -12,7 +12,7 @@ async def generate():
     print("Starting generation...")
     client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
     
-    eventos, duration = buscar_eventos_generales(client, limite=5)
+    eventos, duration = await buscar_eventos_generales(client, limite=5)
     
     if eventos:
         db = SessionLocal()
@@ -0,0 +1,70 @@
+-- Migración: Una entrada de actividad por registro de origen
+-- Fecha: 2026-10-18
+-- Descripción: El feed guardaba una fila por cambio (p. ej. "pendiente" y
+-- "completado" del mismo desafío), así que el perfil mostraba el registro
+-- dos veces. Se deja una entrada por (usuario_id, tipo, referencia_id), que
+-- la API actualiza con upsert, y un trigger mantiene al día el estado de los
+-- eventos cuando cambia fuera de la API (Asistido, Ganador...).
+
+-- =============================================
+-- PASO 1: Eliminar duplicados (se conserva la entrada más reciente)
+-- =============================================
+DELETE FROM actividad_usuario a
+USING (
+    SELECT id, row_number() OVER (
+        PARTITION BY usuario_id, tipo, referencia_id
+        ORDER BY created_at DESC, id DESC
+    ) AS orden
+    FROM actividad_usuario
+) d
+WHERE a.id = d.id AND d.orden > 1;
+
+-- =============================================
+-- PASO 2: Índice único para el upsert
+-- =============================================
+CREATE UNIQUE INDEX IF NOT EXISTS uq_actividad_usuario_referencia
+ON actividad_usuario(usuario_id, tipo, referencia_id);
+
+-- =============================================
+-- PASO 3: Estado actual de eventos y desafíos
+-- =============================================
+UPDATE actividad_usuario a
+SET estado = ue.estado
+FROM usuario_eventos ue
+WHERE a.tipo = 'event'
+  AND a.referencia_id = ue.id
+  AND a.estado IS DISTINCT FROM ue.estado;
+
+UPDATE actividad_usuario a
+SET estado = p.estado
+FROM progreso_desafio_diario p
+WHERE a.tipo = 'challenge'
+  AND a.usuario_id = p.usuario_id
+  AND a.referencia_id = p.desafio_id
+  AND a.estado IS DISTINCT FROM p.estado;
+
+-- =============================================
+-- PASO 4: Trigger de cambios de estado en usuario_eventos
+-- =============================================
+CREATE OR REPLACE FUNCTION actividad_evento_estado() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO actividad_usuario (usuario_id, tipo, referencia_id, titulo, estado)
+    SELECT NEW.usuario_id, 'event', NEW.id, e.titulo, NEW.estado
+    FROM eventos e
+    WHERE e.id = NEW.evento_id
+    ON CONFLICT (usuario_id, tipo, referencia_id) DO UPDATE
+    SET estado = EXCLUDED.estado,
+        created_at = now()
+    WHERE actividad_usuario.estado IS DISTINCT FROM EXCLUDED.estado;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_actividad_evento_estado ON usuario_eventos;
+CREATE TRIGGER trg_actividad_evento_estado
+AFTER UPDATE OF estado ON usuario_eventos
+FOR EACH ROW
+WHEN (OLD.estado IS DISTINCT FROM NEW.estado)
+EXECUTE FUNCTION actividad_evento_estado();
+
+ANALYZE actividad_usuario;
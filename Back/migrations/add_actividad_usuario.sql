@@ -0,0 +1,68 @@
+-- Migración: Feed de actividad del usuario
+-- Fecha: 2026-10-18
+-- Descripción: Tabla append-only con la actividad reciente (eventos, desafíos
+-- y proyectos) que escribe la API. El perfil lee una página de este feed en
+-- lugar de combinar tres tablas en cada petición.
+
+-- =============================================
+-- PASO 1: Tabla e índice
+-- =============================================
+CREATE TABLE IF NOT EXISTS actividad_usuario (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    usuario_id UUID NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    tipo VARCHAR(20) NOT NULL,
+    referencia_id UUID NOT NULL,
+    titulo VARCHAR(255) NOT NULL,
+    estado VARCHAR(50) NOT NULL,
+    datos JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT check_tipo_actividad_valido CHECK (tipo IN ('event', 'challenge', 'project'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_actividad_usuario_created
+ON actividad_usuario(usuario_id, created_at DESC, id DESC);
+
+-- =============================================
+-- PASO 2: Backfill desde las tablas de origen
+-- =============================================
+-- Una entrada por registro con su estado actual; se omiten los que ya
+-- tengan entrada para poder re-ejecutar la migración.
+
+-- 2a. Eventos
+INSERT INTO actividad_usuario (usuario_id, tipo, referencia_id, titulo, estado, created_at)
+SELECT ue.usuario_id, 'event', ue.id, e.titulo, ue.estado, ue.updated_at
+FROM usuario_eventos ue
+JOIN eventos e ON e.id = ue.evento_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM actividad_usuario a
+    WHERE a.usuario_id = ue.usuario_id AND a.tipo = 'event' AND a.referencia_id = ue.id
+);
+
+-- 2b. Desafíos
+INSERT INTO actividad_usuario (usuario_id, tipo, referencia_id, titulo, estado, created_at)
+SELECT p.usuario_id, 'challenge', d.id, d.titulo, p.estado, COALESCE(p.completado_at, p.created_at)
+FROM progreso_desafio_diario p
+JOIN desafios_diarios d ON d.id = p.desafio_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM actividad_usuario a
+    WHERE a.usuario_id = p.usuario_id AND a.tipo = 'challenge' AND a.referencia_id = d.id
+);
+
+-- 2c. Proyectos
+INSERT INTO actividad_usuario (usuario_id, tipo, referencia_id, titulo, estado, datos, created_at)
+SELECT
+    pr.usuario_id, 'project', pr.id, pr.titulo, 'Publicado',
+    jsonb_build_object(
+        'descripcion', pr.descripcion,
+        'url_repositorio', pr.url_repositorio,
+        'url_demo', pr.url_demo,
+        'tecnologias', pr.tecnologias
+    ),
+    pr.created_at
+FROM proyectos_usuario pr
+WHERE NOT EXISTS (
+    SELECT 1 FROM actividad_usuario a
+    WHERE a.usuario_id = pr.usuario_id AND a.tipo = 'project' AND a.referencia_id = pr.id
+);
+
+ANALYZE actividad_usuario;
@@ -0,0 +1,31 @@
+-- Migración: Índices para paginación por cursor (keyset)
+-- Fecha: 2026-10-18
+-- Descripción: Cada listado paginado filtra y ordena por (columna de orden, id).
+-- Con estos índices la página N es un recorrido de rango igual que la primera.
+
+-- =============================================
+-- noticias: created_at DESC, id DESC
+-- =============================================
+CREATE INDEX IF NOT EXISTS idx_noticias_created_id
+ON noticias(created_at DESC, id DESC);
+
+-- /api/noticias/generales solo lista noticias sin usuario
+CREATE INDEX IF NOT EXISTS idx_noticias_generales_created_id
+ON noticias(created_at DESC, id DESC)
+WHERE usuario_id IS NULL;
+
+-- =============================================
+-- eventos: fecha ASC, id ASC
+-- =============================================
+CREATE INDEX IF NOT EXISTS idx_eventos_fecha_id
+ON eventos(fecha, id);
+
+-- =============================================
+-- revisiones_codigo: historial por usuario
+-- =============================================
+CREATE INDEX IF NOT EXISTS idx_revisiones_usuario_created_id
+ON revisiones_codigo(usuario_id, created_at DESC, id DESC);
+
+ANALYZE noticias;
+ANALYZE eventos;
+ANALYZE revisiones_codigo;
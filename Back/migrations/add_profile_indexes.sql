@@ -0,0 +1,23 @@
+-- Migración: Índices para GET /api/auth/me/{user_id}
+-- Fecha: 2026-10-18
+-- Descripción: Cada rama de la actividad reciente (ORDER BY ... LIMIT por
+-- usuario) y el conteo de notificaciones sin leer se resuelven con un
+-- recorrido de índice corto.
+
+CREATE INDEX IF NOT EXISTS idx_usuario_eventos_usuario_updated
+ON usuario_eventos(usuario_id, updated_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_progreso_desafio_usuario_created
+ON progreso_desafio_diario(usuario_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_proyectos_usuario_created
+ON proyectos_usuario(usuario_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_notificaciones_no_leidas
+ON notificaciones(usuario_id)
+WHERE leido = false;
+
+ANALYZE usuario_eventos;
+ANALYZE progreso_desafio_diario;
+ANALYZE proyectos_usuario;
+ANALYZE notificaciones;
@@ -0,0 +1,96 @@
+-- Migración: XP materializada en perfiles_usuario
+-- Fecha: 2026-10-18
+-- Descripción: Agrega xp_total (mantenida de forma incremental por la API),
+-- la rellena con la XP de cada usuario, crea el índice del leaderboard y el
+-- trigger que suma la XP de los eventos al marcar la asistencia
+
+-- =============================================
+-- PASO 1: Nueva columna
+-- =============================================
+ALTER TABLE perfiles_usuario
+ADD COLUMN IF NOT EXISTS xp_total INTEGER NOT NULL DEFAULT 0;
+
+-- =============================================
+-- PASO 2: Backfill
+-- =============================================
+-- Misma fórmula que gamification_service: contadores del perfil,
+-- bonus de badges, proyectos y recompensas de desafíos completados, más la
+-- base del nivel ya alcanzado ((nivel - 1) * 1000) que sumaba el perfil, para
+-- que nadie baje de nivel. Solo perfiles aún sin rellenar, así relanzar la
+-- migración no vuelve a sumar la base.
+UPDATE perfiles_usuario p
+SET xp_total =
+    (p.nivel - 1) * 1000
+    + p.eventos_asistidos * 150
+    + p.certificados * 500
+    + p.logros * 200
+    + p.racha_dias * 20
+    + COALESCE((
+        SELECT SUM(b.xp_bonus)
+        FROM usuario_badges ub
+        JOIN badges b ON b.id = ub.badge_id
+        WHERE ub.usuario_id = p.usuario_id
+    ), 0)
+    + COALESCE((
+        SELECT COUNT(*) * 300
+        FROM proyectos_usuario pr
+        WHERE pr.usuario_id = p.usuario_id
+    ), 0)
+    + COALESCE((
+        SELECT SUM(d.xp_recompensa)
+        FROM progreso_desafio_diario pg
+        JOIN desafios_diarios d ON d.id = pg.desafio_id
+        WHERE pg.usuario_id = p.usuario_id
+          AND pg.estado = 'completado'
+    ), 0)
+WHERE p.xp_total = 0;
+
+-- El nivel se deriva de la XP: cada 1000 XP es un nivel (nunca hacia abajo)
+UPDATE perfiles_usuario
+SET nivel = GREATEST(nivel, xp_total / 1000 + 1);
+
+-- =============================================
+-- PASO 3: Restricción e índice del leaderboard
+-- =============================================
+ALTER TABLE perfiles_usuario
+DROP CONSTRAINT IF EXISTS check_xp_total_positivo;
+
+ALTER TABLE perfiles_usuario
+ADD CONSTRAINT check_xp_total_positivo CHECK (xp_total >= 0);
+
+CREATE INDEX IF NOT EXISTS idx_perfil_xp_total
+ON perfiles_usuario(xp_total DESC, usuario_id);
+
+-- =============================================
+-- PASO 4: XP por asistencia a eventos
+-- =============================================
+-- Registrarse en un evento no da XP. El estado pasa a Asistido, Completado
+-- o Ganador fuera de la API, así que la XP del evento (XP_POR_EVENTO) y
+-- eventos_asistidos se aplican en la misma sentencia que cambia el estado.
+-- Si el estado vuelve a 'Registrado' se descuentan.
+CREATE OR REPLACE FUNCTION xp_asistencia_evento() RETURNS trigger AS $$
+DECLARE
+    asistia BOOLEAN := TG_OP = 'UPDATE'
+        AND COALESCE(OLD.estado IN ('Asistido', 'Completado', 'Ganador'), FALSE);
+    asiste BOOLEAN := COALESCE(NEW.estado IN ('Asistido', 'Completado', 'Ganador'), FALSE);
+    signo INTEGER;
+BEGIN
+    IF asistia = asiste THEN
+        RETURN NEW;
+    END IF;
+
+    signo := CASE WHEN asiste THEN 1 ELSE -1 END;
+    UPDATE perfiles_usuario
+    SET xp_total = GREATEST(xp_total + 150 * signo, 0),
+        nivel = GREATEST(xp_total + 150 * signo, 0) / 1000 + 1,
+        eventos_asistidos = GREATEST(eventos_asistidos + signo, 0)
+    WHERE usuario_id = NEW.usuario_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_xp_asistencia_evento ON usuario_eventos;
+CREATE TRIGGER trg_xp_asistencia_evento
+AFTER INSERT OR UPDATE OF estado ON usuario_eventos
+FOR EACH ROW
+EXECUTE FUNCTION xp_asistencia_evento();
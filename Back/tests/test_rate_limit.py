@@ -0,0 +1,110 @@
+"""
+Los dos backends de rate limiting deben aplicar el mismo GCRA. BackendRedis se
+prueba contra fakeredis (con Lua vía lupa) como sustituto local de Redis.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_limit import BackendMemoria, BackendRedis
+
+TOLERANCIA = 0.05
+
+
+def _backend_memoria():
+    return BackendMemoria()
+
+
+def _backend_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return BackendRedis(fakeredis.FakeAsyncRedis())
+
+
+@pytest.fixture(params=[_backend_memoria, _backend_redis], ids=["memoria", "redis"])
+def backend(request):
+    return request.param()
+
+
+def consumir(backend, *args, **kwargs):
+    return asyncio.run(backend.consumir(*args, **kwargs))
+
+
+def test_rafaga_hasta_el_limite(backend):
+    resultados = [consumir(backend, "rafaga", 5, 10) for _ in range(6)]
+
+    assert [r.permitido for r in resultados] == [True] * 5 + [False]
+    assert [r.restante for r in resultados[:5]] == [4, 3, 2, 1, 0]
+    assert all(r.retry_after == 0 for r in resultados[:5])
+
+
+def test_retry_after_es_un_intervalo_de_emision(backend):
+    for _ in range(5):
+        consumir(backend, "retry", 5, 10)
+
+    rechazo = consumir(backend, "retry", 5, 10)
+
+    assert not rechazo.permitido
+    assert rechazo.restante == 0
+    # Un hueco vuelve cada ventana / limite = 2s
+    assert rechazo.retry_after == pytest.approx(2.0, abs=TOLERANCIA)
+    assert rechazo.reset_after == pytest.approx(10.0, abs=TOLERANCIA)
+
+
+def test_costo_mayor_que_uno(backend):
+    primero = consumir(backend, "costo", 10, 10, costo=4)
+    segundo = consumir(backend, "costo", 10, 10, costo=4)
+    tercero = consumir(backend, "costo", 10, 10, costo=4)
+
+    assert (primero.permitido, primero.restante) == (True, 6)
+    assert (segundo.permitido, segundo.restante) == (True, 2)
+    # Faltan 2 unidades de 1s cada una
+    assert not tercero.permitido
+    assert tercero.restante == 2
+    assert tercero.retry_after == pytest.approx(2.0, abs=TOLERANCIA)
+
+
+def test_costo_superior_al_limite_nunca_pasa(backend):
+    resultado = consumir(backend, "excesivo", 3, 10, costo=4)
+
+    assert not resultado.permitido
+    assert resultado.restante == 3
+
+
+def test_claves_independientes(backend):
+    for _ in range(2):
+        consumir(backend, "a", 2, 10)
+
+    assert not consumir(backend, "a", 2, 10).permitido
+    assert consumir(backend, "b", 2, 10).permitido
+
+
+def test_recupera_capacidad_con_el_tiempo(backend):
+    for _ in range(2):
+        consumir(backend, "tiempo", 2, 0.4)
+    assert not consumir(backend, "tiempo", 2, 0.4).permitido
+
+    time.sleep(0.25)
+
+    assert consumir(backend, "tiempo", 2, 0.4).permitido
+
+
+def test_verificar_con_el_backend_disponible(backend):
+    asyncio.run(backend.verificar())
+
+
+def test_redis_caido_falla_al_verificar_y_admite_en_marcha():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    servidor = fakeredis.FakeServer()
+    servidor.connected = False
+    backend = BackendRedis(fakeredis.FakeAsyncRedis(server=servidor))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(backend.verificar())
+
+    resultado = consumir(backend, "caido", 1, 10)
+    assert resultado.permitido
+    assert backend.errores == 1